@@ -0,0 +1,69 @@
+import gpxpy
+
+from cli.benchmarks.conftest import DEM_VERSION
+from cli.benchmarks.conftest import TILES_CROSSED
+from cli.benchmarks.synthetic import crossed_tilenames
+from cli.benchmarks.synthetic import make_coordinates
+from cli.src.dem_sampling import add_dem_elevations
+from cli.src.elevation import GeoElevationData
+from cli.src.synthetic_dem import FakeEarthDataServer
+from cli.src.synthetic_dem import make_tile
+
+
+def test_load_tile(benchmark):
+    """Read a tile from the cache folder."""
+    elevation_data = GeoElevationData(DEM_VERSION)
+    tilename = GeoElevationData.get_tilename(45.5, 6.2)
+    tile = benchmark(elevation_data._load_tile, tilename)
+    assert tile.square_side == 1201
+
+
+def test_get_elevation(benchmark):
+    """Point by point sampling."""
+    coordinates = make_coordinates(10_000, tiles_crossed=3).tolist()
+    elevation_data = GeoElevationData(DEM_VERSION)
+    benchmark(lambda: [elevation_data.get_elevation(latitude, longitude) for latitude, longitude in coordinates])
+
+
+def test_get_elevations(benchmark):
+    """Batch sampling."""
+    coordinates = make_coordinates(10_000, tiles_crossed=3)
+    elevation_data = GeoElevationData(DEM_VERSION)
+    elevations = benchmark(elevation_data.get_elevations, coordinates[:, 0], coordinates[:, 1])
+    assert len(elevations) == 10_000
+
+
+def test_add_elevations(benchmark, gpx_content):
+    """Sampled and smoothed elevation profiles, point by point."""
+    elevation_data = GeoElevationData(DEM_VERSION)
+
+    def setup():
+        return (gpxpy.parse(gpx_content),), {"smooth": True}
+
+    benchmark.pedantic(elevation_data.add_elevations, setup=setup, rounds=3)
+
+
+def test_add_dem_elevations(benchmark, gpx_content):
+    """Sampled and smoothed elevation profiles, see dem_sampling."""
+    elevation_data = GeoElevationData(DEM_VERSION)
+
+    def setup():
+        return (gpxpy.parse(gpx_content), elevation_data), {}
+
+    benchmark.pedantic(add_dem_elevations, setup=setup, rounds=3)
+
+
+def test_download_tiles(benchmark, tmp_path, monkeypatch):
+    """Download, unzip and cache 1" tiles from the local EarthData server, the cache being empty on each round."""
+    tilenames = crossed_tilenames(TILES_CROSSED)
+    round_id = [0]
+
+    def setup():
+        round_id[0] += 1
+        monkeypatch.setenv("HOME", str(tmp_path / str(round_id[0])))
+        elevation_data = GeoElevationData("SRTMGL1v3", "user", "password", base_url=server.base_url, auth_host=server.auth_host)
+        return (elevation_data, tilenames), {}
+
+    with FakeEarthDataServer({tilename: make_tile(tilename, resolution=1) for tilename in tilenames}) as server:
+        failed = benchmark.pedantic(GeoElevationData.prefetch, setup=setup, rounds=3)
+    assert failed == []
@@ -0,0 +1,63 @@
+import gpxpy
+import numpy as np
+
+from cli.src.dem_sampling import step_distances
+from cli.src.gpx_to_webtrack import AnalysisWithoutElevation
+from cli.src.simplify import first_close_approach
+from cli.src.simplify import haversine_to
+from cli.src.simplify import simplify_gpx
+
+
+def new_analysis(gpx_content: str) -> AnalysisWithoutElevation:
+    analysis = AnalysisWithoutElevation("track.gpx", "track.webtrack", False)
+    analysis.gpx = gpxpy.parse(gpx_content)
+    return analysis
+
+
+def test_parse(benchmark, gpx_content):
+    gpx = benchmark(gpxpy.parse, gpx_content)
+    assert gpx.get_track_points_no() > 0
+
+
+def test_simplify(benchmark, gpx_content):
+    def setup():
+        return (gpxpy.parse(gpx_content), 10.0), {}
+
+    benchmark.pedantic(simplify_gpx, setup=setup, rounds=5)
+
+
+def test_process_tracks(benchmark, gpx_content):
+    """Distance accumulation along the tracks, point by point."""
+
+    def setup():
+        return (new_analysis(gpx_content),), {}
+
+    benchmark.pedantic(AnalysisWithoutElevation.process_tracks, setup=setup, rounds=5)
+
+
+def test_step_distances(benchmark, gpx_content):
+    """Vectorized distance accumulation."""
+    gpx = gpxpy.parse(gpx_content)
+    coordinates = np.array([(point.latitude, point.longitude) for point, *_ in gpx.walk()])
+    lengths = benchmark(lambda: np.cumsum(step_distances(coordinates[:, 0], coordinates[:, 1])))
+    assert lengths[-1] > 0
+
+
+def test_guess_close_enough(benchmark, gpx_content):
+    """Waypoint snapping, point by point."""
+    analysis = new_analysis(gpx_content)
+    benchmark(lambda: [analysis.guess_close_enough(waypoint) for waypoint in analysis.gpx.waypoints])
+
+
+def test_first_close_approach(benchmark, gpx_content):
+    """Vectorized waypoint snapping."""
+    gpx = gpxpy.parse(gpx_content)
+    coordinates = np.array([(point.latitude, point.longitude) for point, *_ in gpx.walk()])
+
+    def snap():
+        return [
+            first_close_approach(haversine_to(coordinates[:, 0], coordinates[:, 1], waypoint.latitude, waypoint.longitude), 500.0, 1000.0)
+            for waypoint in gpx.waypoints
+        ]
+
+    benchmark(snap)
@@ -0,0 +1,80 @@
+import datetime
+
+import pytest
+from PIL import Image
+
+from cli.src import photos_manager
+from cli.src.photos_manager import add_photos_to_album
+from cli.src.photos_manager import generate_webp
+
+TOTAL_PHOTOS = 8
+PHOTO_SIZE = (2000, 1333)
+
+
+class FakeExifTool:
+    """Return the same metadata as exiftool would for a Nikon TIF file, the date being taken from the file name."""
+
+    def get_metadata(self, tif_paths: list[str]) -> list[dict]:
+        return [self.metadata(int(tif_path.rsplit("_", 1)[-1].split(".")[0])) for tif_path in tif_paths]
+
+    @staticmethod
+    def metadata(photo_number: int) -> dict:
+        date_taken = datetime.datetime(2024, 7, 1, 8, 0, 0) + datetime.timedelta(minutes=photo_number)
+        return {
+            "EXIF:Make": "NIKON CORPORATION",
+            "EXIF:Model": "NIKON D7100",
+            "MakerNotes:LensModel": "AF-S DX Nikkor 55-300mm f/4.5-5.6G ED VR",
+            "EXIF:DateTimeOriginal": date_taken.strftime("%Y:%m:%d %H:%M:%S"),
+            "EXIF:OffsetTimeOriginal": "+02:00",
+            "EXIF:FocalLengthIn35mmFormat": 450,
+            "EXIF:ExposureTime": 0.003125,
+            "EXIF:FNumber": 5.6,
+            "EXIF:ISO": 100,
+        }
+
+
+@pytest.fixture
+def tif_paths(tmp_path):
+    """Synthetic originals, each one with a sidecar file copied along."""
+    source_dir = tmp_path / "source"
+    source_dir.mkdir()
+    paths = []
+    for photo_number in range(TOTAL_PHOTOS):
+        tif_path = source_dir / f"photo_{photo_number}.tif"
+        Image.linear_gradient("L").resize(PHOTO_SIZE).convert("RGB").save(tif_path)
+        (source_dir / f"photo_{photo_number}.pp3").write_text("[Version]\n", encoding="utf-8")
+        paths.append(str(tif_path))
+    return paths
+
+
+@pytest.fixture
+def fake_exiftool(monkeypatch):
+    monkeypatch.setattr(photos_manager, "get_exiftool", FakeExifTool)
+
+
+def new_album(tmp_path, round_id: list[int]):
+    round_id[0] += 1
+    album_path = tmp_path / f"album_{round_id[0]}"
+    album_path.mkdir()
+    return album_path
+
+
+@pytest.mark.usefixtures("cwebp_stub", "fake_exiftool")
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_add_photos_to_album(benchmark, tmp_path, tif_paths, jobs):
+    """EXIF extraction, linking and WebP variants of new photos, cwebp and exiftool being stubbed."""
+    round_id = [0]
+
+    def setup():
+        return (new_album(tmp_path, round_id), tif_paths, None), {"jobs": jobs}
+
+    photo_ids = benchmark.pedantic(add_photos_to_album, setup=setup, rounds=3)
+    assert len(photo_ids) == TOTAL_PHOTOS
+
+
+@pytest.mark.usefixtures("cwebp_stub", "fake_exiftool")
+def test_generate_webp_up_to_date(benchmark, tmp_path, tif_paths):
+    """Nothing to generate: the cost of checking an album."""
+    album_path = new_album(tmp_path, [0])
+    add_photos_to_album(album_path, tif_paths, None)
+    assert benchmark(generate_webp, album_path) == []
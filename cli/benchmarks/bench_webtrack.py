@@ -0,0 +1,35 @@
+import pytest
+
+from cli.benchmarks.conftest import DEM_VERSION
+from cli.src.gpx_to_webtrack import AnalysisWithoutElevation
+from cli.src.gpx_to_webtrack import gpx_to_webtrack
+from cli.src.webtrack import WebTrack
+
+
+@pytest.fixture
+def full_profile(gpx_path):
+    """The WebTrack data of the synthetic GPX file."""
+    analysis = AnalysisWithoutElevation(gpx_path, gpx_path + ".webtrack", False)
+    with open(gpx_path, "r", encoding="utf-8") as gpx_file:
+        analysis.parse_gpx(gpx_file)
+    analysis.process_tracks()
+    waypoints = [[waypoint.longitude, waypoint.latitude, False, None, waypoint.symbol, waypoint.name, 0] for waypoint in analysis.gpx.waypoints]
+    return analysis.flat_full_profile(waypoints)
+
+
+def test_encode(benchmark, tmp_path, full_profile):
+    webtrack_path = str(tmp_path / "track.webtrack")
+    benchmark(WebTrack().to_file, webtrack_path, full_profile)
+
+
+def test_decode(benchmark, tmp_path, full_profile):
+    webtrack_path = str(tmp_path / "track.webtrack")
+    WebTrack().to_file(webtrack_path, full_profile)
+    decoded = benchmark(WebTrack().from_file, webtrack_path)
+    assert len(decoded["segments"]) == len(full_profile["segments"])
+
+
+@pytest.mark.parametrize("dem", ["none", DEM_VERSION])
+def test_gpx_to_webtrack(benchmark, gpx_path, dem):
+    """The whole conversion, the elevation service being created for each file."""
+    benchmark.pedantic(gpx_to_webtrack, args=(gpx_path, True, dem, False, True), rounds=3)
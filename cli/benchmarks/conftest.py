@@ -0,0 +1,73 @@
+import os
+import stat
+
+import pytest
+
+from cli.benchmarks.synthetic import crossed_tilenames
+from cli.benchmarks.synthetic import make_gpx
+from cli.src.synthetic_dem import write_tiles
+
+# the 3" dataset is the only one without NASA credentials, the tiles are generated in a temporary cache
+DEM_VERSION = "JdF3"
+TILES_CROSSED = 3
+
+# minimal cwebp writing a placeholder file and the stats parsed by decode_webp_output()
+CWEBP_STUB = """#!/bin/sh
+[ "$1" = "-version" ] && echo 1.4.0 && exit 0
+width=100
+height=100
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -resize) width=$2; height=$3; shift 2 ;;
+        -o) output=$2; shift ;;
+        -) cat > /dev/null ;;
+    esac
+    shift
+done
+printf 'RIFF' > "$output"
+echo "Saving file '$output'" >&2
+echo "Dimension: $width x $height" >&2
+echo "Output:    66 bytes Y-U-V-All-PSNR 64.68 99.00 99.00   66.44 dB" >&2
+"""
+
+SIZES = {
+    "1k": {"points": 1_000, "segments": 1, "waypoints": 5},
+    "50k": {"points": 50_000, "segments": 5, "waypoints": 50},
+}
+
+
+@pytest.fixture(scope="session")
+def home_dir(tmp_path_factory):
+    """Temporary home folder with the synthetic DEM tiles in the cache of GeoElevationData."""
+    home = tmp_path_factory.mktemp("home")
+    write_tiles(str(home / ".cache" / "srtm"), crossed_tilenames(TILES_CROSSED), DEM_VERSION, resolution=3)
+    return home
+
+
+@pytest.fixture(autouse=True)
+def offline_home(home_dir, monkeypatch):
+    """Use the synthetic DEM cache, the missing tiles cannot be downloaded."""
+    monkeypatch.setenv("HOME", str(home_dir))
+
+
+@pytest.fixture(scope="session", params=list(SIZES))
+def gpx_content(request):
+    return make_gpx(**SIZES[request.param], tiles_crossed=TILES_CROSSED)
+
+
+@pytest.fixture
+def gpx_path(tmp_path, gpx_content):
+    path = tmp_path / "track.gpx"
+    path.write_text(gpx_content, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture
+def cwebp_stub(tmp_path, monkeypatch):
+    """Put the cwebp stub first in the PATH."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    cwebp_path = bin_dir / "cwebp"
+    cwebp_path.write_text(CWEBP_STUB, encoding="utf-8")
+    cwebp_path.chmod(cwebp_path.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
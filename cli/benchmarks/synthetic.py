@@ -0,0 +1,65 @@
+import datetime
+
+import numpy as np
+
+from cli.src.elevation import GeoElevationData
+
+START_LATITUDE = 45.5
+START_LONGITUDE = 6.2
+START_TIME = datetime.datetime(2024, 7, 1, 6, 0, 0, tzinfo=datetime.timezone.utc)
+
+
+def make_coordinates(points: int, tiles_crossed: int = 1, seed: int = 0) -> np.ndarray:
+    """
+    Noisy path going east, the longitude spanning `tiles_crossed` DEM tiles.
+    Returns:
+        Array of (latitude, longitude).
+    """
+    rng = np.random.default_rng(seed)
+    # stay within the first tile if only one is crossed
+    span = tiles_crossed - 0.6 if tiles_crossed > 1 else 0.5
+    longitudes = START_LONGITUDE + np.linspace(0.0, span, points) + rng.normal(0.0, 1e-5, points)
+    latitudes = START_LATITUDE + 0.1 * np.sin(np.linspace(0.0, 6.0 * np.pi, points)) + rng.normal(0.0, 1e-5, points)
+    return np.column_stack((latitudes, longitudes))
+
+
+def make_gpx(points: int, segments: int = 1, waypoints: int = 0, tiles_crossed: int = 1, seed: int = 0) -> str:
+    """
+    Generate a GPX document as recorded by a GPS: one numbered track per segment with a
+    WebTrack activity, one point per second with elevation and time, and waypoints close to the track.
+
+    Args:
+        points: Total number of track points.
+        segments: Number of tracks, the points being split evenly.
+        waypoints: Number of waypoints, spread along the path.
+        tiles_crossed: Number of DEM tiles crossed by the path.
+        seed: Seed of the noise.
+
+    Returns:
+        The GPX content.
+    """
+    coordinates = make_coordinates(points, tiles_crossed, seed)
+    elevations = 1000.0 + 300.0 * np.sin(np.linspace(0.0, 4.0 * np.pi, points))
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<gpx version="1.1" creator="synthetic" xmlns="http://www.topografix.com/GPX/1/1">',
+    ]
+    rng = np.random.default_rng(seed + 1)
+    for idx in np.linspace(0, points - 1, waypoints, dtype=np.intp).tolist():
+        latitude, longitude = (coordinates[idx] + rng.normal(0.0, 1e-3, 2)).tolist()
+        lines.append(f'  <wpt lat="{latitude:.7f}" lon="{longitude:.7f}"><name>Waypoint {idx}</name><sym>Flag</sym></wpt>')
+    bounds = np.linspace(0, points, segments + 1, dtype=np.intp).tolist()
+    for segment_id, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        lines.append(f"  <trk><name>{segment_id + 1}. Day {segment_id + 1}</name><desc>(WebTrack activity: walk)</desc><trkseg>")
+        for idx in range(start, end):
+            latitude, longitude = coordinates[idx].tolist()
+            time = (START_TIME + datetime.timedelta(seconds=idx)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            lines.append(f'    <trkpt lat="{latitude:.7f}" lon="{longitude:.7f}"><ele>{elevations[idx]:.1f}</ele><time>{time}</time></trkpt>')
+        lines.append("  </trkseg></trk>")
+    lines.append("</gpx>")
+    return "\n".join(lines) + "\n"
+
+
+def crossed_tilenames(tiles_crossed: int = 1) -> list[str]:
+    """Names of the DEM tiles crossed by the synthetic path."""
+    return [GeoElevationData.get_tilename(START_LATITUDE, lon) for lon in range(int(START_LONGITUDE), int(START_LONGITUDE) + tiles_crossed)]
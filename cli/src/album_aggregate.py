@@ -0,0 +1,103 @@
+import json
+import os
+from typing import Optional
+from typing import Sequence
+
+from cli.src.album_index import AlbumIndex
+from cli.src.album_index import file_state
+
+AGGREGATE_FILENAME = "album.json"
+AGGREGATE_VERSION = 1
+
+
+def photo_record(info_data: dict) -> dict:
+    """Extract the album-wide fields from the story metadata file of one photo."""
+    position = info_data.get("position")
+    return {
+        "dateTaken": info_data.get("dateTaken"),
+        "lat": position["lat"] if position else None,
+        "lon": position["lon"] if position else None,
+        "prev": info_data.get("prev"),
+        "next": info_data.get("next"),
+        "body": info_data.get("body"),
+        "lens": info_data.get("lens"),
+    }
+
+
+def intern(value: Optional[str], table: list[str], ids: dict[str, int]) -> Optional[int]:
+    """Replace the string by its position in the table, the table being extended if needed."""
+    if value is None:
+        return None
+    if value not in ids:
+        ids[value] = len(table)
+        table.append(value)
+    return ids[value]
+
+
+def build_aggregate(index: AlbumIndex, variant_names: Sequence[str]) -> tuple[dict, int]:
+    """
+    Build the album-wide metadata in a columnar layout: one list per field, in the album order.
+    Camera bodies and lenses are replaced by their position in the `bodies` and `lenses` tables.
+    The existing variants of each photo are a bit mask of `variants`, as recorded in the index.
+    Only the story metadata files changed since the last build are read, the records being cached in the index.
+    Returns:
+        The aggregate and the number of story metadata files read.
+    """
+    columns: dict[str, list] = {name: [] for name in ("id", "dateTaken", "lat", "lon", "prev", "next", "body", "lens", "variants")}
+    bodies: list[str] = []
+    lenses: list[str] = []
+    body_ids: dict[str, int] = {}
+    lens_ids: dict[str, int] = {}
+    variant_bits = {name: 1 << bit for bit, name in enumerate(variant_names)}
+    read_count = 0
+    for photo_id in index.photo_ids:
+        info_path = os.path.join(index.album_path, photo_id, "i.json")
+        try:
+            info_state = file_state(info_path)
+        except FileNotFoundError:
+            continue
+        entry = index.photos[photo_id]
+        cached = entry.get("info")
+        if cached is None or cached["state"] != info_state:
+            with open(info_path, "r", encoding="utf-8") as info_file:
+                cached = {"state": info_state, "record": photo_record(json.load(info_file))}
+            entry["info"] = cached
+            read_count += 1
+        record = cached["record"]
+        columns["id"].append(int(photo_id))
+        for name in ("dateTaken", "lat", "lon", "prev", "next"):
+            columns[name].append(record[name])
+        columns["body"].append(intern(record["body"], bodies, body_ids))
+        columns["lens"].append(intern(record["lens"], lenses, lens_ids))
+        columns["variants"].append(sum(variant_bits.get(name, 0) for name in entry["existing_variants"]))
+    aggregate = {
+        "version": AGGREGATE_VERSION,
+        "bodies": bodies,
+        "lenses": lenses,
+        "variants": list(variant_names),
+        "photos": columns,
+    }
+    return aggregate, read_count
+
+
+def update_aggregate(index: AlbumIndex, variant_names: Sequence[str]) -> int:
+    """
+    Build the aggregate and write it in the album if changed. The index is saved.
+    Returns:
+        The number of story metadata files read.
+    """
+    aggregate, read_count = build_aggregate(index, variant_names)
+    index.save()
+    content = json.dumps(aggregate, ensure_ascii=False, separators=(",", ":")) + "\n"
+    aggregate_path = os.path.join(index.album_path, AGGREGATE_FILENAME)
+    try:
+        with open(aggregate_path, "r", encoding="utf-8") as aggregate_file:
+            if aggregate_file.read() == content:
+                return read_count
+    except FileNotFoundError:
+        pass
+    tmp_path = aggregate_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as aggregate_file:
+        aggregate_file.write(content)
+    os.replace(tmp_path, aggregate_path)
+    return read_count
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import time
+from bisect import bisect_left
+from bisect import insort
+from pathlib import Path
+from typing import Optional
+
+from cli.src.image_header import ImageInfo
+from cli.src.image_header import probe_image
+
+INDEX_FILENAME = ".album_index.json"
+INDEX_VERSION = 5
+MANIFEST_FILENAME = "_variants.json"
+LEGACY_VARIANT: dict = {"legacy": True}  # generated before the manifest, newer than the original
+FileState = list[int]  # modification time (ns) and size, a list to be the same after a JSON round-trip
+
+
+def guess_original(dir_path: str | Path) -> str:
+    """Find out the original photo (most probably TIF, but could also be other formats)
+    File name with at least one dot (f.i. DSC_9102.sth.tif) is skipped.
+    If multiple files of the same extension are found, the last modified is selected."""
+    priorities = [
+        ("tif", 10),
+        ("png", 6),
+        ("jpg", 3),
+    ]
+    current_timestamp = time.time()
+    computed_priorities = [(ext, prio * current_timestamp) for ext, prio in priorities]
+    best_priority = -1.0
+    best_file = None
+    for file in os.listdir(dir_path):
+        path_to_file = os.path.join(dir_path, file)
+        if os.path.isfile(path_to_file):
+            if file.startswith("_"):
+                continue
+            modification_timestamp = os.path.getmtime(path_to_file)
+            for ext, priority in computed_priorities:
+                current_priority = priority + modification_timestamp
+                if file.lower().endswith("." + ext) and current_priority > best_priority:
+                    best_priority, best_file = current_priority, file
+    if best_file:
+        return best_file
+    raise FileNotFoundError(f"Missing original photo in `{dir_path}'")
+
+
+def file_state(path: str | Path) -> FileState:
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def file_sha256(path: str | Path) -> str:
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+class AlbumIndex:
+    """
+    Photos of the album with their original file and the fingerprint of their WebP variants,
+    so that the album does not have to be scanned for each operation.
+
+    A variant is up-to-date if its fingerprint (hash of the original content and encoding
+    parameters) is unchanged. The fingerprints are also stored in a manifest next to the variants
+    so that they survive a copy of the album, whereas the index is a local cache. The hash of the
+    original and its dimensions are only computed when its modification time or size changes. The index is stored in
+    the album and rebuilt if missing, unreadable, or from another version. Use reindex() if files
+    have been changed by hand.
+    """
+
+    def __init__(self, album_path: str | Path):
+        self.album_path = album_path
+        self.photos: dict[str, dict] = {}
+        self.photo_ids: list[str] = []  # in the album order
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.album_path, INDEX_FILENAME)
+
+    @classmethod
+    def load(cls, album_path: str | Path) -> "AlbumIndex":
+        """Read the index of the album, or build it if unavailable. New and removed photos are synced."""
+        index = cls(album_path)
+        try:
+            with open(index.path, "r", encoding="utf-8") as index_file:
+                data = json.load(index_file)
+            if data.get("version") != INDEX_VERSION:
+                raise ValueError("Outdated album index")
+            index.photos = data["photos"]
+        except (OSError, ValueError, KeyError):
+            index.reindex()
+            return index
+        index.photo_ids = sorted(index.photos, key=int)
+        index.sync()
+        return index
+
+    def save(self) -> None:
+        """Atomically write the index."""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as index_file:
+            json.dump({"version": INDEX_VERSION, "photos": self.photos}, index_file, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def scan_photo(self, photo_id: str) -> dict:
+        """
+        Find out the original, the existing variants and their fingerprints recorded in the manifest.
+        Without manifest, the variants newer than the original are flagged as legacy.
+        """
+        dir_path = os.path.join(self.album_path, photo_id)
+        try:
+            original: Optional[str] = guess_original(dir_path)
+        except FileNotFoundError:
+            original = None
+        existing_variants = {
+            os.path.splitext(filename)[0]: os.path.join(dir_path, filename) for filename in os.listdir(dir_path) if filename.endswith(".webp")
+        }
+        try:
+            with open(os.path.join(dir_path, MANIFEST_FILENAME), "r", encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+            variants = {name: fingerprint for name, fingerprint in manifest.items() if name in existing_variants}
+        except (OSError, ValueError):
+            variants = {}
+            if original is not None:
+                original_mtime_ns = file_state(os.path.join(dir_path, original))[0]
+                for name, variant_path in existing_variants.items():
+                    if os.stat(variant_path).st_mtime_ns > original_mtime_ns:
+                        variants[name] = LEGACY_VARIANT
+        return {
+            "original": original,
+            "original_state": None,
+            "original_sha256": None,
+            "original_info": None,
+            "variants": variants,
+            "existing_variants": sorted(existing_variants),
+        }
+
+    def reindex(self) -> None:
+        """Rebuild the index from the album directory."""
+        self.photos = {}
+        for photo_id in os.listdir(self.album_path):
+            if os.path.isdir(os.path.join(self.album_path, photo_id)):
+                self.photos[photo_id] = self.scan_photo(photo_id)
+        self.photo_ids = sorted(self.photos, key=int)
+        self.save()
+
+    def sync(self) -> None:
+        """Index the photos added or removed by hand, with only one listing of the album."""
+        photo_ids = {photo_id for photo_id in os.listdir(self.album_path) if os.path.isdir(os.path.join(self.album_path, photo_id))}
+        if photo_ids == set(self.photos):
+            return
+        for photo_id in set(self.photos) - photo_ids:
+            del self.photos[photo_id]
+        for photo_id in photo_ids - set(self.photos):
+            self.photos[photo_id] = self.scan_photo(photo_id)
+        self.photo_ids = sorted(self.photos, key=int)
+        self.save()
+
+    def find_prev_next(self, photo_id: str) -> tuple[Optional[str], Optional[str]]:
+        """Find the position where the photo will be dropped on the album."""
+        position = bisect_left(self.photo_ids, int(photo_id), key=int)
+        if position < len(self.photo_ids) and int(self.photo_ids[position]) == int(photo_id):
+            raise ValueError("Photo already in the album!")
+        prev_photo = self.photo_ids[position - 1] if position > 0 else None
+        next_photo = self.photo_ids[position] if position < len(self.photo_ids) else None
+        return prev_photo, next_photo
+
+    def add_photo(self, photo_id: str) -> None:
+        """Index a photo that has just been copied to the album."""
+        if photo_id not in self.photos:
+            insort(self.photo_ids, photo_id, key=int)
+        self.photos[photo_id] = self.scan_photo(photo_id)
+
+    def original(self, photo_id: str) -> tuple[str, str]:
+        """
+        Returns:
+            The path to the original photo and the SHA-256 of its content.
+        Raises:
+            FileNotFoundError: If the photo has no original.
+        """
+        entry = self.photos[photo_id]
+        dir_path = os.path.join(self.album_path, photo_id)
+        original_state = None
+        if entry["original"] is not None:
+            original_path = os.path.join(dir_path, entry["original"])
+            try:
+                original_state = file_state(original_path)
+            except FileNotFoundError:
+                pass
+        if original_state is None:
+            # original added, renamed or removed since indexed
+            entry["original"] = guess_original(dir_path)
+            original_path = os.path.join(dir_path, entry["original"])
+            original_state = file_state(original_path)
+        if entry["original_state"] != original_state:
+            entry["original_state"] = original_state
+            entry["original_sha256"] = file_sha256(original_path)
+            try:
+                entry["original_info"] = list(probe_image(original_path))
+            except OSError:  # unsupported format, left to the encoder
+                entry["original_info"] = None
+        return original_path, entry["original_sha256"]
+
+    def original_info(self, photo_id: str) -> Optional[ImageInfo]:
+        """The dimensions of the original if readable, see original()."""
+        original_info = self.photos[photo_id]["original_info"]
+        return None if original_info is None else ImageInfo(*original_info)
+
+    def variant(self, photo_id: str, name: str) -> Optional[dict]:
+        """The fingerprint of the existing variant, or None if never generated."""
+        return self.photos[photo_id]["variants"].get(name)
+
+    def set_variant(self, photo_id: str, name: str, fingerprint: dict) -> None:
+        """Record that the variant has been generated with the given fingerprint."""
+        entry = self.photos[photo_id]
+        entry["variants"][name] = fingerprint
+        if name not in entry["existing_variants"]:
+            insort(entry["existing_variants"], name)
+
+    def save_manifest(self, photo_id: str) -> None:
+        """Write the fingerprints of the variants next to them."""
+        manifest = {name: fingerprint for name, fingerprint in self.photos[photo_id]["variants"].items() if fingerprint != LEGACY_VARIANT}
+        with open(os.path.join(self.album_path, photo_id, MANIFEST_FILENAME), "w", encoding="utf-8") as manifest_file:
+            manifest_file.write(json.dumps(manifest, indent=4, sort_keys=True) + "\n")
@@ -0,0 +1,270 @@
+import glob
+import gzip
+import io
+import json
+import os
+import time
+from typing import Callable
+from typing import Optional
+from typing import TextIO
+
+import click
+import gpxpy
+import gpxpy.gpx
+
+from cli.src.embellish_gpx import is_embellished
+from cli.src.gpx_to_webtrack import AnalysisWithoutElevation
+from cli.src.gpx_writer import write_gpx
+from cli.src.webtrack import WebTrack
+
+DEFAULT_PATHS = (
+    os.path.join("public", "content", "stories"),
+    os.path.join("cli", "tests", "fixtures"),
+)
+POLYLINE_PRECISION = 5  # same as WebTrack
+
+
+@click.command()
+@click.option(
+    "--path",
+    "paths",
+    multiple=True,
+    type=click.Path(exists=True),
+    help="WebTrack or GPX file, or directory searched recursively. Defaults to the stories and the test fixtures",
+)
+@click.option(
+    "--repeat",
+    default=5,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of encodings and decodings, the fastest being kept",
+)
+@click.option(
+    "--per-file",
+    is_flag=True,
+    help="Print one row per file and format instead of the totals",
+)
+@click.option(
+    "--json",
+    "json_output",
+    type=click.File("w", encoding="utf-8"),
+    help="Write the measures of each file and the totals as JSON to this file, '-' for stdout",
+)
+def compare_formats(paths: tuple[str, ...], repeat: int, per_file: bool, json_output: Optional[TextIO]) -> None:
+    """Compare the size and speed of WebTrack with GPX, GeoJSON and Google encoded polyline."""
+    track_paths = find_tracks(paths or tuple(path for path in DEFAULT_PATHS if os.path.isdir(path)))
+    if not track_paths:
+        raise click.UsageError("No WebTrack or GPX file found")
+    measures = {track_path: measure_formats(load_track(track_path), repeat) for track_path in track_paths}
+    totals = total_measures(list(measures.values()))
+    rows = [(os.path.basename(path), fmt, measure) for path, formats in measures.items() for fmt, measure in formats.items()] if per_file else []
+    rows += [("TOTAL", fmt, measure) for fmt, measure in totals.items()]
+    click.echo(format_table(rows))
+    if json_output is not None:
+        json.dump({"files": measures, "totals": totals}, json_output, indent=2)
+        json_output.write("\n")
+
+
+def find_tracks(paths: tuple[str, ...]) -> list[str]:
+    """WebTrack and GPX files, the embellished GPX files being skipped."""
+    track_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = glob.glob(os.path.join(glob.escape(path), "**", "*.webtrack"), recursive=True)
+            candidates += glob.glob(os.path.join(glob.escape(path), "**", "*.gpx"), recursive=True)
+        else:
+            candidates = [path]
+        track_paths += [candidate for candidate in candidates if not is_embellished(candidate)]
+    return sorted(set(track_paths))
+
+
+def load_track(track_path: str) -> dict:
+    """
+    Parse the track into the WebTrack data structure, see WebTrack.to_file().
+    The elevations of GPX files are not read, no DEM is queried.
+    """
+    if track_path.endswith(".webtrack"):
+        return WebTrack().from_file(track_path)
+    analysis = AnalysisWithoutElevation(track_path, "", False)
+    with open(track_path, "r", encoding="utf-8") as gpx_file:
+        gpx = analysis.parse_gpx(gpx_file)
+    analysis.process_tracks()
+    waypoints = [
+        [waypoint.longitude, waypoint.latitude, False, None, waypoint.symbol, waypoint.name, analysis.guess_close_enough(waypoint)]
+        for waypoint in gpx.waypoints
+    ]
+    return analysis.flat_full_profile(waypoints)
+
+
+def to_gpx(data: dict) -> bytes:
+    """One track per segment, with the elevations and waypoints."""
+    gpx = gpxpy.gpx.GPX()
+    for segment in data["segments"]:
+        track = gpxpy.gpx.GPXTrack()
+        track_segment = gpxpy.gpx.GPXTrackSegment()
+        track_segment.points = [gpxpy.gpx.GPXTrackPoint(point[1], point[0], elevation=point[3]) for point in segment["points"]]
+        track.segments.append(track_segment)
+        gpx.tracks.append(track)
+    for waypoint in data["waypoints"]:
+        gpx.waypoints.append(gpxpy.gpx.GPXWaypoint(waypoint[1], waypoint[0], elevation=waypoint[3], name=waypoint[5], symbol=waypoint[4]))
+    stream = io.StringIO()
+    write_gpx(gpx, stream)
+    return stream.getvalue().encode("utf-8")
+
+
+def to_geojson(data: dict) -> bytes:
+    """Same features as the web app: one line string per segment and one point per waypoint."""
+    features = []
+    for segment in data["segments"]:
+        coordinates = [[point[0], point[1], point[3]] if segment["withEle"] else [point[0], point[1]] for point in segment["points"]]
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": coordinates},
+                "properties": {"activity": segment["activity"].name},
+            }
+        )
+    for waypoint in data["waypoints"]:
+        coordinates = [waypoint[0], waypoint[1], waypoint[3]] if waypoint[2] else [waypoint[0], waypoint[1]]
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": coordinates},
+                "properties": {"sym": waypoint[4] or "", "name": waypoint[5]},
+            }
+        )
+    return json.dumps({"type": "FeatureCollection", "features": features}, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def encode_polyline(coordinates: list[tuple[float, float]], precision: int = POLYLINE_PRECISION) -> str:
+    """Google encoded polyline of (latitude, longitude)."""
+    factor = 10**precision
+    chunks = []
+    prev_lat = prev_lon = 0
+    for latitude, longitude in coordinates:
+        lat, lon = round(latitude * factor), round(longitude * factor)
+        for delta in (lat - prev_lat, lon - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat, prev_lon = lat, lon
+    return "".join(chunks)
+
+
+def decode_polyline(encoded: str, precision: int = POLYLINE_PRECISION) -> list[tuple[float, float]]:
+    """Decode a Google encoded polyline into (latitude, longitude)."""
+    factor = 10**precision
+    coordinates = []
+    values = [0, 0]
+    idx = 0
+    while idx < len(encoded):
+        for axis in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[idx]) - 63
+                idx += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            values[axis] += ~(result >> 1) if result & 1 else result >> 1
+        coordinates.append((values[0] / factor, values[1] / factor))
+    return coordinates
+
+
+def to_polyline(data: dict) -> bytes:
+    """One polyline per line, the format has neither elevation nor waypoint."""
+    return "\n".join(encode_polyline([(point[1], point[0]) for point in segment["points"]]) for segment in data["segments"]).encode("ascii")
+
+
+def from_polyline(content: bytes) -> list[list[tuple[float, float]]]:
+    return [decode_polyline(line) for line in content.decode("ascii").split("\n")]
+
+
+ENCODERS: dict[str, tuple[Callable[[dict], bytes], Callable[[bytes], object]]] = {
+    "webtrack": (WebTrack().to_bytes, WebTrack().from_bytes),
+    "gpx": (to_gpx, gpxpy.parse),
+    "geojson": (to_geojson, json.loads),
+    "polyline": (to_polyline, from_polyline),
+}
+
+
+def best_time(func: Callable, arg, repeat: int) -> tuple[float, object]:
+    """
+    Returns:
+        The fastest wall time in seconds and the result of the last call.
+    """
+    fastest = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        fastest = min(fastest, time.perf_counter() - start)
+    return fastest, result
+
+
+def compressed_sizes(content: bytes) -> dict[str, Optional[int]]:
+    """Raw, gzip and brotli sizes in bytes, brotli being None if not installed."""
+    try:
+        import brotli
+    except ImportError:
+        brotli_size = None
+    else:
+        brotli_size = len(brotli.compress(content))
+    return {
+        "raw_bytes": len(content),
+        "gzip_bytes": len(gzip.compress(content, compresslevel=9, mtime=0)),
+        "brotli_bytes": brotli_size,
+    }
+
+
+def measure_formats(data: dict, repeat: int = 5) -> dict[str, dict]:
+    """
+    Encode the track data in all formats, then decode it.
+    Returns:
+        For each format, the sizes (see compressed_sizes()) and the encode and decode times in seconds.
+    """
+    measures = {}
+    for fmt, (encode, decode) in ENCODERS.items():
+        encode_time, content = best_time(encode, data, repeat)
+        decode_time, _ = best_time(decode, content, repeat)
+        measures[fmt] = {**compressed_sizes(content), "encode_s": encode_time, "decode_s": decode_time}  # type: ignore[arg-type]
+    return measures
+
+
+def total_measures(all_measures: list[dict[str, dict]]) -> dict[str, dict]:
+    """Sum of the measures of all files, None if missing for one file."""
+    totals: dict[str, dict] = {}
+    for measures in all_measures:
+        for fmt, measure in measures.items():
+            total = totals.setdefault(fmt, dict.fromkeys(measure, 0))
+            for key, value in measure.items():
+                total[key] = None if value is None or total[key] is None else total[key] + value
+    return totals
+
+
+def format_table(rows: list[tuple[str, str, dict]]) -> str:
+    """Fixed width table of the measures, the times in milliseconds."""
+    header = ("File", "Format", "Raw", "Gzip", "Brotli", "Encode ms", "Decode ms")
+    lines: list[tuple[str, ...]] = [header]
+    for name, fmt, measure in rows:
+        sizes = [measure[key] for key in ("raw_bytes", "gzip_bytes", "brotli_bytes")]
+        lines.append(
+            (
+                name,
+                fmt,
+                *("-" if size is None else str(size) for size in sizes),
+                f"{measure['encode_s'] * 1000:.2f}",
+                f"{measure['decode_s'] * 1000:.2f}",
+            )
+        )
+    widths = [max(len(line[column]) for line in lines) for column in range(len(header))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) if column < 2 else cell.rjust(width) for column, (cell, width) in enumerate(zip(line, widths))) for line in lines
+    )
+
+
+if __name__ == "__main__":
+    compare_formats()
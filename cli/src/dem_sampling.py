@@ -0,0 +1,191 @@
+import math
+from typing import TYPE_CHECKING
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+
+import gpxpy.geo
+import gpxpy.gpx
+import numpy as np
+
+if TYPE_CHECKING:
+    from cli.src.elevation import GeoElevationData
+
+# some random intervals to randomize a bit, see GeoElevationData._add_sampled_elevations()
+SAMPLING_INTERVALS_METERS = (35, 141, 241)
+
+
+class DemSamples(NamedTuple):
+    """What add_dem_elevations() found beside the track elevations, the sources being indices in GeoElevationData.versions."""
+
+    waypoint_elevations: list[Optional[float]]
+    waypoint_sources: list[int]
+    track_sources: dict[gpxpy.gpx.GPXTrack, int]
+
+
+def step_distances(latitudes: np.ndarray, longitudes: np.ndarray, backwards: bool = False) -> np.ndarray:
+    """
+    Vectorized gpxpy distance_2d() from each point to the previous one, 0 for the first point.
+    As gpxpy, the haversine formula is only used for points far from each other.
+    Args:
+        latitudes: Latitudes of the line.
+        longitudes: Longitudes of the line.
+        backwards: Measure from the previous point to each point instead, which is not exactly the
+            same length since gpxpy takes the cosine of the latitude of the point measured from.
+    """
+    if len(latitudes) < 2:
+        return np.zeros(len(latitudes))
+    lat1, lon1 = latitudes[1:], longitudes[1:]
+    lat2, lon2 = latitudes[:-1], longitudes[:-1]
+    if backwards:
+        lat1, lon1, lat2, lon2 = lat2, lon2, lat1, lon1
+    # the cosines of the math module, for exactly the same lengths as gpxpy
+    coef = np.fromiter(map(math.cos, map(math.radians, lat1.tolist())), dtype=np.float64, count=len(lat1))
+    x = lat1 - lat2
+    y = (lon1 - lon2) * coef
+    distances = np.sqrt(x * x + y * y) * gpxpy.geo.ONE_DEGREE
+    far = (np.abs(lat1 - lat2) > 0.2) | (np.abs(lon1 - lon2) > 0.2)
+    for idx in np.flatnonzero(far).tolist():
+        distances[idx] = gpxpy.geo.haversine_distance(lat1[idx], lon1[idx], lat2[idx], lon2[idx])
+    return np.concatenate(([0.0], distances))
+
+
+def interval_samples(lengths: np.ndarray, min_interval_length: float) -> np.ndarray:
+    """
+    Find out the points sampled along a line, same logic as GeoElevationData._add_interval_elevations():
+    the first and last points, and a point each time the length exceeds the next multiple of the interval.
+
+    Args:
+        lengths: Length of the line from the first point to each point, in meters.
+        min_interval_length: Interval in meters.
+
+    Returns:
+        Boolean mask of the sampled points.
+    """
+    mask = np.zeros(len(lengths), dtype=bool)
+    if not len(mask):
+        return mask
+    mask[0] = mask[-1] = True
+    threshold = min_interval_length
+    for idx, length in enumerate(lengths[1:-1].tolist(), start=1):
+        if length > threshold:
+            threshold += min_interval_length
+            mask[idx] = True
+    return mask
+
+
+def fill_missing(steps: np.ndarray, back_steps: np.ndarray, elevations: np.ndarray) -> np.ndarray:
+    """
+    Interpolate linearly along the line the NaN elevations between two known elevations,
+    exactly as gpxpy add_missing_elevations(). The NaN elevations before the first known one
+    and after the last known one are kept.
+
+    Args:
+        steps: Distance from each point to the previous one, see step_distances().
+        back_steps: Distance from the previous point to each point, gpxpy measuring the last span
+            of a gap this way.
+        elevations: Elevations of the line, NaN if unknown.
+    """
+    known = np.flatnonzero(~np.isnan(elevations))
+    gaps = np.flatnonzero(np.diff(known) > 1)
+    if not len(gaps):
+        return elevations
+    # longest gaps first, so that the gaps still being walked are the first ones
+    sizes = known[gaps + 1] - known[gaps] - 1
+    order = np.argsort(-sizes, kind="stable")
+    starts, ends, sizes = known[gaps][order], known[gaps + 1][order], sizes[order]
+    # the distances are summed from the start of each gap as gpxpy does, not to be rounded differently
+    distances = np.zeros(len(elevations))
+    running = np.zeros(len(starts))
+    for offset, count in enumerate(np.searchsorted(-sizes, -np.arange(1, sizes[0] + 1), side="right").tolist(), start=1):
+        indices = starts[:count] + offset
+        running[:count] += steps[indices]
+        distances[indices] = running[:count]
+    totals = np.where(back_steps[ends] != 0, running + back_steps[ends], 0.0)
+    gap_ids = np.repeat(np.arange(len(starts)), sizes)
+    missing = starts[gap_ids] + np.arange(len(gap_ids)) - np.repeat(np.cumsum(sizes) - sizes, sizes) + 1
+    ratios = np.divide(distances[missing], totals[gap_ids], out=np.zeros(len(missing)), where=totals[gap_ids] != 0)
+    result = elevations.copy()
+    start_elevations, end_elevations = elevations[starts[gap_ids]], elevations[ends[gap_ids]]
+    result[missing] = start_elevations + ratios * (end_elevations - start_elevations)
+    return result
+
+
+def sampled_elevations(
+    elevation_data: "GeoElevationData", latitudes: np.ndarray, longitudes: np.ndarray, sizes: Sequence[int]
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Elevation profile of lines, same result as GeoElevationData.add_elevations(smooth=True):
+    for each interval of SAMPLING_INTERVALS_METERS, the DEM is sampled along the line and
+    interpolated in between, then the profiles are averaged. The DEM is queried once for the
+    points sampled by any interval.
+
+    Args:
+        elevation_data: Elevation service.
+        latitudes: Latitudes of the lines, one after the other.
+        longitudes: Longitudes of the lines, one after the other.
+        sizes: Number of points of each line.
+
+    Returns:
+        Array of elevations in meters, NaN if unknown, and array of the sources of the sampled
+        points (see GeoElevationData.get_elevations_and_sources()), -1 if not sampled or unknown.
+    """
+    bounds = np.concatenate(([0], np.cumsum(sizes, dtype=np.intp)))
+    steps = np.empty(len(latitudes))
+    back_steps = np.empty(len(latitudes))
+    masks = np.empty((len(SAMPLING_INTERVALS_METERS), len(latitudes)), dtype=bool)
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        steps[start:end] = step_distances(latitudes[start:end], longitudes[start:end])
+        back_steps[start:end] = step_distances(latitudes[start:end], longitudes[start:end], backwards=True)
+        lengths = np.cumsum(steps[start:end])
+        for interval_idx, interval in enumerate(SAMPLING_INTERVALS_METERS):
+            masks[interval_idx, start:end] = interval_samples(lengths, interval)
+    sampled = masks.any(axis=0)
+    dem_elevations = np.full(len(latitudes), np.nan)
+    dem_sources = np.full(len(latitudes), -1, dtype=np.intp)
+    dem_elevations[sampled], dem_sources[sampled] = elevation_data.get_elevations_and_sources(latitudes[sampled], longitudes[sampled])
+    profiles = np.where(masks, dem_elevations, np.nan)
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        for profile in profiles:
+            profile[start:end] = fill_missing(steps[start:end], back_steps[start:end], profile[start:end])
+    return (profiles[0] + profiles[1] + profiles[2]) / 3.0, dem_sources
+
+
+def majority_source(sources: np.ndarray) -> int:
+    """Return the source of most of the known elevations, the first DEM if none."""
+    known = sources[sources >= 0]
+    return int(np.bincount(known).argmax()) if len(known) else 0
+
+
+def add_dem_elevations(gpx: gpxpy.gpx.GPX, elevation_data: "GeoElevationData") -> DemSamples:
+    """
+    Replace the elevation of the track and route points by DEM data, the GPS elevation being not as
+    accurate, same as GeoElevationData.add_elevations(smooth=True) does for tracks, see
+    sampled_elevations(). As before, the elevations of the waypoints are removed, their DEM
+    elevations being queried in the same batch and returned. The GPX data is walked once to collect
+    the coordinates and once to write the elevations back.
+    Returns:
+        The DEM elevation of each waypoint, None if unknown, the DEM of each waypoint and the DEM
+        providing most of the sampled elevations of each track.
+    """
+    lines: list[list] = [segment.points for track in gpx.tracks for segment in track.segments]
+    lines += [route.points for route in gpx.routes]
+    lines += [[waypoint] for waypoint in gpx.waypoints]
+    points = [point for line in lines for point in line]
+    sources = np.zeros(0, dtype=np.intp)
+    if points:
+        coordinates = np.array([(point.latitude, point.longitude) for point in points], dtype=np.float64)
+        elevations, sources = sampled_elevations(elevation_data, coordinates[:, 0], coordinates[:, 1], [len(line) for line in lines])
+        for point, elevation in zip(points, elevations.tolist()):
+            point.elevation = None if math.isnan(elevation) else elevation
+    track_sources = {}
+    start = 0
+    for track in gpx.tracks:
+        end = start + sum(len(segment.points) for segment in track.segments)
+        track_sources[track] = majority_source(sources[start:end])
+        start = end
+    waypoint_elevations = [waypoint.elevation for waypoint in gpx.waypoints]
+    for waypoint in gpx.waypoints:
+        waypoint.elevation = None
+    waypoint_sources = sources[len(points) - len(gpx.waypoints) :]
+    return DemSamples(waypoint_elevations, np.maximum(waypoint_sources, 0).tolist(), track_sources)
@@ -14,51 +14,44 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json as mod_json
 import math as mod_math
 import os as mod_os
 import os.path as mod_path
 import re as mod_re
 import struct as mod_struct
+import sys as mod_sys
+import tempfile as mod_tempfile
 import threading as mod_threading
+import time as mod_time
 import zipfile as mod_zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
 from io import BytesIO as cStringIO
+from typing import TYPE_CHECKING
+from typing import Iterator
 from typing import Optional
+from typing import Sequence
 
-import requests as mod_requests
-from osgeo import gdal as mod_gdal
+if TYPE_CHECKING:
+    # requests and GDAL are imported when needed because the tiles are usually already cached
+    import numpy as np
 
-mod_gdal.UseExceptions()
-ONE_DEGREE = 1000.0 * 10000.8 / 90.0
-
-
-class EarthDataSession(mod_requests.Session):
-    """
-    Modify requests.Session to preserve Auth headers.
-
-    Class comes from NASA docs on accessing their data servers.
-    """
+    from cli.src.earthdata import EarthDataSession
 
-    AUTH_HOST = "urs.earthdata.nasa.gov"
+ONE_DEGREE = 1000.0 * 10000.8 / 90.0
+DEFAULT_BASE_URL = "https://e4ftl01.cr.usgs.gov"
+# elevation of the locations of the tiles missing from the dataset, usually the ocean
+ABSENT_TILE_ELEVATIONS = {
+    "sea_level": 0.0,
+    "void": None,
+}
+# days before a tile not found is requested again
+DEFAULT_MISSING_TILES_TTL = 30.0
 
-    def __init__(self, username: str, password: str):
-        super().__init__()
-        self.auth = (username, password)
 
-    def rebuild_auth(
-        self,
-        prepared_request: mod_requests.PreparedRequest,
-        response: mod_requests.Response,
-    ) -> None:
-        """
-        Overrides from the library to keep headers when redirected to or from the NASA auth host.
-        """
-        headers = prepared_request.headers
-        url = prepared_request.url
-        if "Authorization" in headers:
-            original_parsed = mod_requests.utils.urlparse(response.request.url)  # type: ignore[attr-defined]
-            redirect_parsed = mod_requests.utils.urlparse(url)  # type: ignore[attr-defined]
-            if redirect_parsed.hostname != self.AUTH_HOST and original_parsed.hostname not in {self.AUTH_HOST, redirect_parsed.hostname}:
-                del headers["Authorization"]
+class MissingTileError(FileNotFoundError):
+    """The tile does not exist in the dataset, usually because it is only covered by the ocean."""
 
 
 class GeoElevationFile:
@@ -118,6 +111,16 @@ class GeoElevationFile:
             return result
         return None
 
+    def get_elevations(self, latitudes: "np.ndarray", longitudes: "np.ndarray") -> "np.ndarray":
+        """Vectorized get_elevation() of locations within the file, NaN if invalid."""
+        import numpy as np
+
+        rows = np.floor((self.latitude + 1 - latitudes) * float(self.square_side - 1)).astype(np.intp)
+        columns = np.floor((longitudes - self.longitude) * float(self.square_side - 1)).astype(np.intp)
+        result = np.frombuffer(self.data, dtype=">i2")[rows * self.square_side + columns].astype(np.float64)
+        result[(result > 9000) | (result < -500)] = np.nan
+        return result
+
     @staticmethod
     def starting_position(file_name: str) -> tuple[float, float]:
         """Returns (latitude, longitude) of the lower left corner."""
@@ -134,25 +137,41 @@ class GeoElevationData:
 
     Note that files are loaded in memory, so if you need to find
     elevations for multiple points on the earth -- this will load
-    *many* files in memory!
-    """
+    *many* files in memory! Set `max_tiles` to bound the memory usage.
 
-    # Tiles currently loaded in memory for fast access.
-    # Keys are of form: 'N00E000v2.1a'.
-    # Share memory with other instances.
-    tiles: dict[str, GeoElevationFile] = {}
+    One instance is meant to be shared across a batch run so that the loaded
+    tiles, the HTTP session and the stats are reused from one file to another.
+    The instance is a context manager closing the HTTP session.
+    """
 
     def __init__(
         self,
         version: str,
         earth_data_user: Optional[str] = "",
         earth_data_password: Optional[str] = "",
+        max_tiles: Optional[int] = None,
+        *,
+        base_url: Optional[str] = None,
+        auth_host: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        absent_tiles: Optional[str] = None,
+        missing_tiles_ttl: Optional[float] = None,
+        fallback_versions: Sequence[str] = (),
     ):
         """
         Args:
             version: str of a version to load by default.
             earth_data_user: str of EarthData username
             earth_data_password: str of EarthData password
+            max_tiles: maximum number of tiles kept in memory, None for no limit
+            base_url: str of the data server, `DEM_BASE_URL` env var or the LP DAAC server by default
+            auth_host: str of the EarthData login host, `EARTHDATA_AUTH_HOST` env var or the NASA host by default
+            cache_dir: str of the folder of the downloaded tiles, `DEM_CACHE_DIR` env var or `~/.cache/srtm` by default
+            absent_tiles: str of the elevation of the tiles missing from the dataset, see ABSENT_TILE_ELEVATIONS,
+                `DEM_ABSENT_TILES` env var or sea level by default
+            missing_tiles_ttl: float of days before a tile not found is requested again, `DEM_MISSING_TILES_TTL` env var
+                or DEFAULT_MISSING_TILES_TTL by default, 0 to request them all again
+            fallback_versions: versions filling in order the voids and the missing tiles of `version`
 
         """
         self.version = version
@@ -162,40 +181,121 @@ class GeoElevationData:
             raise ValueError("Missing NASA creds")
         self.earth_data_user = str(earth_data_user)
         self.earth_data_password = str(earth_data_password)
+        self.max_tiles = max_tiles
+        self.base_url = base_url or mod_os.environ.get("DEM_BASE_URL") or DEFAULT_BASE_URL
+        self.auth_host = auth_host or mod_os.environ.get("EARTHDATA_AUTH_HOST")
+        self.cache_dir = cache_dir or mod_os.environ.get("DEM_CACHE_DIR") or GeoElevationData.default_cache_dir()
+        mod_os.makedirs(self.cache_dir, exist_ok=True)
+        absent_tiles = absent_tiles or mod_os.environ.get("DEM_ABSENT_TILES") or "sea_level"
+        if absent_tiles not in ABSENT_TILE_ELEVATIONS:
+            raise ValueError(f"Unknown absent tiles handling `{absent_tiles}'")
+        self.absent_tile_elevation = ABSENT_TILE_ELEVATIONS[absent_tiles]
+        if missing_tiles_ttl is None:
+            missing_tiles_ttl = float(mod_os.environ.get("DEM_MISSING_TILES_TTL") or DEFAULT_MISSING_TILES_TTL)
+        self.missing_tiles_ttl = missing_tiles_ttl
+
+        # Tiles currently loaded in memory for fast access, least recently used first.
+        # Keys are of form: 'N00E000_SRTMGL1v3'.
+        self.tiles: OrderedDict[str, GeoElevationFile] = OrderedDict()
+
+        # Tiles recently found missing from the dataset on this server, not requested again, see missing_tiles_file_name().
+        self.missing_tiles = self.read_missing_tiles()
+
+        # Created on the first download and reused until closed.
+        self.session: Optional["EarthDataSession"] = None
+
+        # Number of tiles loaded from the cache folder or the network, and number of downloads.
+        self.stats = {
+            "tile_loads": 0,
+            "tile_downloads": 0,
+        }
+
+        # Datasets queried where this one has no data, sharing the cache folder and the stats.
+        self.fallbacks = [
+            GeoElevationData(
+                fallback_version,
+                earth_data_user,
+                earth_data_password,
+                max_tiles,
+                base_url=self.base_url,
+                auth_host=self.auth_host,
+                cache_dir=self.cache_dir,
+                missing_tiles_ttl=self.missing_tiles_ttl,
+            )
+            for fallback_version in fallback_versions
+        ]
+        for fallback in self.fallbacks:
+            fallback.stats = self.stats
+
+    @property
+    def versions(self) -> list[str]:
+        """The version of each source of the elevations, see get_elevations_and_sources()."""
+        return [self.version] + [fallback.version for fallback in self.fallbacks]
+
+    def __enter__(self) -> "GeoElevationData":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the HTTP sessions if any. Loaded tiles are kept."""
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        for fallback in self.fallbacks:
+            fallback.close()
 
     @staticmethod
-    def get_srtm_dir() -> str:
+    def default_cache_dir() -> str:
         """The default path to store files."""
-        result = mod_path.join(mod_os.environ["HOME"], ".cache", "srtm")
+        return mod_path.join(mod_os.environ["HOME"], ".cache", "srtm")
 
-        try:
-            mod_os.makedirs(result)
-        except FileExistsError:
-            pass
-
-        return result
+    def file_path(self, file_name: str) -> str:
+        return mod_path.join(self.cache_dir, file_name)
 
-    @staticmethod
-    def file_exists(file_name: str) -> bool:
+    def file_exists(self, file_name: str) -> bool:
         """
         Return True if the path refers to an existing path or an open file descriptor.
         Returns False for broken symbolic links (that could happen if it is linked
         to an external hard drive that is not mounted).
         """
-        return mod_path.exists(mod_path.join(GeoElevationData.get_srtm_dir(), file_name))
+        return mod_path.exists(self.file_path(file_name))
 
-    @staticmethod
-    def file_write(file_name: str, contents: bytes) -> bytes:
-        srtm_dir = GeoElevationData.get_srtm_dir()
-        source_file_path = mod_path.join(srtm_dir, file_name)
-        with open(source_file_path, "wb") as f:
-            f.write(contents)
+    def file_write(self, file_name: str, contents: bytes) -> bytes:
+        """
+        Save the tile in the cache folder, converted from GeoTIFF to HGT if needed.
+        The tile is written to a temporary file renamed once complete, so that
+        other processes never read a truncated tile.
+
+        Returns:
+            The HGT data.
 
-        # GeoTIFF to HGT conversion if needed
+        """
         if file_name.endswith(".tif"):
+            contents = self.translate_geotiff(file_name, contents)
+            file_name = file_name[: -len(".tif")] + ".hgt"
+        fd, temp_path = mod_tempfile.mkstemp(prefix=f".{file_name}.", suffix=".tmp", dir=self.cache_dir)
+        try:
+            with mod_os.fdopen(fd, "wb") as f:
+                f.write(contents)
+            mod_os.replace(temp_path, self.file_path(file_name))
+        except BaseException:
+            mod_os.remove(temp_path)
+            raise
+        return contents
+
+    def translate_geotiff(self, file_name: str, contents: bytes) -> bytes:
+        """GeoTIFF to HGT conversion, in a temporary folder of the cache folder."""
+        from osgeo import gdal as mod_gdal
+
+        mod_gdal.UseExceptions()
+        with mod_tempfile.TemporaryDirectory(dir=self.cache_dir) as temp_dir:
+            source_file_path = mod_path.join(temp_dir, file_name)
+            with open(source_file_path, "wb") as source_file:
+                source_file.write(contents)
             # GDAL expects something like N69E021.HGT
-            dest_file = file_name.split("_")[0] + ".HGT"
-            dest_file_path = mod_path.join(srtm_dir, dest_file)
+            dest_file_path = mod_path.join(temp_dir, file_name.split("_")[0] + ".HGT")
             event = mod_threading.Event()
 
             def callback(complete: float, *_):
@@ -204,20 +304,71 @@ class GeoElevationData:
 
             mod_gdal.Translate(dest_file_path, source_file_path, callback=callback)
             event.wait()
-            contents = GeoElevationData.file_read(dest_file)
-            mod_os.rename(dest_file_path, source_file_path.replace(".tif", ".hgt"))
-            mod_os.remove(dest_file_path + ".aux.xml")
-            mod_os.remove(source_file_path)
-
-        return contents
+            with open(dest_file_path, "rb") as dest_file:
+                return dest_file.read()
 
-    @staticmethod
-    def file_read(file_name: str) -> bytes:
-        with open(mod_path.join(GeoElevationData.get_srtm_dir(), file_name), "rb") as f:
+    def file_read(self, file_name: str) -> bytes:
+        with open(self.file_path(file_name), "rb") as f:
             return f.read()
 
+    def missing_tiles_file_name(self) -> str:
+        """
+        The registry of the tiles missing from the dataset, shared by the runs using the cache folder.
+        The time each tile was not found is saved by server, so that another server or a fixed one is not
+        affected, and the tiles are requested again after missing_tiles_ttl days.
+        """
+        return f"missing_tiles_{self.version}.json"
+
+    def read_missing_tiles_registry(self) -> dict[str, dict[str, float]]:
+        """The time each tile was not found, by server. The lists of tiles written by previous versions are ignored."""
+        if not self.file_exists(self.missing_tiles_file_name()):
+            return {}
+        registry = mod_json.loads(self.file_read(self.missing_tiles_file_name()))
+        return registry if isinstance(registry, dict) else {}
+
+    def recent_missing_tiles(self, registry: dict[str, dict[str, float]]) -> dict[str, float]:
+        """The tiles of the registry not found on this server within missing_tiles_ttl days."""
+        oldest = mod_time.time() - self.missing_tiles_ttl * 86400
+        return {tilename: found_time for tilename, found_time in registry.get(self.base_url, {}).items() if found_time > oldest}
+
+    def read_missing_tiles(self) -> set[str]:
+        return set(self.recent_missing_tiles(self.read_missing_tiles_registry()))
+
+    def add_missing_tile(self, tilename: str) -> None:
+        """Remember that the tile does not exist, in memory and in the registry, the expired tiles being removed."""
+        self.missing_tiles.add(tilename)
+        with self.file_lock(f"missing_tiles_{self.version}"):
+            registry = self.read_missing_tiles_registry()
+            missing_tiles = self.recent_missing_tiles(registry)
+            missing_tiles[tilename] = mod_time.time()
+            registry[self.base_url] = missing_tiles
+            self.missing_tiles |= set(missing_tiles)
+            self.file_write(self.missing_tiles_file_name(), mod_json.dumps(registry, indent=1, sort_keys=True).encode("utf-8"))
+
+    @contextmanager
+    def file_lock(self, filename: str) -> Iterator[None]:
+        """
+        Advisory lock of a file of the cache folder shared by all the processes using it,
+        so that a tile is downloaded once. No lock on systems without fcntl.
+
+        Args:
+            filename: str of the locked file without extension (form "N00E000_SRTMGL1v3")
+
+        """
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        with open(self.file_path(f".{filename}.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
     @staticmethod
-    def build_url(tilename: str, version: str) -> str:
+    def build_url(tilename: str, version: str, base_url: str = DEFAULT_BASE_URL) -> str:
         """
         Return the URL to for the given tilename and version.
 
@@ -225,15 +376,16 @@ class GeoElevationData:
             tilename: str of the tile (form "N00E000")
             version: str of the SRTM data version and resolution to get.
                 Values can be _ASTGTMv003, v3.1a
+            base_url: str of the data server
 
         Returns:
             The URL to the file or None if the tile does not exist
 
         """
         if version == "ASTGTMv3":
-            return f"https://e4ftl01.cr.usgs.gov/ASTT/ASTGTM.003/2000.03.01/ASTGTMV003_{tilename}.zip"
+            return f"{base_url}/ASTT/ASTGTM.003/2000.03.01/ASTGTMV003_{tilename}.zip"
         if version == "SRTMGL1v3":
-            return f"https://e4ftl01.cr.usgs.gov/MEASURES/SRTMGL1.003/2000.02.11/{tilename}.SRTMGL1.hgt.zip"
+            return f"{base_url}/MEASURES/SRTMGL1.003/2000.02.11/{tilename}.SRTMGL1.hgt.zip"
         raise AttributeError("Bad version")
 
     def get_elevation(self, latitude: float, longitude: float) -> Optional[float]:
@@ -245,22 +397,109 @@ class GeoElevationData:
             longitude: float of the longitude in decimal degrees
 
         Returns:
-            A float passed back from GeoElevationFile.get_elevation().
+            A float passed back from GeoElevationFile.get_elevation(), from the fallbacks if void.
             Value should be the elevation of the point in meters.
 
         """
-        version = self.version
         tilename = GeoElevationData.get_tilename(latitude, longitude)
-        geo_elevation_file: Optional[GeoElevationFile]
-        filename = f"{tilename}_{version}"
-        if filename in self.tiles:
-            geo_elevation_file = self.tiles[filename]
-        else:
-            geo_elevation_file = self._load_tile(tilename)
-
-        if geo_elevation_file:
+        if not self.fallbacks:  # fast path of the point by point sampling
+            geo_elevation_file = self._get_tile(tilename)
+            if geo_elevation_file is None:
+                return self.absent_tile_elevation
             return geo_elevation_file.get_elevation(latitude, longitude)
-        return None
+        has_tile = False
+        for _, geo_elevation_file in self._fused_tiles(tilename):
+            has_tile = True
+            elevation = geo_elevation_file.get_elevation(latitude, longitude)
+            if elevation is not None:
+                return elevation
+        return None if has_tile else self.absent_tile_elevation
+
+    def get_elevations(self, latitudes: "np.ndarray", longitudes: "np.ndarray") -> "np.ndarray":
+        """
+        Vectorized get_elevation(), each tile being looked up once.
+
+        Args:
+            latitudes: array of latitudes in decimal degrees
+            longitudes: array of longitudes in decimal degrees
+
+        Returns:
+            Array of elevations in meters, NaN if invalid.
+
+        """
+        return self.get_elevations_and_sources(latitudes, longitudes)[0]
+
+    def get_elevations_and_sources(self, latitudes: "np.ndarray", longitudes: "np.ndarray") -> tuple["np.ndarray", "np.ndarray"]:
+        """
+        Vectorized get_elevation(), the voids of each dataset being filled by the next one, see fallback_versions.
+
+        Args:
+            latitudes: array of latitudes in decimal degrees
+            longitudes: array of longitudes in decimal degrees
+
+        Returns:
+            Array of elevations in meters, NaN if invalid, and array of the index in `versions`
+            of the dataset providing each elevation, -1 if invalid.
+
+        """
+        import numpy as np
+
+        result = np.full(len(latitudes), np.nan)
+        sources = np.full(len(latitudes), -1, dtype=np.intp)
+        corners, tile_indices = np.unique(np.column_stack((np.floor(latitudes), np.floor(longitudes))), axis=0, return_inverse=True)
+        tile_indices = tile_indices.reshape(-1)
+        for tile_index, (latitude, longitude) in enumerate(corners.tolist()):
+            indices = np.flatnonzero(tile_indices == tile_index)
+            has_tile = False
+            for source, geo_elevation_file in self._fused_tiles(GeoElevationData.get_tilename(latitude, longitude)):
+                has_tile = True
+                elevations = geo_elevation_file.get_elevations(latitudes[indices], longitudes[indices])
+                known = ~np.isnan(elevations)
+                result[indices[known]] = elevations[known]
+                sources[indices[known]] = source
+                indices = indices[~known]
+                if not len(indices):
+                    break
+            if not has_tile and self.absent_tile_elevation is not None:
+                result[indices] = self.absent_tile_elevation
+                sources[indices] = 0
+        return result, sources
+
+    def _fused_tiles(self, tilename: str) -> Iterator[tuple[int, GeoElevationFile]]:
+        """
+        The tile of this dataset then of the fallbacks with their index in `versions`, each one being
+        loaded only if the previous ones have voids. The datasets missing the tile are skipped.
+
+        Raises:
+            NotImplementedError: If no dataset has the tile and one of them has to be downloaded manually.
+
+        """
+        not_downloaded: Optional[NotImplementedError] = None
+        has_tile = False
+        for source, elevation_data in enumerate([self, *self.fallbacks]):
+            try:
+                geo_elevation_file = elevation_data._get_tile(tilename)
+            except NotImplementedError as err:
+                not_downloaded = err
+                continue
+            if geo_elevation_file is not None:
+                has_tile = True
+                yield source, geo_elevation_file
+        if not has_tile and not_downloaded is not None:
+            raise not_downloaded
+
+    def _get_tile(self, tilename: str) -> Optional[GeoElevationFile]:
+        """The tile from memory if already loaded, otherwise see _load_tile(). None if missing from the dataset."""
+        filename = f"{tilename}_{self.version}"
+        if filename in self.tiles:
+            self.tiles.move_to_end(filename)
+            return self.tiles[filename]
+        if tilename in self.missing_tiles:
+            return None
+        try:
+            return self._load_tile(tilename)
+        except MissingTileError:
+            return None
 
     def _fetch(self, url: str) -> bytes:
         """
@@ -273,19 +512,50 @@ class GeoElevationData:
             Data contained in the file at the requested URL.
 
         """
-        with EarthDataSession(self.earth_data_user, self.earth_data_password) as s:
-            response = s.get(url, timeout=30)
-            response.raise_for_status()
-            return response.content
+        if self.session is None:
+            from cli.src.earthdata import EarthDataSession
+
+            self.session = EarthDataSession(self.earth_data_user, self.earth_data_password, self.auth_host)
+        response = self.session.get(url, timeout=30)
+        if response.status_code == 404:
+            raise MissingTileError(f"Not found: {url}")
+        response.raise_for_status()
+        return response.content
 
     def _download_tile(self, tilename: str) -> bytes:
+        """
+        Download the tile into the cache folder, unless another process has just done it.
+
+        Raises:
+            MissingTileError: If the tile does not exist, which is saved in the registry of the missing tiles
+                with a warning, as a wrong server is also answering so.
+
+        """
         filename = f"{tilename}_{self.version}"
+        if tilename in self.missing_tiles:
+            raise MissingTileError(f"No tile {filename}")
         if "JdF" in self.version:
-            srtm_dir = GeoElevationData.get_srtm_dir()
-            raise NotImplementedError(f"Please download `{filename}.hgt' to {srtm_dir} and retry.")
-        url = GeoElevationData.build_url(tilename, self.version)
-        data = GeoElevationData.unzip(self._fetch(url))
-        return GeoElevationData.file_write(f"{filename}.{self.extension}", data)
+            raise NotImplementedError(f"Please download `{filename}.hgt' to {self.cache_dir} and retry.")
+        with self.file_lock(filename):
+            if self.file_exists(f"{filename}.hgt"):
+                return self.file_read(f"{filename}.hgt")
+            if tilename in self.read_missing_tiles():  # found missing by another process meanwhile
+                self.missing_tiles.add(tilename)
+                raise MissingTileError(f"No tile {filename}")
+            url = GeoElevationData.build_url(tilename, self.version, self.base_url)
+            try:
+                archive = self._fetch(url)
+            except MissingTileError:
+                self.add_missing_tile(tilename)
+                locations = "at sea level" if self.absent_tile_elevation == 0.0 else "without elevation"
+                print(
+                    f"Warning: {url} not found, its locations are {locations} for {self.missing_tiles_ttl:g} days, "
+                    "see DEM_BASE_URL and DEM_MISSING_TILES_TTL if unexpected.",
+                    file=mod_sys.stderr,
+                )
+                raise
+            self.stats["tile_downloads"] += 1
+            return self.file_write(f"{filename}.{self.extension}", GeoElevationData.unzip(archive))
 
     def _load_tile(self, tilename: str) -> GeoElevationFile:
         """
@@ -294,7 +564,8 @@ class GeoElevationData:
         Check to see if the tile needed is stored in the local cache.
         If it isn't, download the tile from the network and save it
         in the local cache in uncompressed form. Load the tile into memory as a
-        GeoElevationFile in the GeoElevationData.tiles dictionary.
+        GeoElevationFile in the tiles dictionary, and evict the least
+        recently used tile if there are more than `max_tiles`.
         Return the tile.
 
         Args:
@@ -308,8 +579,8 @@ class GeoElevationData:
         data = None
         filename = f"{tilename}_{self.version}"
         file_with_ext = f"{filename}.hgt"
-        if GeoElevationData.file_exists(file_with_ext):
-            data = GeoElevationData.file_read(file_with_ext)
+        if self.file_exists(file_with_ext):
+            data = self.file_read(file_with_ext)
 
         # download and save tile if needed
         if data is None:
@@ -317,8 +588,38 @@ class GeoElevationData:
 
         tile = GeoElevationFile(file_with_ext, data)
         self.tiles[filename] = tile
+        self.stats["tile_loads"] += 1
+        if self.max_tiles is not None:
+            while len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
         return tile
 
+    def prefetch(self, tilenames) -> list[str]:
+        """
+        Download the missing tiles into the cache folder without loading them in memory,
+        so that the processes of a batch run read them from the cache instead of downloading
+        the same tiles concurrently.
+
+        Args:
+            tilenames: iterable of tiles (form "N00E000")
+
+        Returns:
+            The tiles that could not be downloaded, the error being raised again when loaded.
+            The tiles missing from the dataset are not failures.
+
+        """
+        failed = []
+        for tilename in sorted(set(tilenames)):
+            if tilename in self.missing_tiles or self.file_exists(f"{tilename}_{self.version}.hgt"):
+                continue
+            try:
+                self._download_tile(tilename)
+            except MissingTileError:
+                pass
+            except (NotImplementedError, OSError, mod_zipfile.BadZipFile):
+                failed.append(tilename)
+        return failed
+
     @staticmethod
     def unzip(contents: bytes) -> bytes:
         with mod_zipfile.ZipFile(cStringIO(contents)) as zip_file:
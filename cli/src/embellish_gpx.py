@@ -1,13 +1,26 @@
 import datetime
+import glob
+import hashlib
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from contextlib import nullcontext
+from functools import cache
 from pathlib import Path
+from typing import TYPE_CHECKING
 from typing import Optional
+from typing import Sequence
 
 import click
 import gpxpy
 from dotenv import load_dotenv
 
-from cli.src import elevation
+from cli.src.gpx_writer import save_gpx
+
+if TYPE_CHECKING:
+    # GDAL and requests are imported when needed to start faster
+    from cli.src.elevation import GeoElevationData
 
 load_dotenv()
 DEM_DATASETS = [
@@ -16,6 +29,8 @@ DEM_DATASETS = [
     "JdF1",
     "JdF3",
 ]
+# elevation of the tiles missing from the DEM, see GeoElevationData
+ABSENT_TILES_CHOICES = ["sea_level", "void"]
 NASA_USERNAME = os.environ.get("NASA_USERNAME", "")
 NASA_PASSWORD = os.environ.get("NASA_PASSWORD", "")
 GPX_CREATOR = os.environ.get("GPX_CREATOR", "gpxpy")
@@ -23,6 +38,10 @@ GPX_AUTHOR_EMAIL = os.environ.get("GPX_AUTHOR_EMAIL", "contact@example.com")
 GPX_AUTHOR_LINK = os.environ.get("GPX_AUTHOR_LINK", "https://example.com")
 GPX_AUTHOR_NAME = os.environ.get("GPX_AUTHOR_NAME", "John Doe")
 GPX_COPYRIGHT_LICENSE = os.environ.get("GPX_COPYRIGHT_LICENSE", "All Rights Reserved")
+# embellished files, skipped when searching for GPX files
+EMBELLISHED_SUFFIXES = tuple(f".{dem.lower()}.gpx" for dem in DEM_DATASETS + ["none"])
+DEFAULT_STATE_PATH = os.path.join(os.environ.get("HOME", ""), ".cache", "embellish_gpx", "state.json")
+STATE_VERSION = 3  # bumped when the embellished content changes
 
 
 def add_dem_to_filename(filename_src: str, dem: str, output_path: Optional[str] = None) -> str:
@@ -55,12 +74,18 @@ def add_dem_to_filename(filename_src: str, dem: str, output_path: Optional[str]
 @click.option(
     "--gpx",
     required=True,
-    help="Path to the GPX file",
+    help="Path to the GPX file or directory containing GPX files",
+)
+@click.option(
+    "-R",
+    "--recursive",
+    is_flag=True,
+    help="Search for GPX files recursively",
 )
 @click.option(
     "-o",
     "--output",
-    help="Path to the directory where to save the embellished GPX file",
+    help="Path to the directory where to save the embellished GPX files",
 )
 @click.option(
     "--dem",
@@ -68,14 +93,262 @@ def add_dem_to_filename(filename_src: str, dem: str, output_path: Optional[str]
     type=click.Choice(DEM_DATASETS + ["none"], case_sensitive=False),
     help="Digital Elevation Model",
 )
-def embellish_gpx(gpx: str, output: Optional[str], dem: str) -> None:
-    embellished_gpx = add_dem_to_filename(gpx, dem, output)
-    click.echo(f"Exporting `{gpx}'...")
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of GPX files embellished concurrently",
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Embellish the GPX files even if unchanged since the last run",
+)
+@click.option(
+    "--dem-cache",
+    type=click.Path(file_okay=False),
+    help="Folder of the downloaded DEM tiles, shared by concurrent runs. Defaults to the DEM_CACHE_DIR env var or ~/.cache/srtm",
+)
+@click.option(
+    "--absent-tiles",
+    type=click.Choice(ABSENT_TILES_CHOICES),
+    help="Elevation where the DEM has no tile, usually the ocean. Defaults to the DEM_ABSENT_TILES env var or sea_level",
+)
+def embellish_gpx(
+    gpx: str,
+    recursive: bool,
+    *,
+    output: Optional[str],
+    dem: str,
+    jobs: int,
+    force: bool,
+    dem_cache: Optional[str],
+    absent_tiles: Optional[str],
+) -> None:
+    if recursive and not os.path.isdir(gpx):
+        click.echo("Recursive mode and input file are incompatible", err=True)
+        return
+    try:
+        embellished_paths = plan_embellished_paths(find_gpx_files(gpx, recursive), dem, output)
+    except ValueError as err:
+        click.echo(err, err=True)
+        return
+    embellish_gpx_files(embellished_paths, dem, jobs=jobs, force=force, cache_dir=dem_cache, absent_tiles=absent_tiles)
+
+
+def find_gpx_files(gpx: str, recursive: bool = False) -> list[str]:
+    """The GPX files of the directory, except the embellished ones, or the GPX file itself."""
+    if not os.path.isdir(gpx):
+        return [gpx]
+    return sorted(
+        filename
+        for filename in glob.iglob(gpx + "/**", recursive=recursive)
+        if os.path.isfile(filename) and filename.lower().endswith(".gpx") and not is_embellished(filename)
+    )
+
+
+def is_embellished(gpx_path: str) -> bool:
+    """Whether the GPX file has been generated by this tool, see add_dem_to_filename()."""
+    return gpx_path.lower().endswith(EMBELLISHED_SUFFIXES)
+
+
+def plan_embellished_paths(gpx_paths: list[str], dem: str, output_path: Optional[str] = None) -> dict[str, str]:
+    """
+    Find out the embellished file of each GPX file, see add_dem_to_filename().
+    Returns:
+        The path to the embellished file by GPX file.
+    Raises:
+        ValueError: If two GPX files would be embellished into the same file.
+    """
+    embellished_paths: dict[str, str] = {}
+    sources: dict[str, str] = {}
+    for gpx_path in gpx_paths:
+        embellished_path = add_dem_to_filename(gpx_path, dem, output_path)
+        if embellished_path in sources:
+            raise ValueError(f"Both `{sources[embellished_path]}' and `{gpx_path}' would be exported to `{embellished_path}'")
+        sources[embellished_path] = gpx_path
+        embellished_paths[gpx_path] = embellished_path
+    return embellished_paths
+
+
+def embellishment_fingerprint(gpx_path: str, dem: str, absent_tiles: Optional[str] = None) -> dict:
+    """What the embellished file depends on: the GPX content, the DEM and its absent tiles handling, and the metadata settings."""
+    with open(gpx_path, "rb") as gpx_file:
+        gpx_sha256 = hashlib.file_digest(gpx_file, "sha256").hexdigest()
+    metadata = [GPX_CREATOR, GPX_AUTHOR_EMAIL, GPX_AUTHOR_LINK, GPX_AUTHOR_NAME, GPX_COPYRIGHT_LICENSE]
+    return {"version": STATE_VERSION, "gpx_sha256": gpx_sha256, "dem": dem, "absent_tiles": absent_tiles, "metadata": metadata}
+
+
+def load_state(state_path: str) -> dict[str, dict]:
+    """The fingerprint of the embellished files, by absolute path."""
+    try:
+        with open(state_path, "r", encoding="utf-8") as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: dict[str, dict], state_path: str) -> None:
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    tmp_path = f"{state_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as state_file:
+        json.dump(state, state_file, sort_keys=True)
+    os.replace(tmp_path, state_path)
+
+
+def gpx_tilenames(gpx_path: str) -> set[str]:
+    """The DEM tiles of the points, found with a light XML scan instead of a full gpxpy parsing."""
+    from xml.etree import ElementTree
+
+    from cli.src.elevation import GeoElevationData
+
+    tilenames = set()
+    for _, element in ElementTree.iterparse(gpx_path):
+        if element.tag.rpartition("}")[2] in {"wpt", "rtept", "trkpt"}:
+            latitude, longitude = element.get("lat"), element.get("lon")
+            if latitude is not None and longitude is not None:
+                tilenames.add(GeoElevationData.get_tilename(float(latitude), float(longitude)))
+            element.clear()
+    return tilenames
+
+
+def prefetch_tiles(gpx_paths: list[str], dem: str, cache_dir: Optional[str] = None) -> None:
+    """Download once the tiles needed by the batch, before the processes embellishing the files start."""
+    tilenames: set[str] = set()
+    for gpx_path in gpx_paths:
+        try:
+            tilenames |= gpx_tilenames(gpx_path)
+        except (SyntaxError, ValueError):  # the error is reported when embellished
+            pass
+    with new_elevation_data(dem, cache_dir=cache_dir) as elevation_data:
+        elevation_data.prefetch(tilenames)
+
+
+@cache
+def process_elevation_data(dem_dataset: str, cache_dir: Optional[str] = None, absent_tiles: Optional[str] = None) -> "GeoElevationData":
+    """The elevation service of a worker process, shared by all the files it embellishes."""
+    return new_elevation_data(dem_dataset, cache_dir=cache_dir, absent_tiles=absent_tiles)
+
+
+def embellish_file(
+    gpx_path: str,
+    embellished_gpx_path: str,
+    dem: str,
+    elevation_data: Optional["GeoElevationData"] = None,
+    *,
+    cache_dir: Optional[str] = None,
+    absent_tiles: Optional[str] = None,
+) -> None:
+    """Embellish one file of a batch, with the elevation service of the process if not given."""
     if dem == "none":
-        embellish_gpx_without_elevation(gpx, embellished_gpx)
+        embellish_gpx_without_elevation(gpx_path, embellished_gpx_path)
     else:
-        embellish_gpx_with_elevation(gpx, embellished_gpx, dem)
-    click.echo(f"Exported `{embellished_gpx}'")
+        if elevation_data is not None:
+            embellish_gpx_with_elevation(gpx_path, embellished_gpx_path, dem, elevation_data)
+            return
+        # the HTTP session is closed after each file, the loaded tiles being kept for the next ones
+        with process_elevation_data(dem, cache_dir, absent_tiles) as process_data:
+            embellish_gpx_with_elevation(gpx_path, embellished_gpx_path, dem, process_data)
+
+
+def embellish_gpx_files(
+    embellished_paths: dict[str, str],
+    dem: str,
+    jobs: int = 1,
+    force: bool = False,
+    state_path: str = DEFAULT_STATE_PATH,
+    *,
+    cache_dir: Optional[str] = None,
+    absent_tiles: Optional[str] = None,
+) -> list[str]:
+    """
+    Embellish the GPX files, skipping those unchanged since embellished with the same DEM.
+    With several jobs, the files are embellished by a pool of processes and the missing DEM
+    tiles are downloaded beforehand. A failure is reported and does not stop the batch.
+    Args:
+        embellished_paths: Path to the embellished file by GPX file, see plan_embellished_paths().
+        dem: DEM dataset or "none".
+        jobs: Number of processes.
+        force: Embellish all the files, even if unchanged.
+        state_path: Path to the fingerprints of the embellished files.
+        cache_dir: Folder of the DEM tiles, see GeoElevationData.
+        absent_tiles: Elevation of the tiles missing from the DEM, see GeoElevationData.
+    Returns:
+        The GPX files embellished.
+    """
+    state = load_state(state_path)
+    # same default as GeoElevationData, the embellished files depending on the handling actually used
+    used_absent_tiles = None if dem == "none" else absent_tiles or os.environ.get("DEM_ABSENT_TILES") or ABSENT_TILES_CHOICES[0]
+    fingerprints = {}
+    for gpx_path, embellished_path in embellished_paths.items():
+        fingerprint = embellishment_fingerprint(gpx_path, dem, used_absent_tiles)
+        if not force and os.path.exists(embellished_path) and state.get(os.path.abspath(embellished_path)) == fingerprint:
+            click.echo(f"Up-to-date `{embellished_path}'")
+        else:
+            fingerprints[gpx_path] = fingerprint
+    done = []
+
+    def record(gpx_path: str, error: Optional[BaseException]) -> None:
+        if error is None:
+            state[os.path.abspath(embellished_paths[gpx_path])] = fingerprints[gpx_path]
+            done.append(gpx_path)
+            click.echo(f"Exported `{embellished_paths[gpx_path]}'")
+        else:
+            click.echo(f"Failed to export `{gpx_path}': {error}", err=True)
+
+    try:
+        if jobs == 1 or len(fingerprints) < 2:
+            with new_elevation_data(dem, cache_dir=cache_dir, absent_tiles=absent_tiles) if dem != "none" else nullcontext() as elevation_data:
+                for gpx_path in fingerprints:
+                    click.echo(f"Exporting `{gpx_path}'...")
+                    try:
+                        embellish_file(gpx_path, embellished_paths[gpx_path], dem, elevation_data)
+                    except Exception as err:
+                        record(gpx_path, err)
+                    else:
+                        record(gpx_path, None)
+        else:
+            if dem != "none":
+                prefetch_tiles(list(fingerprints), dem, cache_dir)
+            with ProcessPoolExecutor(max_workers=min(jobs, len(fingerprints))) as executor:
+                futures = {}
+                for gpx_path in fingerprints:
+                    click.echo(f"Exporting `{gpx_path}'...")
+                    futures[
+                        executor.submit(embellish_file, gpx_path, embellished_paths[gpx_path], dem, cache_dir=cache_dir, absent_tiles=absent_tiles)
+                    ] = gpx_path
+                for future in as_completed(futures):
+                    record(futures[future], future.exception())
+    finally:
+        if done:
+            save_state(state, state_path)
+    return done
+
+
+def new_elevation_data(
+    dem_dataset: str,
+    *,
+    cache_dir: Optional[str] = None,
+    absent_tiles: Optional[str] = None,
+    fallback_versions: Sequence[str] = (),
+) -> "GeoElevationData":
+    """
+    Create the elevation service to be shared by all the files of a run, with the NASA credentials.
+    Raises:
+        ValueError: If the credentials are needed but missing, or the absent tiles handling is unknown.
+    """
+    from cli.src.elevation import GeoElevationData
+
+    return GeoElevationData(
+        version=dem_dataset,
+        earth_data_user=NASA_USERNAME,
+        earth_data_password=NASA_PASSWORD,
+        cache_dir=cache_dir,
+        absent_tiles=absent_tiles,
+        fallback_versions=fallback_versions,
+    )
 
 
 class GPXFile:
@@ -87,26 +360,31 @@ class GPXFile:
     def __enter__(self):
         self.file = open(self.gpx_path, "r", encoding="utf-8")
         gpx = gpxpy.parse(self.file)
-        gpx.creator = GPX_CREATOR
-        gpx.author_email = GPX_AUTHOR_EMAIL
-        gpx.author_link = GPX_AUTHOR_LINK
-        gpx.author_name = GPX_AUTHOR_NAME
-        gpx.copyright_author = GPX_AUTHOR_NAME
-        gpx.copyright_license = GPX_COPYRIGHT_LICENSE
-        current_date = datetime.datetime.today()
-        gpx.copyright_year = str(current_date.year)
-        printable_date = current_date.strftime("%d-%m-%Y")
-        description = ""
-        if self.dem_dataset:
-            description += f"Elevation data source of tracks and routes is {self.dem_dataset}. "
-        description += f"Last update: {printable_date}."
-        gpx.description = description
+        embellish_metadata(gpx, self.dem_dataset)
         return gpx
 
     def __exit__(self, *args):
         self.file.close()
 
 
+def embellish_metadata(gpx: gpxpy.gpx.GPX, dem_dataset: Optional[str] = None) -> None:
+    """Set the creator, author, copyright and description of the embellished GPX data."""
+    gpx.creator = GPX_CREATOR
+    gpx.author_email = GPX_AUTHOR_EMAIL
+    gpx.author_link = GPX_AUTHOR_LINK
+    gpx.author_name = GPX_AUTHOR_NAME
+    gpx.copyright_author = GPX_AUTHOR_NAME
+    gpx.copyright_license = GPX_COPYRIGHT_LICENSE
+    current_date = datetime.datetime.today()
+    gpx.copyright_year = str(current_date.year)
+    printable_date = current_date.strftime("%d-%m-%Y")
+    description = ""
+    if dem_dataset:
+        description += f"Elevation data source of tracks and routes is {dem_dataset}. "
+    description += f"Last update: {printable_date}."
+    gpx.description = description
+
+
 def embellish_gpx_without_elevation(gpx_path: str, embellished_gpx_path: str) -> None:
     """
     Embellish the GPX file without elevation and save the result
@@ -123,11 +401,16 @@ def embellish_gpx_without_elevation(gpx_path: str, embellished_gpx_path: str) ->
     Returns:
         The result is saved into a file, nothing is returned.
     """
-    with GPXFile(gpx_path) as gpx, open(embellished_gpx_path, "w", encoding="utf-8") as fp:
-        fp.write(gpx.to_xml(version="1.1") + "\n")
+    with GPXFile(gpx_path) as gpx:
+        save_gpx(gpx, embellished_gpx_path)
 
 
-def embellish_gpx_with_elevation(gpx_path: str, embellished_gpx_path: str, dem_dataset: str) -> None:
+def embellish_gpx_with_elevation(
+    gpx_path: str,
+    embellished_gpx_path: str,
+    dem_dataset: str,
+    elevation_data: Optional["GeoElevationData"] = None,
+) -> None:
     """
     Find out the elevation profile of ``gpx_path`` thanks to elevation data
     and save the result into ``embellished_gpx_path`` which is overwritten if already existing.
@@ -136,30 +419,24 @@ def embellish_gpx_with_elevation(gpx_path: str, embellished_gpx_path: str, dem_d
         gpx_path (str): Secured path to the input file.
         embellished_gpx_path (str): Secured path to the overwritten output file.
         dem_dataset (str): DEM dataset.
+        elevation_data (GeoElevationData): Elevation service shared across a batch run.
+            A new one is created and closed if missing.
 
     Returns:
         The result is saved into a file, nothing is returned.
     """
-    elevation_data = elevation.GeoElevationData(
-        version=dem_dataset,
-        earth_data_user=NASA_USERNAME,
-        earth_data_password=NASA_PASSWORD,
-    )
+    if elevation_data is None:
+        with new_elevation_data(dem_dataset) as new_data:
+            embellish_gpx_with_elevation(gpx_path, embellished_gpx_path, dem_dataset, new_data)
+        return
+    if elevation_data.version != dem_dataset:
+        raise ValueError(f"Expected {dem_dataset} elevation data, got {elevation_data.version}")
+    from cli.src.dem_sampling import add_dem_elevations
+
     with GPXFile(gpx_path, dem_dataset) as gpx:
-        # remove GPS elevation that may not be as accurate as DEM
-        for track in gpx.tracks:
-            for segment in track.segments:
-                for point_track in segment.points:
-                    point_track.elevation = None
-        for waypoint in gpx.waypoints:
-            waypoint.elevation = None
-        for route in gpx.routes:
-            for point_route in route.points:
-                point_route.elevation = None
-
-        elevation_data.add_elevations(gpx, smooth=True)
-        with open(embellished_gpx_path, "w", encoding="utf-8") as fp:
-            fp.write(gpx.to_xml(version="1.1") + "\n")
+        # replace GPS elevation that may not be as accurate as DEM, waypoints having none
+        add_dem_elevations(gpx, elevation_data)
+        save_gpx(gpx, embellished_gpx_path)
 
 
 if __name__ == "__main__":
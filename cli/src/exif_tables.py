@@ -0,0 +1,102 @@
+import json
+import os
+import pickle
+import sys
+from functools import cache
+from typing import NamedTuple
+from typing import Optional
+
+PATH_TO_NIKON_LENSES = os.path.join(os.path.dirname(__file__), "NikonLensID.json")
+PATH_TO_OMSYSTEM_LENSES = os.path.join(os.path.dirname(__file__), "OlympusLensType.json")
+PATH_TO_COMPUTATIONAL_MODES = os.path.join(os.path.dirname(__file__), "OlympusStackedImage.json")
+LENS_SOURCES = {
+    "NIKON CORPORATION": PATH_TO_NIKON_LENSES,
+    "OM Digital Solutions": PATH_TO_OMSYSTEM_LENSES,
+}
+DEFAULT_CACHE_PATH = os.path.join(os.environ.get("HOME", ""), ".cache", "photos_manager", "exif_tables.pickle")
+TABLES_VERSION = 1
+
+
+class ExifTables(NamedTuple):
+    lens_ids: dict[str, dict[str, str]]  # maker -> lens ID -> lens name
+    lens_names: dict[str, tuple[str, ...]]  # lens name -> lens IDs, for album statistics
+    computational_modes: dict[str, str]  # "group detail", or "group" if no detail -> computational mode
+
+
+def compile_tables(lens_sources: dict[str, str], computational_modes_path: str) -> ExifTables:
+    """Read the JSON tables into flat dictionaries with interned strings."""
+    lens_ids: dict[str, dict[str, str]] = {}
+    lens_names: dict[str, list[str]] = {}
+    for maker, path in lens_sources.items():
+        with open(path, "r", encoding="utf-8") as lens_file:
+            maker_lens_ids = {sys.intern(lens_id): sys.intern(lens_name) for lens_id, lens_name in json.load(lens_file).items()}
+        lens_ids[sys.intern(maker)] = maker_lens_ids
+        for lens_id, lens_name in maker_lens_ids.items():
+            lens_names.setdefault(lens_name, []).append(lens_id)
+    with open(computational_modes_path, "r", encoding="utf-8") as computational_modes_file:
+        nested_modes = json.load(computational_modes_file)
+    computational_modes = {}
+    for group, modes in nested_modes.items():
+        if isinstance(modes, dict):
+            for detail, mode in modes.items():
+                computational_modes[sys.intern(f"{group} {detail}")] = sys.intern(mode)
+        else:
+            computational_modes[sys.intern(group)] = sys.intern(modes)
+    return ExifTables(lens_ids, {lens_name: tuple(ids) for lens_name, ids in lens_names.items()}, computational_modes)
+
+
+def sources_state(paths: list[str]) -> list[tuple[int, int]]:
+    states = []
+    for path in paths:
+        stat = os.stat(path)
+        states.append((stat.st_mtime_ns, stat.st_size))
+    return states
+
+
+def load_tables(
+    lens_sources: Optional[dict[str, str]] = None,
+    computational_modes_path: str = PATH_TO_COMPUTATIONAL_MODES,
+    cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+) -> ExifTables:
+    """
+    Load the compiled tables from the cache, or compile and cache them if a JSON table changed.
+    Args:
+        lens_sources: Path to the lens table of each maker.
+        computational_modes_path: Path to the computational modes table.
+        cache_path: Path to the cache file, None to disable the cache.
+    """
+    if lens_sources is None:
+        lens_sources = LENS_SOURCES
+    if cache_path is None:
+        return compile_tables(lens_sources, computational_modes_path)
+    paths = list(lens_sources.values()) + [computational_modes_path]
+    state = (TABLES_VERSION, list(lens_sources), paths, sources_state(paths))
+    try:
+        with open(cache_path, "rb") as cache_file:
+            cached_state, tables = pickle.load(cache_file)
+        if cached_state == state:
+            return ExifTables(*tables)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        pass
+    tables = compile_tables(lens_sources, computational_modes_path)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as cache_file:
+        pickle.dump((state, tuple(tables)), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return tables
+
+
+@cache
+def get_exif_tables() -> ExifTables:
+    """The tables of the CLI, loaded on first use."""
+    return load_tables()
+
+
+def computational_mode(tables: ExifTables, coded_mode: str) -> Optional[str]:
+    """Find out the computational mode from the `MakerNotes:StackedImage` value, e.g. '3 2'."""
+    mode = tables.computational_modes.get(coded_mode)
+    if mode is None:
+        # the detail is irrelevant to groups without details
+        mode = tables.computational_modes.get(coded_mode.partition(" ")[0])
+    return mode
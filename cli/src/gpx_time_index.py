@@ -0,0 +1,101 @@
+import datetime
+import hashlib
+import os
+import zipfile
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.path.join(os.environ.get("HOME", ""), ".cache", "gpx_time_index")
+
+
+def epoch_seconds(date_time: datetime.datetime) -> float:
+    """UTC timestamp, naive date/time being UTC as in GPX files."""
+    if date_time.tzinfo is None:
+        date_time = date_time.replace(tzinfo=datetime.timezone.utc)
+    return date_time.timestamp()
+
+
+class GpxTimeIndex:
+    """
+    Date/time and position of the track points and waypoints of a GPX file, sorted by date/time
+    so that the position at a given time is found by bisection. The index is built once per GPX
+    file and cached on disk, keyed by the hash of the file content.
+    """
+
+    def __init__(self, times: np.ndarray, longitudes: np.ndarray, latitudes: np.ndarray):
+        """
+        Args:
+            times: Sorted UTC timestamps in seconds.
+            longitudes: Longitude of each timestamp.
+            latitudes: Latitude of each timestamp.
+        """
+        if not len(times):
+            raise ValueError("GPX file does not contain any date/time!")
+        self.times = times
+        self.longitudes = longitudes
+        self.latitudes = latitudes
+
+    @classmethod
+    def from_gpx(cls, gpx_path: str | Path) -> "GpxTimeIndex":
+        """Parse the GPX file. Points without date/time are ignored."""
+        import gpxpy
+
+        with open(gpx_path, "r", encoding="utf-8") as input_gpx_file:
+            gpx = gpxpy.parse(input_gpx_file)
+        all_points = [point for track in gpx.tracks for segment in track.segments for point in segment.points] + gpx.waypoints
+        timed_points = [(epoch_seconds(point.time), point.longitude, point.latitude) for point in all_points if point.time]
+        times, longitudes, latitudes = np.array(timed_points, dtype=np.float64).reshape(-1, 3).T
+        # stable to keep the track points before the waypoints at the same time
+        order = np.argsort(times, kind="stable")
+        return cls(times[order], longitudes[order], latitudes[order])
+
+    @classmethod
+    def load(cls, gpx_path: str | Path, cache_dir: Optional[str] = DEFAULT_CACHE_DIR) -> "GpxTimeIndex":
+        """
+        Load the index from the cache, or build and cache it.
+        Args:
+            gpx_path: Path to the GPX file.
+            cache_dir: Cache folder, None to disable the cache.
+        """
+        if cache_dir is None:
+            return cls.from_gpx(gpx_path)
+        with open(gpx_path, "rb") as gpx_file:
+            cache_path = os.path.join(cache_dir, hashlib.file_digest(gpx_file, "sha256").hexdigest() + ".npz")
+        try:
+            with np.load(cache_path) as cached:
+                return cls(cached["times"], cached["longitudes"], cached["latitudes"])
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            pass
+        index = cls.from_gpx(gpx_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "wb") as cache_file:
+            np.savez(cache_file, times=index.times, longitudes=index.longitudes, latitudes=index.latitudes)
+        os.replace(tmp_path, cache_path)
+        return index
+
+    def position_at(self, date_time: datetime.datetime, interpolate: bool = False) -> tuple[float, tuple[float, float]]:
+        """
+        Find out the position at the given date/time.
+        Args:
+            date_time: Time zone aware date/time.
+            interpolate: Interpolate linearly between the fixes before and after, instead of the nearest fix.
+        Returns:
+            The time difference in seconds with the nearest fix, and the position (lon, lat).
+        """
+        timestamp = epoch_seconds(date_time)
+        after = int(np.searchsorted(self.times, timestamp))
+        before = after - 1
+        if after == len(self.times) or (before >= 0 and timestamp - self.times[before] <= self.times[after] - timestamp):
+            nearest = before
+        else:
+            nearest = after
+        delta_s = abs(timestamp - float(self.times[nearest]))
+        if interpolate and 0 <= before and after < len(self.times) and self.times[after] > self.times[before]:
+            ratio = (timestamp - self.times[before]) / (self.times[after] - self.times[before])
+            longitude = self.longitudes[before] + ratio * (self.longitudes[after] - self.longitudes[before])
+            latitude = self.latitudes[before] + ratio * (self.latitudes[after] - self.latitudes[before])
+            return delta_s, (float(longitude), float(latitude))
+        return delta_s, (float(self.longitudes[nearest]), float(self.latitudes[nearest]))
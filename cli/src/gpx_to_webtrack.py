@@ -2,7 +2,10 @@ import glob
 import os
 import re
 from collections import defaultdict
+from typing import TYPE_CHECKING
+from typing import Callable
 from typing import Optional
+from typing import TextIO
 
 import click
 import gpxpy
@@ -10,13 +13,23 @@ import gpxpy.geo
 import gpxpy.gpx
 from dotenv import load_dotenv
 
-from cli.src import elevation
+from cli.src.embellish_gpx import ABSENT_TILES_CHOICES
+from cli.src.embellish_gpx import add_dem_to_filename
+from cli.src.embellish_gpx import embellish_metadata
+from cli.src.embellish_gpx import is_embellished
+from cli.src.embellish_gpx import new_elevation_data
+from cli.src.gpx_writer import save_gpx
+from cli.src.profiling import Profiler
+from cli.src.watch import PollingWatcher
 from cli.src.webtrack import Activity
 from cli.src.webtrack import WebTrack
 
+if TYPE_CHECKING:
+    # heavy modules (NumPy, GDAL, requests) are imported when needed to start faster
+    from cli.src.dem_sampling import DemSamples
+    from cli.src.elevation import GeoElevationData
+
 load_dotenv()
-NASA_USERNAME = os.environ.get("NASA_USERNAME", "")
-NASA_PASSWORD = os.environ.get("NASA_PASSWORD", "")
 DEM_DATASETS = (
     ("SRTMGL1v3", "E"),
     ("ASTGTMv3", "G"),
@@ -24,6 +37,7 @@ DEM_DATASETS = (
     ("JdF3", "K"),
 )
 DEM_CHOICES = [dem[0] for dem in DEM_DATASETS] + ["none"]
+SIMPLIFY_TOLERANCE_METERS = 10.0  # same as gpxpy
 
 
 @click.command()
@@ -43,6 +57,18 @@ DEM_CHOICES = [dem[0] for dem in DEM_DATASETS] + ["none"]
     is_flag=True,
     help="Simplify with the Ramer-Douglas-Peucker algorithm",
 )
+@click.option(
+    "--simplify-tolerance",
+    default=SIMPLIFY_TOLERANCE_METERS,
+    show_default=True,
+    type=click.FloatRange(min=0.0),
+    help="Tolerance in meters of the simplification",
+)
+@click.option(
+    "--keep-waypoint-points",
+    is_flag=True,
+    help="Do not simplify away the track points where waypoints are snapped",
+)
 @click.option(
     "--fallback",
     is_flag=True,
@@ -59,34 +85,182 @@ DEM_CHOICES = [dem[0] for dem in DEM_DATASETS] + ["none"]
     type=click.Choice(DEM_CHOICES, case_sensitive=False),
     help="Digital Elevation Model",
 )
-def with_elevation(gpx: str, recursive: bool, simplify: bool, fallback: bool, not_flat: bool, dem: str) -> None:
-    if os.path.isdir(gpx):
-        for filename in glob.iglob(gpx + "/**", recursive=recursive):
-            if os.path.isfile(filename) and filename.lower().endswith(".gpx"):
-                gpx_to_webtrack(filename, simplify, dem, fallback, not_flat)
-    elif recursive:
-        click.echo("Recursive mode and input file are incompatible", err=True)
-    else:
-        gpx_to_webtrack(gpx, simplify, dem, fallback, not_flat)
-
+@click.option(
+    "--fill-dem",
+    multiple=True,
+    type=click.Choice(DEM_CHOICES[:-1], case_sensitive=False),
+    help="DEM filling the voids and the missing tiles of --dem, may be repeated to be queried in order",
+)
+@click.option(
+    "--profile",
+    type=click.File("a", encoding="utf-8"),
+    help="Append the time and memory used by each stage as JSON lines to this file, '-' for stdout",
+)
+@click.option(
+    "--watch",
+    is_flag=True,
+    help="Keep running and convert the GPX files again when modified",
+)
+@click.option(
+    "--embellish",
+    is_flag=True,
+    help="Also export the GPX file with DEM elevations next to it, from the same parsing and sampling",
+)
+@click.option(
+    "--dem-cache",
+    type=click.Path(file_okay=False),
+    help="Folder of the downloaded DEM tiles, shared by concurrent runs. Defaults to the DEM_CACHE_DIR env var or ~/.cache/srtm",
+)
+@click.option(
+    "--absent-tiles",
+    type=click.Choice(ABSENT_TILES_CHOICES),
+    help="Elevation where the DEM has no tile, usually the ocean. Defaults to the DEM_ABSENT_TILES env var or sea_level",
+)
+def with_elevation(
+    gpx: str,
+    recursive: bool,
+    *,
+    simplify: bool,
+    simplify_tolerance: float,
+    keep_waypoint_points: bool,
+    fallback: bool,
+    not_flat: bool,
+    dem: str,
+    fill_dem: tuple[str, ...],
+    profile: Optional[TextIO],
+    watch: bool,
+    embellish: bool,
+    dem_cache: Optional[str],
+    absent_tiles: Optional[str],
+) -> None:
+    batch_profiler = Profiler(enabled=profile is not None)
+    # one elevation service for the whole run, so that tiles and connections are reused across files
+    elevation_data = None
+    if dem != "none":
+        try:
+            elevation_data = new_elevation_data(dem, cache_dir=dem_cache, absent_tiles=absent_tiles, fallback_versions=fill_dem)
+        except ValueError as err:
+            click.echo(str(err), err=True)
+            if not fallback:
+                return
+            click.echo("Falling back with no elevation...")
+            dem = "none"
+
+    def convert(filename: str) -> None:
+        profiler = Profiler(enabled=profile is not None, name=filename)
+        gpx_to_webtrack(
+            filename,
+            simplify,
+            dem,
+            fallback,
+            not_flat,
+            simplify_tolerance=simplify_tolerance,
+            keep_waypoint_points=keep_waypoint_points,
+            profiler=profiler,
+            elevation_data=elevation_data,
+            embellish=embellish,
+        )
+        if profile is not None:
+            profiler.write_json_line(profile)
+        batch_profiler.merge(profiler)
 
-def gpx_to_webtrack(gpx: str, simplify: bool, dem: str, fallback: bool, not_flat: bool) -> None:
+    if recursive and not os.path.isdir(gpx):
+        click.echo("Recursive mode and input file are incompatible", err=True)
+        return
+    try:
+        if watch:
+            watch_and_convert(gpx, recursive, convert)
+        elif os.path.isdir(gpx):
+            for filename in glob.iglob(gpx + "/**", recursive=recursive):
+                if os.path.isfile(filename) and filename.lower().endswith(".gpx") and not is_embellished(filename):
+                    convert(filename)
+        else:
+            convert(gpx)
+    finally:
+        if elevation_data is not None:
+            elevation_data.close()
+    if profile is not None:
+        batch_profiler.write_json_line(profile)
+
+
+def watch_and_convert(gpx: str, recursive: bool, convert: Callable[[str], None]) -> None:
+    """
+    Convert the GPX files again when modified, until interrupted.
+    The process, the imports and the loaded DEM tiles are kept alive between two conversions.
+    """
+    watcher = PollingWatcher(gpx, recursive)
+    click.echo(f"Watching `{gpx}'... Press Ctrl+C to stop.")
+    try:
+        for filename in watcher.watch():
+            if is_embellished(filename):  # exported by the previous conversion
+                continue
+            try:
+                convert(filename)
+            except Exception as err:
+                # keep watching, the file may be fixed soon
+                click.echo(f"Failed to convert `{filename}': {err}", err=True)
+    except KeyboardInterrupt:
+        click.echo("Stopped watching.")
+
+
+def webtrack_source(dem: Optional[str]) -> str:
+    """Return DEM code according to the WebTrack spec."""
+    for dataset in DEM_DATASETS:
+        if dataset[0] == dem:
+            return dataset[1]
+    return ""
+
+
+def gpx_to_webtrack(
+    gpx: str,
+    simplify: bool,
+    dem: str,
+    fallback: bool,
+    not_flat: bool,
+    *,
+    simplify_tolerance: float = SIMPLIFY_TOLERANCE_METERS,
+    keep_waypoint_points: bool = False,
+    profiler: Optional[Profiler] = None,
+    elevation_data: Optional["GeoElevationData"] = None,
+    embellish: bool = False,
+) -> None:
+    """
+    Convert the GPX file to a WebTrack file next to it.
+    Args:
+        embellish: Also export the GPX file with elevations next to it, see embellish_gpx, from the same
+            parsed data. With a DEM, the elevations are sampled once for both files, before simplification.
+    """
     pre, _ = os.path.splitext(gpx)
     webtrack = ".".join([pre, "webtrack"])
+    simplify_options = {
+        "simplify_tolerance": simplify_tolerance,
+        "keep_waypoint_points": keep_waypoint_points,
+        "profiler": profiler,
+    }
+    embellished_gpx = add_dem_to_filename(gpx, dem) if embellish else None
     click.echo(f"Processing `{gpx}'...")
     if dem == "none":
         click.echo("Generating with no elevation...")
-        analysis = AnalysisWithoutElevation(gpx, webtrack, simplify)
+        analysis = AnalysisWithoutElevation(gpx, webtrack, simplify, embellished_gpx_path=embellished_gpx, **simplify_options)
         analysis.analyse_and_save()
     else:
         try:
-            analysis = AnalysisWithElevation(gpx, webtrack, simplify, dem, not_flat)  # type: ignore[assignment]
+            analysis = AnalysisWithElevation(  # type: ignore[assignment]
+                gpx,
+                webtrack,
+                simplify,
+                dem,
+                not_flat,
+                elevation_data=elevation_data,
+                embellished_gpx_path=embellished_gpx,
+                **simplify_options,
+            )
             analysis.analyse_and_save()
         except Exception as err:
             click.echo(str(err), err=True)
             if fallback:
                 click.echo("Falling back with no elevation...")
-                analysis = AnalysisWithoutElevation(gpx, webtrack, simplify)
+                analysis = AnalysisWithoutElevation(gpx, webtrack, simplify, **simplify_options)
                 analysis.analyse_and_save()
             else:
                 return
@@ -112,6 +286,11 @@ class Analysis:
         simplify: bool,
         dem_dataset: Optional[str] = None,
         forced_elevation: Optional[bool] = False,
+        *,
+        simplify_tolerance: float = SIMPLIFY_TOLERANCE_METERS,
+        keep_waypoint_points: bool = False,
+        profiler: Optional[Profiler] = None,
+        embellished_gpx_path: Optional[str] = None,
     ):
         """
         Args:
@@ -120,10 +299,19 @@ class Analysis:
             simplify (bool): Simplify the GPX data with the Ramer-Douglas-Peucker algorithm.
             dem_dataset (str): DEM dataset.
             forced_elevation (bool): True to force elevation data on track even if considered relatively flat.
+            simplify_tolerance (float): Tolerance in meters of the simplification.
+            keep_waypoint_points (bool): True to preserve the track points where waypoints are snapped.
+            profiler (Profiler): Measure each stage, disabled by default.
+            embellished_gpx_path (str): Also export the parsed GPX data with metadata and
+                elevations, before simplification. See embellish().
         """
         self.gpx_path = gpx_path
         self.webtrack_path = webtrack_path
         self.simplify = simplify
+        self.simplify_tolerance = simplify_tolerance
+        self.keep_waypoint_points = keep_waypoint_points
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.embellished_gpx_path = embellished_gpx_path
         self.dem_dataset = dem_dataset
         self.forced_elevation = forced_elevation
         self.elevation_profiles: list[tuple[list[tuple[float, float, float, Optional[float]]], Activity]] = []
@@ -134,10 +322,35 @@ class Analysis:
         self.gpx: Optional[gpxpy.gpx.GPX] = None
 
     def save_to_webtrack(self, full_profile):
-        webtrack = WebTrack()
-        webtrack.to_file(self.webtrack_path, full_profile)
+        with self.profiler.stage("write"):
+            webtrack = WebTrack()
+            webtrack.to_file(self.webtrack_path, full_profile)
         self.print_transcompilation_summary(full_profile)
 
+    def parse_gpx(self, input_gpx_file) -> gpxpy.gpx.GPX:
+        """Parse, optionally embellish, re-order the tracks and optionally simplify them.
+
+        The tracks are ordered before the simplification, so the waypoints are anchored
+        to the same track points as the ones they are snapped to afterwards.
+        """
+        with self.profiler.stage("parse"):
+            gpx = self.gpx = gpxpy.parse(input_gpx_file)
+        if self.embellished_gpx_path is not None:
+            self.embellish(gpx, self.embellished_gpx_path)
+        with self.profiler.stage("order_tracks"):
+            self.order_tracks()
+        if self.simplify:
+            with self.profiler.stage("simplify"):
+                self.simplify_tracks()
+        return gpx
+
+    def embellish(self, gpx: gpxpy.gpx.GPX, embellished_gpx_path: str) -> None:
+        """Export the GPX data as parsed with the metadata of embellish_gpx, the GPS elevations being kept."""
+        with self.profiler.stage("write_gpx"):
+            embellish_metadata(gpx)
+            save_gpx(gpx, embellished_gpx_path)
+        click.echo(f"Exported `{embellished_gpx_path}'")
+
     def flat_full_profile(self, waypoints):
         return {
             "segments": [
@@ -221,6 +434,23 @@ class Analysis:
             pt2.longitude,
         )
 
+    def simplify_tracks(self) -> None:
+        """Simplify all track segments with the Ramer-Douglas-Peucker algorithm."""
+        from cli.src.simplify import simplify_gpx
+
+        if self.gpx is None:
+            raise ValueError("Missing GPX data")
+        anchors = []
+        if self.keep_waypoint_points:
+            anchors = [(waypoint.latitude, waypoint.longitude) for waypoint in self.gpx.waypoints]
+        simplify_gpx(
+            self.gpx,
+            self.simplify_tolerance,
+            anchors,
+            close_enough=self.CLOSE_ENOUGH_METERS,
+            far_enough=self.FAR_ENOUGH_METERS,
+        )
+
     def order_tracks(self):
         """Re-ordering tracks if their names are enumerated, f.i. 1. First, 2. Second"""
         positioned_tracks = []
@@ -275,45 +505,61 @@ class AnalysisWithoutElevation(Analysis):
 
     def analyse_and_save(self) -> None:
         with open(self.gpx_path, "r", encoding="utf-8") as input_gpx_file:
-            self.gpx = gpxpy.parse(input_gpx_file)
-            if self.simplify:
-                self.gpx.simplify()
-            self.order_tracks()
-            self.process_tracks()
+            gpx = self.parse_gpx(input_gpx_file)
+            with self.profiler.stage("process_tracks"):
+                self.process_tracks()
 
             waypoints = []
-            for waypoint in self.gpx.waypoints:
-                waypoints.append(
-                    [
-                        waypoint.longitude,
-                        waypoint.latitude,
-                        False,  # without elevation
-                        None,
-                        waypoint.symbol,
-                        waypoint.name,
-                        self.guess_close_enough(waypoint),
-                    ]
-                )
+            with self.profiler.stage("waypoint_snapping"):
+                for waypoint in gpx.waypoints:
+                    waypoints.append(
+                        [
+                            waypoint.longitude,
+                            waypoint.latitude,
+                            False,  # without elevation
+                            None,
+                            waypoint.symbol,
+                            waypoint.name,
+                            self.guess_close_enough(waypoint),
+                        ]
+                    )
 
             full_profile = self.flat_full_profile(waypoints)
             self.save_to_webtrack(full_profile)
 
 
 class AnalysisWithElevation(Analysis):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, elevation_data: Optional["GeoElevationData"] = None, **kwargs):
+        """
+        Args:
+            elevation_data (GeoElevationData): Elevation service shared across a batch run.
+                A new one is created if missing.
+        """
         super().__init__(*args, **kwargs)
+        self.elevation_data = elevation_data
         self.elevation_min = 10000
         self.elevation_max = -self.elevation_min
         self.elevation_total_gain = 0
         self.elevation_total_loss = 0
         self.delta_h = None
+        self.dem_samples: Optional["DemSamples"] = None  # sampled when embellished
+
+    def embellish(self, gpx: gpxpy.gpx.GPX, embellished_gpx_path: str) -> None:
+        """Replace the elevations of the track points with DEM data, then export the GPX data as embellish_gpx does."""
+        from cli.src.dem_sampling import add_dem_elevations
+
+        if self.elevation_data is None:
+            raise ValueError("Missing elevation data")
+        with self.profiler.stage("elevation"):
+            self.dem_samples = add_dem_elevations(gpx, self.elevation_data)
+        with self.profiler.stage("write_gpx"):
+            embellish_metadata(gpx, self.dem_dataset)
+            save_gpx(gpx, embellished_gpx_path)
+        click.echo(f"Exported `{embellished_gpx_path}'")
 
     def get_webtrack_source(self) -> str:
         """Return DEM code according to the WebTrack spec."""
-        for dem in DEM_DATASETS:
-            if dem[0] == self.dem_dataset:
-                return dem[1]
-        return ""
+        return webtrack_source(self.dem_dataset)
 
     def process_point(self, gps_curr_point):
         # add point to the segment:
@@ -367,40 +613,49 @@ class AnalysisWithElevation(Analysis):
     def analyse_and_save(self) -> None:
         """
         .. note::
-            Whereas the WebTrack spec supports multiple DEM (per segment/waypoint). The DEM
-            source in this implementation is the same for the entire WebTrack so that you can
-            pick the one that looks better on the elevation profile.
+            The WebTrack spec supports multiple DEM (per segment/waypoint). The DEM source is the
+            same for the entire WebTrack, unless the elevation data has fallback DEMs filling the
+            voids of the first one, see GeoElevationData.get_elevations_and_sources(). The code of a
+            segment is then the one of the DEM providing most of its sampled elevations.
         """
         if self.dem_dataset is None:
             raise ValueError("Missing DEM type")
-        elevation_data = elevation.GeoElevationData(
-            version=self.dem_dataset,
-            earth_data_user=NASA_USERNAME,
-            earth_data_password=NASA_PASSWORD,
-        )
+        if self.elevation_data is None:
+            self.elevation_data = new_elevation_data(self.dem_dataset)
+        elif self.elevation_data.version != self.dem_dataset:
+            raise ValueError(f"Expected {self.dem_dataset} elevation data, got {self.elevation_data.version}")
+        elevation_data = self.elevation_data
+        stats_before = dict(elevation_data.stats)
         with open(self.gpx_path, "r", encoding="utf-8") as input_gpx_file:
-            self.gpx = gpxpy.parse(input_gpx_file)
-            if self.simplify:
-                self.gpx.simplify()
-            self.order_tracks()
-            elevation_data.add_elevations(self.gpx, smooth=True)
-            self.process_tracks()
-            elevation_source = self.get_webtrack_source()
+            gpx = self.parse_gpx(input_gpx_file)
+            if self.dem_samples is None:  # not sampled when embellished
+                from cli.src.dem_sampling import add_dem_elevations
+
+                with self.profiler.stage("elevation"):
+                    self.dem_samples = add_dem_elevations(gpx, elevation_data)
+            dem_samples = self.dem_samples
+            for counter_name, value in elevation_data.stats.items():
+                self.profiler.count(f"dem_{counter_name}", value - stats_before[counter_name])
+            with self.profiler.stage("process_tracks"):
+                self.process_tracks()
+            codes = [webtrack_source(version) for version in elevation_data.versions]
+            segment_sources = [codes[dem_samples.track_sources[track]] for track in gpx.tracks]
+            waypoint_sources = [codes[source] for source in dem_samples.waypoint_sources]
 
             waypoints = []
-            for waypoint in self.gpx.waypoints:
-                point_ele = elevation_data.get_elevation(waypoint.latitude, waypoint.longitude)
-                waypoints.append(
-                    [
-                        waypoint.longitude,
-                        waypoint.latitude,
-                        elevation_source,  # with elevation
-                        point_ele,
-                        waypoint.symbol,
-                        waypoint.name,
-                        self.guess_close_enough(waypoint),
-                    ]
-                )
+            with self.profiler.stage("waypoint_snapping"):
+                for waypoint, point_ele, waypoint_source in zip(gpx.waypoints, dem_samples.waypoint_elevations, waypoint_sources):
+                    waypoints.append(
+                        [
+                            waypoint.longitude,
+                            waypoint.latitude,
+                            waypoint_source,  # with elevation
+                            point_ele,
+                            waypoint.symbol,
+                            waypoint.name,
+                            self.guess_close_enough(waypoint),
+                        ]
+                    )
 
             derivative = 100.0 * (self.elevation_total_gain + self.elevation_total_loss) / self.current_length
             track_is_flat = derivative < 2.0
@@ -412,10 +667,10 @@ class AnalysisWithElevation(Analysis):
                     "segments": [
                         {
                             "activity": seg[1],
-                            "withEle": elevation_source,
+                            "withEle": segment_source,
                             "points": seg[0],
                         }
-                        for seg in self.elevation_profiles
+                        for seg, segment_source in zip(self.elevation_profiles, segment_sources)
                     ],
                     "waypoints": waypoints,
                     "trackInformation": {
@@ -0,0 +1,120 @@
+from typing import Any
+from typing import TextIO
+
+import gpxpy.gpx
+from gpxpy import gpxfield
+
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def write_value(stream: TextIO, gpx_field: Any, value: Any, nsmap: dict[str, str], indent: str) -> None:
+    """Write a child element, the elements of lists being written one by one."""
+    if not isinstance(gpx_field, gpxfield.GPXComplexField):
+        stream.write(gpx_field.to_xml(value, "1.1", nsmap, indent=indent))
+    elif gpx_field.is_list:
+        for obj in value:
+            write_fields(stream, obj, gpx_field.tag, nsmap, indent)
+    else:
+        # gpxpy does not pass the namespaces to single complex fields
+        write_fields(stream, value, gpx_field.tag, {}, indent, empty_body=gpx_field.empty_body)
+
+
+def check_dependents(instance: Any, gpx_field: str) -> tuple[str, str]:
+    """
+    Same as the private `gpxpy.gpxfield._check_dependents()`, so that a gpxpy upgrade does not change
+    the output silently: a container tag of the form `tag:dep1:@dep2` is written only if any of the
+    dependent attributes has data.
+    Returns:
+        The closing tag until which the subelements are suppressed, or an empty string, and the tag.
+    """
+    tag, *dependents = gpx_field.split(":")
+    if not dependents or any(getattr(instance, dependent.lstrip("@")) for dependent in dependents):
+        return "", tag
+    return f"/{tag}", tag
+
+
+def write_container_tag(stream: TextIO, container_tag: str, indent: str) -> str:
+    """
+    Open or close a container tag like `metadata`, the opening tag being left open for attributes.
+    Returns:
+        The indentation of the next elements.
+    """
+    if container_tag[0] == "/":
+        stream.write(f"\n{indent}<{container_tag}>")
+        return indent[:-2] if len(indent) > 1 else indent
+    indent += "  "
+    stream.write(f"\n{indent}<{container_tag}")
+    return indent
+
+
+def write_fields(
+    stream: TextIO, instance: Any, tag: str, nsmap: dict[str, str], indent: str = "", *, empty_body: bool = False, root_attributes: str = ""
+) -> None:
+    """
+    Write a GPX 1.1 element like `gpxpy.gpxfield.gpx_fields_to_xml()` with pretty print, except
+    that the child elements (waypoints, routes, tracks, segments, points) are written one by one
+    instead of being joined into a string.
+    Args:
+        root_attributes: Namespaces and schema location of the root node.
+    """
+    tag_open = True
+    # no new line before the root node, stripped by to_xml()
+    stream.write(f"\n{indent}<{tag}{root_attributes}" if indent else f"<{tag}{root_attributes}")
+    suppress_until = ""
+    for gpx_field in instance.gpx_11_fields:
+        # strings are non-data container tags with subelements
+        if isinstance(gpx_field, str):
+            if suppress_until:
+                if suppress_until == gpx_field:
+                    suppress_until = ""
+                continue
+            suppress_until, container_tag = check_dependents(instance, gpx_field)
+            if suppress_until:
+                continue
+            if tag_open:
+                stream.write(">")
+            indent = write_container_tag(stream, container_tag, indent)
+            tag_open = container_tag[0] != "/"
+        elif not suppress_until:
+            value = getattr(instance, gpx_field.name)
+            if gpx_field.attribute:
+                stream.write(" " + gpx_field.to_xml(value, "1.1", nsmap, indent=f"{indent}  "))
+            elif value is not None:
+                if tag_open:
+                    stream.write(">")
+                    tag_open = False
+                write_value(stream, gpx_field, value, nsmap, f"{indent}  ")
+    if empty_body:
+        stream.write(" />")
+        return
+    if tag_open:
+        stream.write(">")
+    stream.write(f"\n{indent}</{tag}>")
+
+
+def write_gpx(gpx: gpxpy.gpx.GPX, stream: TextIO) -> None:
+    """
+    Write the GPX 1.1 document to the stream, with the same content as `gpx.to_xml(version="1.1")`
+    followed by a new line, but without building the whole document in memory. As `to_xml()`,
+    the version, creator, namespaces and schema locations of the GPX object are set if missing.
+    """
+    gpx.version = "1.1"
+    if not gpx.creator:
+        gpx.creator = "gpx.py -- https://github.com/tkrajina/gpxpy"
+    gpx.nsmap["xsi"] = "http://www.w3.org/2001/XMLSchema-instance"
+    gpx.nsmap["defaultns"] = "http://www.topografix.com/GPX/1/1"
+    if not gpx.schema_locations:
+        gpx.schema_locations = ["http://www.topografix.com/GPX/1/1", "http://www.topografix.com/GPX/1/1/gpx.xsd"]
+    stream.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    root_attributes = f' xmlns="{gpx.nsmap["defaultns"]}"'
+    for prefix in sorted(set(gpx.nsmap) - {"defaultns"}):
+        root_attributes += f' xmlns:{prefix}="{gpx.nsmap[prefix]}"'
+    root_attributes += f' xsi:schemaLocation="{" ".join(gpx.schema_locations)}"'
+    write_fields(stream, gpx, "gpx", gpx.nsmap, root_attributes=root_attributes)
+    stream.write("\n")
+
+
+def save_gpx(gpx: gpxpy.gpx.GPX, gpx_path: str) -> None:
+    """Write the GPX 1.1 document into the file, overwritten if already existing."""
+    with open(gpx_path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as gpx_file:
+        write_gpx(gpx, gpx_file)
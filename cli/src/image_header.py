@@ -0,0 +1,109 @@
+import struct
+from pathlib import Path
+from typing import BinaryIO
+from typing import NamedTuple
+from typing import Optional
+
+TIFF_TAG_IMAGE_WIDTH = 256
+TIFF_TAG_IMAGE_LENGTH = 257
+TIFF_TYPE_SHORT = 3
+TIFF_TYPE_LONG = 4
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# start of frame markers, except DHT (C4), JPG (C8) and DAC (CC)
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class ImageInfo(NamedTuple):
+    width: int
+    height: int
+
+
+def read_exactly(file: BinaryIO, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated image header")
+    return data
+
+
+def read_tiff_tags(file: BinaryIO) -> dict[int, int]:
+    """Read the dimension tags from the first IFD of a TIFF file."""
+    file.seek(0)
+    byte_order = read_exactly(file, 4)
+    if byte_order == b"II*\x00":
+        endian = "<"
+    elif byte_order == b"MM\x00*":
+        endian = ">"
+    else:
+        raise ValueError("Not a classic TIFF header")
+    (ifd_offset,) = struct.unpack(endian + "I", read_exactly(file, 4))
+    file.seek(ifd_offset)
+    (entry_count,) = struct.unpack(endian + "H", read_exactly(file, 2))
+    entries = read_exactly(file, 12 * entry_count)
+    tags = {}
+    for idx in range(entry_count):
+        tag, field_type, count = struct.unpack_from(endian + "HHI", entries, 12 * idx)
+        if count != 1 or tag not in {TIFF_TAG_IMAGE_WIDTH, TIFF_TAG_IMAGE_LENGTH}:
+            continue
+        if field_type == TIFF_TYPE_SHORT:
+            (tags[tag],) = struct.unpack_from(endian + "H", entries, 12 * idx + 8)
+        elif field_type == TIFF_TYPE_LONG:
+            (tags[tag],) = struct.unpack_from(endian + "I", entries, 12 * idx + 8)
+    return tags
+
+
+def parse_tiff(file: BinaryIO) -> Optional[ImageInfo]:
+    tags = read_tiff_tags(file)
+    if TIFF_TAG_IMAGE_WIDTH not in tags or TIFF_TAG_IMAGE_LENGTH not in tags:
+        return None
+    return ImageInfo(tags[TIFF_TAG_IMAGE_WIDTH], tags[TIFF_TAG_IMAGE_LENGTH])
+
+
+def parse_png(file: BinaryIO) -> ImageInfo:
+    """The IHDR chunk is always the first one."""
+    file.seek(8)
+    _, chunk_type, width, height = struct.unpack(">I4sII", read_exactly(file, 16))
+    if chunk_type != b"IHDR":
+        raise ValueError("Missing PNG header chunk")
+    return ImageInfo(width, height)
+
+
+def parse_jpeg(file: BinaryIO) -> ImageInfo:
+    """Walk through the segments until the start of frame."""
+    file.seek(2)
+    while True:
+        marker_prefix, marker = read_exactly(file, 2)
+        if marker_prefix != 0xFF:
+            raise ValueError("Invalid JPEG marker")
+        if marker == 0xFF:  # fill byte
+            file.seek(-1, 1)
+            continue
+        (length,) = struct.unpack(">H", read_exactly(file, 2))
+        if marker in JPEG_SOF_MARKERS:
+            _, height, width = struct.unpack(">BHH", read_exactly(file, 5))
+            return ImageInfo(width, height)
+        file.seek(length - 2, 1)
+
+
+def probe_image(path: str | Path) -> ImageInfo:
+    """
+    Find out the dimensions of the image by reading only the header
+    of TIFF, PNG and JPEG files. Other formats and unexpected headers are opened with Pillow.
+    """
+    try:
+        with open(path, "rb") as file:
+            signature = file.read(8)
+            info: Optional[ImageInfo] = None
+            if signature[:4] in {b"II*\x00", b"MM\x00*"}:
+                info = parse_tiff(file)
+            elif signature == PNG_SIGNATURE:
+                info = parse_png(file)
+            elif signature[:2] == b"\xff\xd8":
+                info = parse_jpeg(file)
+            if info is not None:
+                return info
+    except (ValueError, struct.error):
+        pass
+    from PIL import Image
+
+    with Image.open(path) as img:
+        return ImageInfo(img.width, img.height)
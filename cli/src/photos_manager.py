@@ -1,41 +1,62 @@
 import datetime
+import glob
+import heapq
 import json
 import os
 import re
 import subprocess
 import sys
-import time
+from collections import deque
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from fractions import Fraction
+from functools import cache
+from io import BytesIO
 from math import sqrt
 from pathlib import Path
 from shutil import copy2
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Iterator
 from typing import Optional
+from typing import Sequence
 
 import click
-import exiftool
-import gpxpy
-import gpxpy.gpx  # skipcq: PY-W2000
-from PIL import Image
 
+from cli.src.album_index import LEGACY_VARIANT
+from cli.src.album_index import AlbumIndex
+from cli.src.exif_tables import computational_mode
+from cli.src.exif_tables import get_exif_tables
+from cli.src.image_header import probe_image
+
+if TYPE_CHECKING:
+    from exiftool import ExifToolHelper
+
+    from cli.src.gpx_time_index import GpxTimeIndex
+
+# exiftool, gpxpy and PIL are imported when needed for a faster start of the CLI
 DIR_FORMAT = "%y%m%d%H%M%S"
 TESTING = "pytest" in sys.modules
 REGEX_WEBP_DIMENSION = re.compile(r"Dimension: +(\d+) x (\d+)")
 REGEX_WEBP_OVERVIEW = re.compile(r"Output: +(.+)")
 FOCAL_PLANE_DIAGONAL_FULL_FRAME = sqrt(36**2 + 24**2)
-LENS_IDS = {}
-PATH_TO_NIKON_LENSES = os.path.join(os.path.dirname(__file__), "NikonLensID.json")
-PATH_TO_OMSYSTEM_LENSES = os.path.join(os.path.dirname(__file__), "OlympusLensType.json")
-PATH_TO_COMPUTATIONAL_MODES = os.path.join(os.path.dirname(__file__), "OlympusStackedImage.json")
-with open(PATH_TO_NIKON_LENSES, "r", encoding="utf-8") as nikon_lens_id:
-    LENS_IDS["NIKON CORPORATION"] = json.load(nikon_lens_id)
-with open(PATH_TO_OMSYSTEM_LENSES, "r", encoding="utf-8") as olympus_lens_id:
-    LENS_IDS["OM Digital Solutions"] = json.load(olympus_lens_id)
-with open(PATH_TO_COMPUTATIONAL_MODES, "r", encoding="utf-8") as olympus_computational_mode:
-    COMPUTATIONAL_MODE = json.load(olympus_computational_mode)
+ALL_VAR_OPTIONS = (
+    ("f", 300, 200, 90),  # fixed width/height thumbnail
+    ("t", None, 200, 90),
+    ("s.p", 375, None, 90),  # small screen, mobile portrait
+    ("s.l", None, 375, 90),  # small screen, mobile landscape
+    ("m", None, 760, 90),
+    ("l", None, 1030, 86),
+    ("l.hd", None, 1030, 98),
+)
+DECODING_JOBS = 2
 
 
 def body_lens_model_exif(d) -> tuple[str, str]:
     lens_model: str | None = None
+    lens_ids = get_exif_tables().lens_ids
     try:
         maker = d["EXIF:Make"]
     except KeyError as err:
@@ -46,10 +67,10 @@ def body_lens_model_exif(d) -> tuple[str, str]:
             "MakerNotes:LensType",
             "MakerNotes:LensModel",
         )
-        if field1 in d and d[field1] in LENS_IDS[maker]:
-            lens_model = LENS_IDS[maker][d[field1]]
-        elif field2 in d and d[field2] in LENS_IDS[maker]:
-            lens_model = LENS_IDS[maker][d[field2]]
+        if field1 in d and d[field1] in lens_ids[maker]:
+            lens_model = lens_ids[maker][d[field1]]
+        elif field2 in d and d[field2] in lens_ids[maker]:
+            lens_model = lens_ids[maker][d[field2]]
         elif d[field3]:
             lens_model = d[field3]
     except KeyError as err:
@@ -130,21 +151,16 @@ def iso_exif(d) -> int:
 
 
 def computational_mode_exif(d) -> Optional[str]:
-    try:
-        coded_mode = d["MakerNotes:StackedImage"]
-        computational_group, computational_detail = coded_mode.split(" ")
-        h_group = COMPUTATIONAL_MODE[computational_group]
-        if isinstance(h_group, dict):
-            return h_group[computational_detail]
-        return h_group
-    except KeyError:
+    coded_mode = d.get("MakerNotes:StackedImage")
+    if coded_mode is None:
         return None
+    return computational_mode(get_exif_tables(), str(coded_mode))
 
 
 def get_image_size(path: str | Path) -> tuple[int, int]:
-    """Open the file to find out the image size (width, height)."""
-    img = Image.open(path)
-    return img.size
+    """Find out the image size (width, height), reading only the header if possible."""
+    width, height = probe_image(path)
+    return width, height
 
 
 def generate_info_json(prev_photo: Optional[str], next_photo: Optional[str], exif: list, position: tuple[float, float] | None) -> dict:
@@ -178,17 +194,61 @@ def generate_info_json(prev_photo: Optional[str], next_photo: Optional[str], exi
     return data
 
 
-def get_exif_data(tif_path: str | Path):
-    exif_data = exiftool.ExifToolHelper().get_metadata(tif_path)[0]
+@cache
+def get_exiftool() -> "ExifToolHelper":
+    """The exiftool process shared by the whole run, started on first use."""
+    import exiftool
+
+    return exiftool.ExifToolHelper()
+
+
+@contextmanager
+def exiftool_session() -> Iterator[None]:
+    """Reuse one exiftool process within the block, terminated when leaving the block."""
+    try:
+        yield
+    finally:
+        if get_exiftool.cache_info().currsize:
+            exiftool_helper = get_exiftool()
+            if exiftool_helper.running:
+                exiftool_helper.terminate()
+            get_exiftool.cache_clear()
+
+
+def get_all_exif_data(tif_paths: Sequence[str | Path]) -> list[dict]:
+    """Read the metadata of many files with one exiftool command."""
+    if not tif_paths:
+        return []
+    all_exif_data = get_exiftool().get_metadata([str(tif_path) for tif_path in tif_paths])
     # discard lists that are not hashable and causing issues
-    return {k: v for k, v in exif_data.items() if not isinstance(v, list)}
+    return [{k: v for k, v in exif_data.items() if not isinstance(v, list)} for exif_data in all_exif_data]
 
 
-def has_valid_export(original_path: str | Path, exported_path: str | Path) -> bool:
-    if not os.path.exists(exported_path):
-        return False
-    # invalidate existing generated file if older than original
-    return os.path.getmtime(exported_path) > os.path.getmtime(original_path)
+def get_exif_data(tif_path: str | Path):
+    return get_all_exif_data([tif_path])[0]
+
+
+@cache
+def get_cwebp_version() -> Optional[str]:
+    """The version of cwebp, or None if cwebp is not available."""
+    try:
+        completed_process = subprocess.run(["cwebp", "-version"], check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed_process.stdout.decode("utf-8").strip()
+
+
+def variant_fingerprint(original_sha256: str, var_options: tuple) -> dict:
+    """Everything that changes the variant: the content of the original and the encoding parameters."""
+    name, webp_w, webp_h, quality = var_options
+    return {
+        "original_sha256": original_sha256,
+        "width": webp_w,
+        "height": webp_h,
+        "quality": quality,
+        "crop": name == "f",
+        "cwebp": get_cwebp_version(),
+    }
 
 
 def decode_webp_output(std_output: str) -> tuple[int, int, str]:
@@ -205,6 +265,21 @@ def print_webp_conversion_summary(photo_id: str, name: str, data: tuple[int, int
     click.echo(f"[Photo {photo_id}] Converted to '{name}' WebP / {data[0]} x {data[1]} px / {data[2]}")
 
 
+def cwebp_command(quality: int) -> list[str]:
+    """The cwebp command with the encoding options shared by all variants."""
+    return [
+        "cwebp",
+        "-preset",
+        "photo",
+        "-mt",
+        "-m",
+        "6",
+        "-q",
+        str(quality),
+        "-af",
+    ]
+
+
 def convert_to_webp(
     original_path: str | Path,
     webp_path: str | Path,
@@ -243,17 +318,7 @@ def convert_to_webp(
             str(cut_h),
         ]
     completed_process = subprocess.run(
-        [
-            "cwebp",
-            "-preset",
-            "photo",
-            "-mt",
-            "-m",
-            "6",
-            "-q",
-            str(quality),
-            "-af",
-        ]
+        cwebp_command(quality)
         + crop
         + [
             "-resize",
@@ -271,126 +336,260 @@ def convert_to_webp(
     return decode_webp_output(completed_process.stderr.decode("utf-8"))
 
 
-def guess_original(dir_path: str) -> str:
-    """Find out the original photo (most probably TIF, but could also be other formats)
-    File name with at least one dot (f.i. DSC_9102.sth.tif) is skipped.
-    If multiple files of the same extension are found, the last modified is selected."""
-    priorities = [
-        ("tif", 10),
-        ("png", 6),
-        ("jpg", 3),
-    ]
-    current_timestamp = time.time()
-    computed_priorities = [(ext, prio * current_timestamp) for ext, prio in priorities]
-    best_priority = -1.0
-    best_file = None
-    for file in os.listdir(dir_path):
-        path_to_file = os.path.join(dir_path, file)
-        if os.path.isfile(path_to_file):
-            if file.startswith("_"):
-                continue
-            modification_timestamp = os.path.getmtime(path_to_file)
-            for ext, priority in computed_priorities:
-                current_priority = priority + modification_timestamp
-                if file.lower().endswith("." + ext) and current_priority > best_priority:
-                    best_priority, best_file = current_priority, file
-    if best_file:
-        return best_file
-    raise FileNotFoundError(f"Missing original photo in `{dir_path}'")
+def thumbnail_crop(original_w: int, original_h: int, webp_w: int, webp_h: int) -> tuple[int, int, int, int]:
+    """
+    Crop enough to preserve the aspect-ratio of the fixed width/height thumbnail.
+    Returns:
+        The crop (x, y, width, height) in the original photo.
+    """
+    height_after_crop = round(original_w * webp_h / webp_w)
+    if height_after_crop <= original_h:
+        return 0, int((original_h - height_after_crop) / 2), original_w, height_after_crop
+    width_after_crop = round(original_h * webp_w / webp_h)
+    return int((original_w - width_after_crop) / 2), 0, width_after_crop, original_h
+
+
+def convert_variant(
+    input_image_path: str,
+    webp_path: str,
+    var_options: tuple,
+    original_size: Optional[tuple[int, int]] = None,
+) -> tuple[int, int, str]:
+    """Generate one WebP variant of the original photo, decoded by cwebp. The original size is needed for the crop."""
+    name, webp_w, webp_h, quality = var_options
+    if name != "f":  # just resize
+        return convert_to_webp(input_image_path, webp_path, quality, webp_w, webp_h)
+    if original_size is None:
+        original_size = get_image_size(input_image_path)
+    cut_x, cut_y, cut_w, cut_h = thumbnail_crop(*original_size, webp_w, webp_h)
+    return convert_to_webp(
+        original_path=input_image_path,
+        webp_path=webp_path,
+        quality=quality,
+        w=webp_w,
+        h=None,
+        cut_w=cut_w,
+        cut_h=cut_h,
+        cut_x=cut_x,
+        cut_y=cut_y,
+    )
 
 
-def generate_webp(album_path: str | Path) -> list[tuple[str, str]]:
-    generated_webp = []
-    all_photos = [dirname for dirname in os.listdir(album_path) if os.path.isdir(os.path.join(album_path, dirname))]
-    all_photos.sort()
-
-    all_var_options = (
-        ("f", 300, 200, 90),  # fixed width/height thumbnail
-        ("t", None, 200, 90),
-        ("s.p", 375, None, 90),  # small screen, mobile portrait
-        ("s.l", None, 375, 90),  # small screen, mobile landscape
-        ("m", None, 760, 90),
-        ("l", None, 1030, 86),
-        ("l.hd", None, 1030, 98),
+def rescaled_length(length: int, new_other_length: int, other_length: int) -> int:
+    """Preserve the aspect-ratio when only one side is given, rounded like cwebp."""
+    return (length * new_other_length + other_length // 2) // other_length
+
+
+def variant_geometry(original_size: tuple[int, int], var_options: tuple) -> tuple[tuple[int, int, int, int], tuple[int, int]]:
+    """
+    Find out the region of the original photo and the size of the variant, same as cwebp with -crop and -resize.
+    Returns:
+        The region (x, y, width, height) of the original photo, and the (width, height) of the variant.
+    """
+    name, webp_w, webp_h, _ = var_options
+    original_w, original_h = original_size
+    if name == "f":
+        cut_x, cut_y, cut_w, cut_h = thumbnail_crop(original_w, original_h, webp_w, webp_h)
+        return (cut_x, cut_y, cut_w, cut_h), (webp_w, rescaled_length(cut_h, webp_w, cut_w))
+    if webp_w is None:
+        webp_w = rescaled_length(original_w, webp_h, original_h)
+    elif webp_h is None:
+        webp_h = rescaled_length(original_h, webp_w, original_w)
+    return (0, 0, original_w, original_h), (webp_w, webp_h)
+
+
+def resize_variants(original, all_var_options: list[tuple]) -> dict[str, Any]:
+    """
+    Build all variants from one decoded original. The variants are computed from the largest to
+    the smallest, each one being resized from the smallest full-frame variant computed so far,
+    so that the full resolution photo is only resampled once.
+    Args:
+        original: The decoded original photo (PIL image).
+        all_var_options: Options of the variants to build.
+    Returns:
+        The PIL image of each variant.
+    """
+    from PIL import Image
+
+    geometries = {var_options[0]: variant_geometry(original.size, var_options) for var_options in all_var_options}
+    # largest scale first
+    ordered = sorted(geometries.items(), key=lambda item: item[1][1][0] / item[1][0][2], reverse=True)
+    source = original
+    images: dict[str, Any] = {}
+    resized: dict[tuple, Any] = {}  # variants with the same geometry but different qualities
+    for name, (region, size) in ordered:
+        key = (region, size)
+        if key not in resized:
+            scale_x, scale_y = source.width / original.width, source.height / original.height
+            cut_x, cut_y, cut_w, cut_h = region
+            box = (cut_x * scale_x, cut_y * scale_y, (cut_x + cut_w) * scale_x, (cut_y + cut_h) * scale_y)
+            resized[key] = source.resize(size, Image.Resampling.LANCZOS, box=box)
+            if region == (0, 0, original.width, original.height):
+                source = resized[key]
+        images[name] = resized[key]
+    return images
+
+
+def encode_to_webp(image, webp_path: str | Path, quality: int) -> tuple[int, int, str]:
+    """
+    Encode an already resized image with cwebp. The image is piped as an uncompressed PNG
+    so that cwebp does not decode the original again.
+    Args:
+        image: PIL image.
+        webp_path: path to generated WebP file
+        quality: compression factor for RGB channels between 75 and 99
+    """
+    buffer = BytesIO()
+    image.save(buffer, "PNG", compress_level=0)
+    completed_process = subprocess.run(
+        cwebp_command(quality) + ["-o", str(webp_path), "--", "-"],
+        input=buffer.getvalue(),
+        check=True,
+        capture_output=True,
     )
+    return decode_webp_output(completed_process.stderr.decode("utf-8"))
+
+
+def submit_photo_variants(
+    executor: Executor,
+    input_image_path: str,
+    dirname: str,
+    all_var_options: list[tuple],
+    original_size: Optional[tuple[int, int]] = None,
+) -> list[tuple[str, Future]]:
+    """
+    Decode the original photo once, resize it to all variants, and schedule the encodings.
+    Fall back to cwebp decoding the original for each variant if Pillow cannot decode the original.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(input_image_path) as decoded:
+            original = decoded if decoded.mode in {"RGB", "RGBA"} else decoded.convert("RGB")
+            images = resize_variants(original, all_var_options)
+    except OSError:
+        return [
+            (var_options[0], executor.submit(convert_variant, input_image_path, f"{dirname}/{var_options[0]}.webp", var_options, original_size))
+            for var_options in all_var_options
+        ]
+    return [(name, executor.submit(encode_to_webp, images[name], f"{dirname}/{name}.webp", quality)) for name, _, _, quality in all_var_options]
+
+
+def find_outdated_variants(index: AlbumIndex, photo_id: str, fingerprints: dict[str, dict]) -> list[tuple]:
+    """
+    Compare the fingerprints of the existing variants with the expected ones.
+    Variants generated before the manifest existed are assumed up-to-date and get the expected fingerprint.
+    """
+    legacy_names = [name for name in fingerprints if index.variant(photo_id, name) == LEGACY_VARIANT]
+    for name in legacy_names:
+        index.set_variant(photo_id, name, fingerprints[name])
+    if legacy_names:
+        index.save_manifest(photo_id)
+    return [var_options for var_options in ALL_VAR_OPTIONS if index.variant(photo_id, var_options[0]) != fingerprints[var_options[0]]]
+
+
+def collect_photo_variants(index: AlbumIndex, photo_id: str, photo_future: Future | OSError, fingerprints: dict[str, dict]) -> list[tuple[str, str]]:
+    """
+    Wait for the variants of a photo scheduled by generate_webp(), print the summary and record them.
+    Returns:
+        The generated (photo ID, variant name).
+    """
+    if isinstance(photo_future, OSError):
+        click.echo(f"[Photo {photo_id}] Skipped: {photo_future}", err=True)
+        return []
+    try:
+        scheduled = photo_future.result()
+    except Exception as err:
+        click.echo(f"[Photo {photo_id}] Failed to resize: {err}", err=True)
+        return []
+    generated_webp = []
+    for idx, (name, future) in enumerate(scheduled):
+        try:
+            data_webp = future.result()
+        except Exception as err:
+            for _, pending in scheduled[idx + 1 :]:
+                pending.cancel()
+            click.echo(f"[Photo {photo_id}] Failed to convert to '{name}' WebP: {err}", err=True)
+            break
+        print_webp_conversion_summary(photo_id, name, data_webp)
+        index.set_variant(photo_id, name, fingerprints[name])
+        generated_webp.append((photo_id, name))
+    index.save_manifest(photo_id)
+    return generated_webp
+
+
+def generate_webp(
+    album_path: str | Path,
+    jobs: int = 1,
+    index: Optional[AlbumIndex] = None,
+    photo_ids: Optional[list[str]] = None,
+) -> list[tuple[str, str]]:
+    """
+    Generate the missing or outdated WebP variants of all photos in the album.
+    Variants are encoded concurrently across photos, but the summary is printed in
+    the album order. A failing photo is reported and skipped.
+    Args:
+        album_path: Path to the album.
+        jobs: Maximum number of concurrent encodings.
+        index: The album index, loaded if not provided. The index is saved.
+        photo_ids: Only process these photos instead of the whole album.
+    Returns:
+        The generated (photo ID, variant name) in the album order.
+    """
+    if index is None:
+        index = AlbumIndex.load(album_path)
+    generated_webp = []
 
-    for photo_id in all_photos:
-        dirname = os.path.join(album_path, photo_id)
-        input_image_path = None
-        for curr_config in all_var_options:
-            name, webp_w, webp_h, quality = curr_config
-            webp_path = dirname + "/" + name + ".webp"
-            if input_image_path is None:
-                # guess input file only once per folder
-                input_image_path = os.path.join(dirname, guess_original(dirname))
-            if has_valid_export(input_image_path, webp_path):
+    # cwebp runs in a subprocess and Pillow releases the GIL, so threads are enough to keep all the cores busy.
+    # Few originals are decoded at once, and decoding runs at most a few photos ahead of the encoding to bound
+    # the memory usage of the resized variants waiting for an encoder.
+    window = max(1, jobs) + DECODING_JOBS
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor, ThreadPoolExecutor(max_workers=DECODING_JOBS) as decoder:
+        scheduled_photos: deque[tuple[str, Future | OSError, dict]] = deque()
+        for photo_id in index.photo_ids if photo_ids is None else sorted(photo_ids, key=int):
+            dirname = os.path.join(album_path, photo_id)
+            try:
+                input_image_path, original_sha256 = index.original(photo_id)
+            except OSError as err:
+                scheduled_photos.append((photo_id, err, {}))
                 continue
-            if name == "f":
-                original_w, original_h = get_image_size(input_image_path)
-                # crop enough to preserve the aspect-ratio
-                height_after_crop = round(original_w * webp_h / webp_w)  # type: ignore[operator]
-                if height_after_crop <= original_h:
-                    data_webp = convert_to_webp(
-                        original_path=input_image_path,
-                        webp_path=webp_path,
-                        quality=quality,
-                        w=webp_w,
-                        h=None,
-                        cut_w=original_w,
-                        cut_h=height_after_crop,
-                        cut_x=None,
-                        cut_y=int((original_h - height_after_crop) / 2),
-                    )
-                else:
-                    width_after_crop = round(original_h * webp_w / webp_h)  # type: ignore[operator]
-                    data_webp = convert_to_webp(
-                        original_path=input_image_path,
-                        webp_path=webp_path,
-                        quality=quality,
-                        w=webp_w,
-                        h=None,
-                        cut_w=width_after_crop,
-                        cut_h=original_h,
-                        cut_x=int((original_w - width_after_crop) / 2),
-                        cut_y=None,
-                    )
-            else:  # just resize
-                data_webp = convert_to_webp(input_image_path, webp_path, quality, webp_w, webp_h)
-            print_webp_conversion_summary(photo_id, name, data_webp)
-            generated_webp.append((photo_id, name))
+            fingerprints = {var_options[0]: variant_fingerprint(original_sha256, var_options) for var_options in ALL_VAR_OPTIONS}
+            outdated_var_options = find_outdated_variants(index, photo_id, fingerprints)
+            if outdated_var_options:
+                if len(scheduled_photos) >= window:
+                    generated_webp += collect_photo_variants(index, *scheduled_photos.popleft())
+                original_size = index.original_info(photo_id)
+                future = decoder.submit(submit_photo_variants, executor, input_image_path, dirname, outdated_var_options, original_size)
+                scheduled_photos.append((photo_id, future, fingerprints))
+        while scheduled_photos:
+            generated_webp += collect_photo_variants(index, *scheduled_photos.popleft())
+    index.save()
     return generated_webp
 
 
+def update_links(album_path: str | Path, photo_id: str, links: dict[str, str]) -> None:
+    """Update the 'prev' and/or 'next' fields of an existing photo with one write."""
+    if not links:
+        return
+    with open(os.path.join(album_path, photo_id, "i.json"), "r", encoding="utf-8") as photo_file:
+        info_data = json.load(photo_file)
+    for next_or_prev, neighbor_id in links.items():
+        info_data[next_or_prev] = int(neighbor_id)
+    with open(os.path.join(album_path, photo_id, "i.json"), "w", encoding="utf-8") as photo_file:
+        photo_file.write(json.dumps(info_data, indent=4, ensure_ascii=False) + "\n")
+    for next_or_prev, neighbor_id in links.items():
+        click.echo(f"[Photo {photo_id}] Linked to {neighbor_id} with '{next_or_prev}' field")
+
+
 def update_neighbor(album_path: str | Path, photo_id: str, next_or_prev: str, neighbor_id: Optional[str]) -> None:
     if neighbor_id is None:
         return
-    with open(os.path.join(album_path, neighbor_id, "i.json"), "r", encoding="utf-8") as neighbor_photo_file:
-        info_data = json.load(neighbor_photo_file)
-    info_data[next_or_prev] = int(photo_id)
-    with open(os.path.join(album_path, neighbor_id, "i.json"), "w", encoding="utf-8") as neighbor_photo_file:
-        neighbor_photo_file.write(json.dumps(info_data, indent=4, ensure_ascii=False) + "\n")
-    click.echo(f"[Photo {neighbor_id}] Linked to {photo_id} with '{next_or_prev}' field")
+    update_links(album_path, neighbor_id, {next_or_prev: photo_id})
 
 
 def find_prev_next(album_path: str | Path, photo_id: str) -> tuple[str | None, str | None]:
     """Find the position where the photo will be dropped on the album."""
-    prev_photo, next_photo = None, None
-    all_existing_photos_list_list = [other_dirs for _, other_dirs, _ in os.walk(album_path) if other_dirs]
-    if len(all_existing_photos_list_list):
-        all_existing_photos = all_existing_photos_list_list[0]
-        if len(all_existing_photos):
-            all_existing_photos.sort()
-            position = 0
-            for existing_photo_id in all_existing_photos:
-                if photo_id == existing_photo_id:
-                    raise ValueError("Photo already in the album!")
-                if int(photo_id) > int(existing_photo_id):
-                    position += 1
-                else:
-                    break
-            prev_photo = all_existing_photos[position - 1] if position > 0 else None
-            next_photo = all_existing_photos[position] if position < len(all_existing_photos) else None
-    return prev_photo, next_photo
+    return AlbumIndex.load(album_path).find_prev_next(photo_id)
 
 
 def copy_all_related_files(tif_path, new_dir_path):
@@ -420,20 +619,13 @@ def import_exif_to_tif(tif_path: str | Path) -> set[tuple[str, str | int | float
         cam_path = click.prompt("Failed to find RAW file. Enter manually")
     if not cam_path:
         raise ValueError("Failed to find RAW file!")
+    from exiftool.exceptions import ExifToolExecuteError
+
     exif_data_before = set(get_exif_data(tif_path).items())
-    completed_process = subprocess.run(
-        [
-            "exiftool",
-            str(tif_path),
-            "-tagsFromFile",
-            str(cam_path),
-            "-Orientation=",
-        ],
-        check=True,
-        capture_output=True,
-    )
-    if completed_process.returncode != 0:
-        raise RuntimeError("Failed to import EXIF")
+    try:
+        get_exiftool().execute(str(tif_path), "-tagsFromFile", str(cam_path), "-Orientation=")
+    except ExifToolExecuteError as err:
+        raise RuntimeError("Failed to import EXIF") from err
     changed_exif_data = set(get_exif_data(tif_path).items()) - exif_data_before
     click.echo(f"Copied {tif_path} to {tif_path}_original")
     click.echo(f"Added or modified {len(changed_exif_data)} metadata fields")
@@ -452,41 +644,31 @@ def map_link(position: tuple[float, float]) -> str:
     return f"https://www.openstreetmap.org/?mlat={lat}&mlon={lon}#map=15/{lat}/{lon}&layers=P"
 
 
-def guess_position_from_gpx(gpx_path: str | Path | None, date_taken: datetime.datetime, timezone: str) -> tuple[float, float] | None:
+def guess_position_from_gpx(
+    gpx_path: str | Path | None,
+    date_taken: datetime.datetime,
+    timezone: str,
+    time_index: Optional["GpxTimeIndex"] = None,
+    interpolate: bool = False,
+) -> tuple[float, float] | None:
     """
     Args:
         gpx_path: Path to the GPX file
         date_taken: Naive local date time
         timezone: Time zone string in the ±hh:mm format
+        time_index: The time index of the GPX file if already loaded
+        interpolate: Interpolate the position between the fixes before and after, instead of the nearest fix
     """
     if not gpx_path:
         return None
+    if time_index is None:
+        from cli.src.gpx_time_index import GpxTimeIndex
+
+        time_index = GpxTimeIndex.load(gpx_path)
+
     # attach timezone to naive local time without adjustment of date and time data
     date_taken_timezone_aware = date_taken.replace(tzinfo=datetime.datetime.strptime(timezone, "%z").tzinfo)
-    smallest_diff_ms = float("inf")
-    best_match: tuple[float, float] | None = None
-    gpx_missing_datetime = True
-    with open(gpx_path, "r", encoding="utf-8") as input_gpx_file:
-        gpx = gpxpy.parse(input_gpx_file)
-        for track in gpx.tracks:
-            for segment in track.segments:
-                for point in segment.points:
-                    if point.time:  # this time is UTC
-                        gpx_missing_datetime = False
-                        diff_ms = abs(date_taken_timezone_aware - point.time) / datetime.timedelta(milliseconds=1)
-                        if diff_ms < smallest_diff_ms:
-                            smallest_diff_ms = diff_ms
-                            best_match = (point.longitude, point.latitude)
-        for waypoint in gpx.waypoints:
-            if waypoint.time:
-                gpx_missing_datetime = False
-                diff_ms = abs(date_taken_timezone_aware - waypoint.time) / datetime.timedelta(milliseconds=1)
-                if diff_ms < smallest_diff_ms:
-                    smallest_diff_ms = diff_ms
-                    best_match = (waypoint.longitude, waypoint.latitude)
-    if gpx_missing_datetime:
-        raise ValueError("GPX file does not contain any date/time!")
-    smallest_diff_s = smallest_diff_ms / 1000
+    smallest_diff_s, best_match = time_index.position_at(date_taken_timezone_aware, interpolate)
     click.echo(f"Position guessed with the following time delta: {datetime.timedelta(seconds=smallest_diff_s)}")
     if smallest_diff_s > (60 * 30):
         click.echo("Too much delta to be accurate!", err=True)
@@ -494,11 +676,33 @@ def guess_position_from_gpx(gpx_path: str | Path | None, date_taken: datetime.da
     return best_match
 
 
-def add_photo_to_album(album_path: str | Path, tif_path: str, gpx_path: str | Path | None) -> None:
-    """Add one photo to the album."""
-    if not os.path.exists(tif_path):
-        raise ValueError("RAW file does not exist!")
-    d = get_exif_data(tif_path)
+def locate_photo(
+    gpx_path: str | Path | None,
+    date_taken: datetime.datetime,
+    timezone: Optional[str],
+    time_index: Optional["GpxTimeIndex"] = None,
+    interpolate: bool = False,
+) -> tuple[float, float] | None:
+    """Guess the position of the photo, asking for the time zone if unknown."""
+    if gpx_path and not timezone:
+        # the time zone is only needed if a story is provided, assuming the story contains a GPX file
+        timezone = click.prompt("What is the UTC offset of the photo? (format=±hh:mm)")
+    if not gpx_path or not timezone:
+        return None
+    position = guess_position_from_gpx(gpx_path, date_taken, timezone, time_index, interpolate)
+    if position:
+        click.echo("The photo is most likely located here:")
+        click.echo(map_link(position))
+    return position
+
+
+def read_photo_exif(d: dict, tif_path: str) -> tuple[str, list, Optional[str]]:
+    """
+    Find out the photo ID and the metadata stored in the story metadata file.
+    The metadata are imported from the RAW file if incomplete.
+    Returns:
+        The photo ID, the metadata (see generate_info_json()) and the timezone if known.
+    """
     try:
         body_model, lens_model = body_lens_model_exif(d)
     except ValueError as err:
@@ -524,7 +728,6 @@ def add_photo_to_album(album_path: str | Path, tif_path: str, gpx_path: str | Pa
         photo_id = click.prompt("When the photo has been taken? (format=YYMMDDhhmmss)")
         date_taken, timezone = datetime.datetime.strptime(photo_id, DIR_FORMAT), None
 
-    click.echo(f"Adding photo {photo_id}...")
     exif = [
         date_taken,
         focal_length_35mm_exif(d),
@@ -537,51 +740,67 @@ def add_photo_to_album(album_path: str | Path, tif_path: str, gpx_path: str | Pa
         None,
         None,
     ]
-
-    prev_photo, next_photo = find_prev_next(album_path, photo_id)
-    if gpx_path and not timezone:
-        # the time zone is only needed if a story is provided, assuming the story contains a GPX file
-        timezone = click.prompt("What is the UTC offset of the photo? (format=±hh:mm)")
-    if gpx_path and timezone:
-        position = guess_position_from_gpx(gpx_path, date_taken, timezone)
-        if position:
-            click.echo("The photo is most likely located here:")
-            click.echo(map_link(position))
-    else:
-        position = None
-
-    # create the new photo
+    return photo_id, exif, timezone
+
+
+def create_photo(
+    album_path: str | Path,
+    photo_id: str,
+    source_path: str,
+    prev_photo: Optional[str],
+    next_photo: Optional[str],
+    *,
+    exif: list,
+    position: tuple[float, float] | None,
+) -> None:
+    """Create the photo directory with the story metadata file and the original files."""
     new_info_data = json.dumps(generate_info_json(prev_photo, next_photo, exif, position), indent=4, ensure_ascii=False)
     new_dir_path = os.path.join(album_path, photo_id)
     os.mkdir(new_dir_path)
     with open(os.path.join(new_dir_path, "i.json"), "w", encoding="utf-8") as json_file:
         json_file.write(new_info_data + "\n")
+    copy_all_related_files(source_path, new_dir_path)
 
-    copy_all_related_files(tif_path, new_dir_path)
+
+def add_photo_to_album(album_path: str | Path, tif_path: str, gpx_path: str | Path | None, *, jobs: int = 1, interpolate: bool = False) -> None:
+    """Add one photo to the album."""
+    if not os.path.exists(tif_path):
+        raise ValueError("RAW file does not exist!")
+    photo_id, exif, timezone = read_photo_exif(get_exif_data(tif_path), tif_path)
+    click.echo(f"Adding photo {photo_id}...")
+
+    index = AlbumIndex.load(album_path)
+    prev_photo, next_photo = index.find_prev_next(photo_id)
+    position = locate_photo(gpx_path, exif[0], timezone, interpolate=interpolate)
+
+    # create the new photo
+    create_photo(album_path, photo_id, tif_path, prev_photo, next_photo, exif=exif, position=position)
+    index.add_photo(photo_id)
     update_neighbor(album_path, photo_id, "next", prev_photo)
     update_neighbor(album_path, photo_id, "prev", next_photo)
 
     # triggers global check and update of generated photos to make sure everything is synced
-    generate_webp(album_path)
+    generate_webp(album_path, jobs, index)
     click.echo(f"[Photo {photo_id}] Added")
 
 
-def add_film_to_album(album_path: str | Path, film_path: str, iso: int, film: str, gpx_path: str | Path | None) -> None:
+def add_film_to_album(
+    album_path: str | Path,
+    film_path: str,
+    iso: int,
+    film: str,
+    gpx_path: str | Path | None,
+    *,
+    jobs: int = 1,
+    interpolate: bool = False,
+) -> None:
     if not os.path.exists(film_path):
         raise ValueError("Film file does not exist!")
     photo_id = click.prompt("What is the local time when the photo has been taken? (format=YYMMDDhhmmss)")
-    prev_photo, next_photo = find_prev_next(album_path, photo_id)
+    index = AlbumIndex.load(album_path)
+    prev_photo, next_photo = index.find_prev_next(photo_id)
     date_taken = datetime.datetime.strptime(photo_id, DIR_FORMAT)
-    if gpx_path:
-        # the time zone is only needed if a story is provided, assuming the story contains a GPX file
-        timezone = click.prompt("What is the UTC offset of the photo? (format=±hh:mm)")
-    if gpx_path and timezone:
-        position = guess_position_from_gpx(gpx_path, date_taken, timezone)
-        if position:
-            click.echo("The photo is most likely located here:")
-            click.echo(map_link(position))
-    else:
-        position = None
+    position = locate_photo(gpx_path, date_taken, None, interpolate=interpolate)
 
     d = get_exif_data(film_path)
     scanner = scanner_model_exif(d)
@@ -598,18 +817,92 @@ def add_film_to_album(album_path: str | Path, film_path: str, iso: int, film: st
         film,
         scanner,
     ]
-    new_info_data = json.dumps(generate_info_json(prev_photo, next_photo, exif, position), indent=4, ensure_ascii=False)
-    new_dir_path = os.path.join(album_path, photo_id)
-    os.mkdir(new_dir_path)
-    with open(os.path.join(new_dir_path, "i.json"), "w", encoding="utf-8") as json_file:
-        json_file.write(new_info_data + "\n")
-    copy_all_related_files(film_path, new_dir_path)
+    create_photo(album_path, photo_id, film_path, prev_photo, next_photo, exif=exif, position=position)
+    index.add_photo(photo_id)
     update_neighbor(album_path, photo_id, "next", prev_photo)
     update_neighbor(album_path, photo_id, "prev", next_photo)
-    generate_webp(album_path)
+    generate_webp(album_path, jobs, index)
     click.echo(f"[Photo {photo_id}] Added")
 
 
+def expand_tif_paths(tif_path: str) -> list[str]:
+    """
+    The TIF files of a directory, the files matching a glob pattern, or the given file.
+    Raises:
+        ValueError: If the directory has no TIF file or the pattern matches no file.
+    """
+    if os.path.isdir(tif_path):
+        tif_paths = sorted(os.path.join(tif_path, filename) for filename in os.listdir(tif_path) if filename.lower().endswith((".tif", ".tiff")))
+    elif glob.has_magic(tif_path):
+        tif_paths = sorted(glob.glob(tif_path))
+    else:
+        return [tif_path]
+    if not tif_paths:
+        raise ValueError(f"No TIF file found in `{tif_path}'")
+    return tif_paths
+
+
+def add_photos_to_album(
+    album_path: str | Path,
+    tif_paths: list[str],
+    gpx_path: str | Path | None,
+    *,
+    jobs: int = 1,
+    interpolate: bool = False,
+) -> list[str]:
+    """
+    Add many photos to the album in one pass: the metadata are read at once, the GPX file is parsed once,
+    each story metadata file is written once, and the WebP variants of the new photos are generated in parallel.
+    A photo already in the album is reported and skipped.
+    Returns:
+        The IDs of the added photos.
+    """
+    for tif_path in tif_paths:
+        if not os.path.exists(tif_path):
+            raise ValueError(f"RAW file does not exist: {tif_path}")
+    index = AlbumIndex.load(album_path)
+    time_index = None
+    if gpx_path:
+        from cli.src.gpx_time_index import GpxTimeIndex
+
+        time_index = GpxTimeIndex.load(gpx_path)
+    new_photos: dict[str, tuple[str, list, Optional[str]]] = {}
+    for tif_path, d in zip(tif_paths, get_all_exif_data(tif_paths)):
+        photo_id, exif, timezone = read_photo_exif(d, tif_path)
+        if photo_id in index.photos or photo_id in new_photos:
+            click.echo(f"[Photo {photo_id}] Skipped: already in the album ({tif_path})", err=True)
+            continue
+        new_photos[photo_id] = (tif_path, exif, timezone)
+    if not new_photos:
+        return []
+
+    # one merge of the already sorted lists to find all neighbors
+    merged = list(heapq.merge(index.photo_ids, sorted(new_photos, key=int), key=int))
+    links: dict[str, dict[str, str]] = {}
+    for position, photo_id in enumerate(merged):
+        prev_photo = merged[position - 1] if position > 0 else None
+        next_photo = merged[position + 1] if position + 1 < len(merged) else None
+        if photo_id in new_photos:
+            tif_path, exif, timezone = new_photos[photo_id]
+            click.echo(f"Adding photo {photo_id}...")
+            photo_position = locate_photo(gpx_path, exif[0], timezone, time_index, interpolate)
+            create_photo(album_path, photo_id, tif_path, prev_photo, next_photo, exif=exif, position=photo_position)
+            index.add_photo(photo_id)
+            continue
+        # existing photo next to a new one
+        if prev_photo in new_photos:
+            links.setdefault(photo_id, {})["prev"] = prev_photo
+        if next_photo in new_photos:
+            links.setdefault(photo_id, {})["next"] = next_photo
+    for photo_id, photo_links in links.items():
+        update_links(album_path, photo_id, photo_links)
+
+    generate_webp(album_path, jobs, index, list(new_photos))
+    for photo_id in sorted(new_photos, key=int):
+        click.echo(f"[Photo {photo_id}] Added")
+    return sorted(new_photos, key=int)
+
+
 @click.command()
 @click.option(
     "--album-path",
@@ -619,7 +912,7 @@ def add_film_to_album(album_path: str | Path, film_path: str, iso: int, film: st
 )
 @click.option(
     "--tif-path",
-    help="Path to TIF file. Other files starting with the same name will be copied.",
+    help="Path to TIF file, or directory or glob pattern of TIF files. Other files starting with the same name will be copied.",
 )
 @click.option(
     "--film-path",
@@ -637,21 +930,62 @@ def add_film_to_album(album_path: str | Path, film_path: str, iso: int, film: st
     "--gpx-path",
     help="Path to the GPX file used to geotag the photo by comparing GPS/EXIF date/time.",
 )
+@click.option(
+    "-j",
+    "--jobs",
+    default=os.cpu_count() or 1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of WebP variants encoded concurrently.",
+)
+@click.option(
+    "--interpolate",
+    is_flag=True,
+    help="Interpolate the position between the GPX points before and after the photo instead of the nearest point.",
+)
+@click.option(
+    "--aggregate",
+    is_flag=True,
+    help="Update the album-wide metadata file from the changed photo metadata files.",
+)
+@click.option(
+    "--reindex",
+    is_flag=True,
+    help="Rebuild the album index, e.g. after files have been changed by hand.",
+)
 def add_photo(
     album_path: str,
+    *,
     tif_path: str | None = None,
     film_path: str | None = None,
     iso: int | None = None,
     film: str | None = None,
     gpx_path: str | None = None,
+    jobs: int = 1,
+    interpolate: bool = False,
+    aggregate: bool = False,
+    reindex: bool = False,
 ) -> None:
     try:
-        if tif_path:
-            add_photo_to_album(album_path, tif_path, gpx_path)
-        elif film_path and iso and film:
-            add_film_to_album(album_path, film_path, iso, film, gpx_path)
-        else:
-            generate_webp(album_path)
+        if reindex:
+            AlbumIndex(album_path).reindex()
+            click.echo("Album reindexed")
+        with exiftool_session():
+            if tif_path:
+                tif_paths = expand_tif_paths(tif_path)
+                if tif_paths == [tif_path]:
+                    add_photo_to_album(album_path, tif_path, gpx_path, jobs=jobs, interpolate=interpolate)
+                else:
+                    add_photos_to_album(album_path, tif_paths, gpx_path, jobs=jobs, interpolate=interpolate)
+            elif film_path and iso and film:
+                add_film_to_album(album_path, film_path, iso, film, gpx_path, jobs=jobs, interpolate=interpolate)
+            else:
+                generate_webp(album_path, jobs)
+        if aggregate:
+            from cli.src.album_aggregate import update_aggregate
+
+            read_count = update_aggregate(AlbumIndex.load(album_path), [var_options[0] for var_options in ALL_VAR_OPTIONS])
+            click.echo(f"Album metadata updated from {read_count} changed photos")
     except ValueError as err:
         click.echo(err, err=True)
 
@@ -0,0 +1,84 @@
+import json
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator
+from typing import Optional
+from typing import TextIO
+
+
+class Profiler:
+    """
+    Record the wall time and the peak memory of each processing stage, plus some counters.
+
+    A disabled profiler is a no-op so that it can always be passed around.
+    Stages are expected to be sequential, not nested, because the tracemalloc
+    peak is reset when entering a stage.
+    """
+
+    def __init__(self, enabled: bool = False, name: Optional[str] = None):
+        """
+        Args:
+            enabled: True to record, False for a no-op profiler.
+            name: Name of the profiled item, typically the input file.
+        """
+        self.enabled = enabled
+        self.name = name
+        self.wall_time: dict[str, float] = defaultdict(float)
+        self.peak_memory: dict[str, int] = defaultdict(int)
+        self.counters: dict[str, int] = defaultdict(int)
+        self.items = 0 if name is None else 1
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, stage_name: str) -> Iterator[None]:
+        """Measure the code block as the given stage. Measures accumulate if the stage is repeated."""
+        if not self.enabled:
+            yield
+            return
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.wall_time[stage_name] += time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            self.peak_memory[stage_name] = max(self.peak_memory[stage_name], peak - baseline)
+
+    def count(self, counter_name: str, value: int = 1) -> None:
+        if self.enabled:
+            self.counters[counter_name] += value
+
+    def merge(self, other: "Profiler") -> None:
+        """Accumulate the measures of another profiler, typically to get a batch total."""
+        for stage_name, wall_time in other.wall_time.items():
+            self.wall_time[stage_name] += wall_time
+        for stage_name, peak_memory in other.peak_memory.items():
+            self.peak_memory[stage_name] = max(self.peak_memory[stage_name], peak_memory)
+        for counter_name, value in other.counters.items():
+            self.counters[counter_name] += value
+        self.items += other.items
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "items": self.items,
+            "total_wall_time_s": sum(self.wall_time.values()),
+            "stages": {
+                stage_name: {
+                    "wall_time_s": wall_time,
+                    "peak_memory_bytes": self.peak_memory[stage_name],
+                }
+                for stage_name, wall_time in self.wall_time.items()
+            },
+            "counters": dict(self.counters),
+        }
+
+    def write_json_line(self, stream: TextIO) -> None:
+        """Append the report as a JSON line. Nothing is written if the profiler is disabled."""
+        if self.enabled:
+            stream.write(json.dumps(self.to_dict()) + "\n")
+            stream.flush()
@@ -0,0 +1,134 @@
+from typing import Optional
+from typing import Sequence
+
+import gpxpy.geo
+import gpxpy.gpx
+import numpy as np
+
+
+def project(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Equirectangular projection in meters around the mean latitude.
+    Accurate enough for the distance of a point to a span of the same track.
+
+    Returns:
+        Array of shape (n, 2) with the x (east) and y (north) coordinates.
+    """
+    rad_per_deg = np.pi / 180.0
+    mean_latitude = float(np.mean(latitudes)) if len(latitudes) else 0.0
+    x = longitudes * (rad_per_deg * gpxpy.geo.EARTH_RADIUS * np.cos(mean_latitude * rad_per_deg))
+    y = latitudes * (rad_per_deg * gpxpy.geo.EARTH_RADIUS)
+    return np.column_stack((x, y))
+
+
+def haversine_to(latitudes: np.ndarray, longitudes: np.ndarray, latitude: float, longitude: float) -> np.ndarray:
+    """Vectorized version of gpxpy.geo.haversine_distance() from one location to many."""
+    lat1, lon1 = np.radians(latitudes), np.radians(longitudes)
+    lat2, lon2 = np.radians(latitude), np.radians(longitude)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return gpxpy.geo.EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def first_close_approach(distances: np.ndarray, close_enough: float, far_enough: float) -> Optional[int]:
+    """
+    Find out the index of the closest point during the first approach, same logic as
+    Analysis.guess_close_enough(): the approach starts when the distance gets below
+    ``close_enough`` and ends when the distance gets above ``far_enough`` (hysteresis).
+
+    Returns:
+        The 0-based index of the point or None if the track never gets close enough.
+    """
+    close = np.flatnonzero(distances < close_enough)
+    if not len(close):
+        return None
+    start = int(close[0])
+    leaving = np.flatnonzero(distances[start:] > far_enough)
+    end = start + int(leaving[0]) if len(leaving) else len(distances)
+    return start + int(np.argmin(distances[start:end]))
+
+
+def rdp_mask(xy: np.ndarray, tolerance: float, keep: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Ramer-Douglas-Peucker algorithm without recursion. Spans are processed
+    from an explicit stack and distances are computed for the whole span at once.
+
+    Args:
+        xy: Projected coordinates in meters, shape (n, 2).
+        tolerance: Maximum distance in meters between a removed point and the simplified line.
+        keep: Optional boolean mask of points that shall not be removed.
+
+    Returns:
+        Boolean mask of the points to keep.
+    """
+    total_points = len(xy)
+    mask = np.zeros(total_points, dtype=bool)
+    if total_points == 0:
+        return mask
+    mask[0] = mask[-1] = True
+    if keep is not None:
+        mask |= keep
+
+    # forced points are anchors, so each span in between is simplified independently
+    anchors = np.flatnonzero(mask)
+    stack = list(zip(anchors[:-1].tolist(), anchors[1:].tolist()))
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        begin = xy[first]
+        direction = xy[last] - begin
+        offsets = xy[first + 1 : last] - begin
+        norm = np.hypot(direction[0], direction[1])
+        if norm > 0:
+            distances = np.abs(direction[0] * offsets[:, 1] - direction[1] * offsets[:, 0]) / norm
+        else:  # loop, the span is a single point
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        idx_farthest = int(np.argmax(distances))
+        if distances[idx_farthest] >= tolerance:
+            split = first + 1 + idx_farthest
+            mask[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return mask
+
+
+def simplify_gpx(
+    gpx: gpxpy.gpx.GPX,
+    tolerance: float,
+    anchors: Sequence[tuple[float, float]] = (),
+    close_enough: float = 500.0,
+    far_enough: float = 1000.0,
+) -> None:
+    """
+    Simplify all track segments in place.
+
+    Args:
+        gpx: Parsed GPX data.
+        tolerance: RDP tolerance in meters.
+        anchors: (latitude, longitude) of locations, typically waypoints, whose snapped
+            track point shall be preserved. See first_close_approach().
+        close_enough: Distance in meters where an anchor is approaching the track.
+        far_enough: Distance in meters where an anchor is leaving the track.
+    """
+    segments = [segment for track in gpx.tracks for segment in track.segments]
+    sizes = [len(segment.points) for segment in segments]
+    total_points = sum(sizes)
+    if total_points == 0:
+        return
+    latitudes = np.fromiter((point.latitude for segment in segments for point in segment.points), dtype=np.float64, count=total_points)
+    longitudes = np.fromiter((point.longitude for segment in segments for point in segment.points), dtype=np.float64, count=total_points)
+
+    keep = np.zeros(total_points, dtype=bool)
+    for latitude, longitude in anchors:
+        idx_snapped = first_close_approach(haversine_to(latitudes, longitudes, latitude, longitude), close_enough, far_enough)
+        if idx_snapped is not None:
+            keep[idx_snapped] = True
+
+    offset = 0
+    for segment, size in zip(segments, sizes):
+        end = offset + size
+        if size > 2:
+            xy = project(latitudes[offset:end], longitudes[offset:end])
+            mask = rdp_mask(xy, tolerance, keep[offset:end])
+            segment.points = [point for point, kept in zip(segment.points, mask) if kept]
+        offset = end
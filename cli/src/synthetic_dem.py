@@ -0,0 +1,246 @@
+import base64
+import io
+import os
+import re
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Callable
+from typing import Optional
+from urllib.parse import parse_qs
+from urllib.parse import quote
+from urllib.parse import urlparse
+
+import numpy as np
+
+from cli.src.elevation import GeoElevationFile
+
+# number of cells of one side of the tile for each resolution in arc-seconds
+SQUARE_SIDES = {1: 3601, 3: 1201}
+VOID = -32768  # fill value of SRTM
+
+
+def plane(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Tilted plane, the elevation growing by 100 meters per 0.1° north and 10 meters per 0.1° east."""
+    return 1000.0 * (latitudes - np.floor(latitudes)) + 100.0 * (longitudes - np.floor(longitudes))
+
+
+def waves(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Hills and valleys between 200 and 2800 meters, continuous across tiles."""
+    return 1500.0 + 1300.0 * np.sin(2.0 * np.pi * latitudes) * np.cos(2.0 * np.pi * longitudes)
+
+
+def sea_level(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    return np.zeros(np.broadcast(latitudes, longitudes).shape)
+
+
+SURFACES: dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    "plane": plane,
+    "waves": waves,
+    "sea_level": sea_level,
+}
+
+
+def make_tile(
+    tilename: str,
+    resolution: int = 3,
+    surface: str = "waves",
+    *,
+    void_cells: int = 0,
+    void_edges: bool = False,
+    seed: int = 0,
+) -> bytes:
+    """
+    Generate the content of a HGT tile, big-endian 16-bit integers row by row from the north-west corner.
+    The elevation of each cell is given by the surface at the location of the cell, so that the
+    expected elevation of any location is known, see cell_elevation().
+
+    Args:
+        tilename: str of the tile (form "N00E000").
+        resolution: 1 or 3 arc-seconds.
+        surface: Name of the surface in SURFACES.
+        void_cells: Number of cells without data, randomly placed.
+        void_edges: True to also remove the data of the first and last rows and columns.
+        seed: Seed of the void cells.
+    """
+    square_side = SQUARE_SIDES[resolution]
+    latitude, longitude = GeoElevationFile.starting_position(f"{tilename}_")
+    steps = np.arange(square_side) / (square_side - 1)
+    latitudes = (latitude + 1 - steps)[:, np.newaxis]
+    longitudes = (longitude + steps)[np.newaxis, :]
+    tile = np.rint(SURFACES[surface](latitudes, longitudes)).astype(">i2")
+    if void_edges:
+        tile[[0, -1], :] = VOID
+        tile[:, [0, -1]] = VOID
+    if void_cells:
+        rng = np.random.default_rng(seed)
+        tile.reshape(-1)[rng.choice(tile.size, void_cells, replace=False)] = VOID
+    return tile.tobytes()
+
+
+def cell_elevation(surface: str, latitude: float, longitude: float, resolution: int = 3) -> float:
+    """Elevation of the cell of the tile containing the location, as read by GeoElevationFile.get_elevation()."""
+    square_side = SQUARE_SIDES[resolution]
+    tile_latitude, tile_longitude = np.floor(latitude), np.floor(longitude)
+    row = np.floor((tile_latitude + 1 - latitude) * (square_side - 1))
+    column = np.floor((longitude - tile_longitude) * (square_side - 1))
+    cell = SURFACES[surface](np.array(tile_latitude + 1 - row / (square_side - 1)), np.array(tile_longitude + column / (square_side - 1)))
+    return float(np.rint(cell))
+
+
+def write_tiles(directory: str, tilenames: list[str], version: str, **tile_options) -> None:
+    """Write the tiles into the cache folder of GeoElevationData, see make_tile() for the options."""
+    os.makedirs(directory, exist_ok=True)
+    for tilename in tilenames:
+        with open(os.path.join(directory, f"{tilename}_{version}.hgt"), "wb") as tile_file:
+            tile_file.write(make_tile(tilename, **tile_options))
+
+
+def zip_tile(tilename: str, data: bytes) -> bytes:
+    """Archive of the tile as served by LP DAAC."""
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr(f"{tilename}.hgt", data)
+    return stream.getvalue()
+
+
+class FakeEarthDataServer:
+    """
+    Local HTTP server serving zipped synthetic tiles at the SRTMGL1v3 URLs, behind an authentication
+    similar to NASA EarthData: without session cookie, the data URL redirects to the login host, which
+    checks the basic authentication and redirects to the data host that opens the session and redirects
+    to the data URL.
+    The data and login hosts are the same server reached with two host names (`localhost` and
+    `127.0.0.1`) so that the EarthData session forwards the credentials to the login host only.
+
+    Usage::
+
+        with FakeEarthDataServer({"N45E006": make_tile("N45E006", 1)}) as server:
+            GeoElevationData("SRTMGL1v3", "user", "password", base_url=server.base_url, auth_host=server.auth_host)
+    """
+
+    TILE_RE = re.compile(r"/MEASURES/SRTMGL1\.003/2000\.02\.11/([NS]\d{2}[EW]\d{3})\.SRTMGL1\.hgt\.zip$")
+    COOKIE = "urs_session=synthetic"
+
+    def __init__(
+        self,
+        tiles: dict[str, bytes],
+        username: str = "user",
+        password: str = "password",
+        failures: int = 0,
+        delay: float = 0.0,
+    ):
+        """
+        Args:
+            tiles: Content of the HGT tiles by name, the other tiles do not exist (404).
+            username: Expected EarthData username.
+            password: Expected EarthData password.
+            failures: Number of tile requests failing first with a 503 error, to test retries.
+            delay: Seconds waited before sending a tile, to test concurrency.
+        """
+        self.archives = {tilename: zip_tile(tilename, data) for tilename, data in tiles.items()}
+        self.authorization = "Basic " + base64.b64encode(f"{username}:{password}".encode("utf-8")).decode("ascii")
+        self.failures = failures
+        self.delay = delay
+        self.lock = threading.Lock()
+        # number of requests of each tile, and number of successful logins
+        self.tile_requests: dict[str, int] = {}
+        self.logins = 0
+        self.httpd: Optional[ThreadingHTTPServer] = None
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        if self.httpd is None:
+            raise ValueError("Server not started")
+        return self.httpd.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://localhost:{self.port}"
+
+    @property
+    def auth_host(self) -> str:
+        return "127.0.0.1"
+
+    def __enter__(self) -> "FakeEarthDataServer":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def handle(self, request: BaseHTTPRequestHandler) -> None:
+        url = urlparse(request.path)
+        query = parse_qs(url.query)
+        if url.path == "/oauth/authorize":
+            self.handle_login(request, query.get("state", [""])[0])
+            return
+        if url.path == "/login":
+            # the data host opens the session and redirects to the requested tile
+            self.send(request, 302, headers={"Location": query.get("state", [""])[0], "Set-Cookie": f"{self.COOKIE}; Path=/"})
+            return
+        match = self.TILE_RE.match(url.path)
+        if not match:
+            self.send(request, 404)
+            return
+        if self.COOKIE not in request.headers.get("Cookie", ""):
+            redirect = f"http://{self.auth_host}:{self.port}/oauth/authorize?state={quote(self.base_url + request.path, safe='')}"
+            self.send(request, 302, headers={"Location": redirect})
+            return
+        self.handle_tile(request, match.group(1))
+
+    def handle_login(self, request: BaseHTTPRequestHandler, state: str) -> None:
+        if request.headers.get("Authorization") != self.authorization:
+            self.send(request, 401)
+            return
+        with self.lock:
+            self.logins += 1
+        self.send(request, 302, headers={"Location": f"{self.base_url}/login?code=synthetic&state={quote(state, safe='')}"})
+
+    def handle_tile(self, request: BaseHTTPRequestHandler, tilename: str) -> None:
+        with self.lock:
+            self.tile_requests[tilename] = self.tile_requests.get(tilename, 0) + 1
+            failing = self.failures > 0
+            if failing:
+                self.failures -= 1
+        if failing:
+            self.send(request, 503)
+            return
+        if tilename not in self.archives:
+            self.send(request, 404)
+            return
+        if self.delay:
+            time.sleep(self.delay)
+        self.send(request, 200, self.archives[tilename], {"Content-Type": "application/zip"})
+
+    @staticmethod
+    def send(request: BaseHTTPRequestHandler, status: int, body: bytes = b"", headers: Optional[dict[str, str]] = None) -> None:
+        request.send_response(status)
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
@@ -0,0 +1,93 @@
+import glob
+import os
+import time
+from typing import Iterator
+from typing import Optional
+
+FileState = tuple[int, int]
+
+
+class PollingWatcher:
+    """
+    Watch files by polling their modification time and size.
+
+    A change is reported once the file has been stable for the debounce delay,
+    so that a file written in several chunks by a GPS tool is reported once.
+    Files existing when the watcher is created are not reported until modified.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        recursive: bool = False,
+        extension: str = ".gpx",
+        interval: float = 0.1,
+        debounce: float = 0.3,
+    ):
+        """
+        Args:
+            path: File or directory to watch.
+            recursive: Also watch the subdirectories.
+            extension: Only files ending with this extension (case-insensitive) are watched.
+            interval: Delay in seconds between two scans.
+            debounce: Delay in seconds the file shall be unchanged before being reported.
+        """
+        self.path = path
+        self.recursive = recursive
+        self.extension = extension.lower()
+        self.interval = interval
+        self.debounce = debounce
+        self.snapshot = self.scan()
+        self.pending: dict[str, tuple[FileState, float]] = {}
+
+    def scan(self) -> dict[str, FileState]:
+        """Return the modification time and size of all watched files."""
+        if os.path.isdir(self.path):
+            candidates = glob.iglob(self.path + "/**", recursive=self.recursive)
+        else:
+            candidates = iter([self.path])
+        states = {}
+        for filename in candidates:
+            if not filename.lower().endswith(self.extension):
+                continue
+            try:
+                stat = os.stat(filename)
+            except FileNotFoundError:
+                continue
+            if os.path.isfile(filename):
+                states[filename] = (stat.st_mtime_ns, stat.st_size)
+        return states
+
+    def poll(self, now: Optional[float] = None) -> list[str]:
+        """
+        Scan once and return the files that changed and are now stable, sorted by name.
+        Args:
+            now: Current monotonic time, mostly for testing.
+        """
+        if now is None:
+            now = time.monotonic()
+        states = self.scan()
+        ready = []
+        for filename, state in states.items():
+            if state == self.snapshot.get(filename):
+                self.pending.pop(filename, None)
+                continue
+            pending = self.pending.get(filename)
+            if pending is None or pending[0] != state:
+                self.pending[filename] = (state, now)
+            elif now - pending[1] >= self.debounce:
+                ready.append(filename)
+                self.snapshot[filename] = state
+                del self.pending[filename]
+        # forget removed files
+        for filename in set(self.snapshot) - set(states):
+            del self.snapshot[filename]
+        for filename in set(self.pending) - set(states):
+            del self.pending[filename]
+        return sorted(ready)
+
+    def watch(self) -> Iterator[str]:
+        """Yield the changed files forever."""
+        while True:
+            yield from self.poll()
+            time.sleep(self.interval)
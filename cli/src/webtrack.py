@@ -1,5 +1,8 @@
+import struct
 from enum import Enum
+from io import BytesIO
 from typing import Any
+from typing import BinaryIO
 from typing import Literal
 
 
@@ -89,16 +92,117 @@ class WebTrack:
     def to_file(self, file_path: str, data: dict) -> None:
         """Open the binary file and write the WebTrack data."""
         with open(file_path, "wb") as stream:
-            self.fp = stream
-            self.data_src = data
-            self.total_segments = len(data["segments"]) if "segments" in data else 0
-            self.total_waypoints = len(data["waypoints"]) if "waypoints" in data else 0
-
-            self._write_format_information()
-            self._write_segment_headers()
-            self._write_track_information()
-            self._write_segments()
-            self._write_waypoints()
+            self.to_stream(stream, data)
+
+    def to_bytes(self, data: dict) -> bytes:
+        """Encode the WebTrack data in memory."""
+        stream = BytesIO()
+        self.to_stream(stream, data)
+        return stream.getvalue()
+
+    def to_stream(self, stream: BinaryIO, data: dict) -> None:
+        """Write the WebTrack data into the binary stream."""
+        self.fp = stream
+        self.data_src = data
+        self.total_segments = len(data["segments"]) if "segments" in data else 0
+        self.total_waypoints = len(data["waypoints"]) if "waypoints" in data else 0
+        self.has_some_ele = False
+
+        self._write_format_information()
+        self._write_segment_headers()
+        self._write_track_information()
+        self._write_segments()
+        self._write_waypoints()
+
+    def from_file(self, file_path: str) -> dict:
+        """Read the WebTrack file, see from_bytes()."""
+        with open(file_path, "rb") as stream:
+            return self.from_bytes(stream.read())
+
+    def from_bytes(self, data: bytes) -> dict:
+        """
+        Decode the WebTrack data, as the web app does.
+        Returns:
+            The data in the same structure as the input of to_file(). The distances are rounded to 10 meters,
+            and the activities of the track information are not stored if there is only one activity.
+        Raises:
+            ValueError: the format name or version is not supported.
+        """
+        format_info = self.format_name + b":" + self.format_version + b":"
+        if not data.startswith(format_info):
+            raise ValueError("Bad file format")
+        total_segments, total_waypoints = struct.unpack_from(">BH", data, len(format_info))
+        offset = len(format_info) + 3
+        segment_headers = []
+        for _ in range(total_segments):
+            activity, with_ele, total_points = struct.unpack_from(">2scI", data, offset)
+            offset += 7
+            segment_headers.append((Activity(activity), with_ele.decode("utf-8") if with_ele != b"F" else False, total_points))
+
+        decoded: dict = {"segments": [], "waypoints": []}
+        if segment_headers:
+            track_info, offset = self._read_track_information(data, offset, segment_headers)
+            decoded["trackInformation"] = track_info
+        for activity, with_ele, total_points in segment_headers:
+            points, offset = self._read_segment(data, offset, with_ele, total_points)
+            decoded["segments"].append({"activity": activity, "withEle": with_ele, "points": points})
+        for _ in range(total_waypoints):
+            waypoint, offset = self._read_waypoint(data, offset, bool(segment_headers))
+            decoded["waypoints"].append(waypoint)
+        return decoded
+
+    def _read_track_information(self, data: bytes, offset: int, segment_headers: list[tuple]) -> tuple[dict, int]:
+        """Read the "Track Information" section of the WebTrack data, returned with the offset after the section."""
+        (total_length,) = struct.unpack_from(">I", data, offset)
+        offset += 4
+        all_activities = {segment_header[0] for segment_header in segment_headers}
+        activities = []
+        if len(all_activities) > 1:
+            for _ in range(len(all_activities)):
+                activity, length = struct.unpack_from(">2sI", data, offset)
+                offset += 6
+                activities.append({"activity": Activity(activity), "length": length})
+        track_info: dict = {"lengths": {"total": total_length, "activities": activities}}
+        if any(segment_header[1] for segment_header in segment_headers):
+            min_ele, max_ele, gain, loss = struct.unpack_from(">hhII", data, offset)
+            offset += 12
+            track_info.update(minimumAltitude=min_ele, maximumAltitude=max_ele, elevationGain=gain, elevationLoss=loss)
+        return track_info, offset
+
+    def _read_segment(self, data: bytes, offset: int, with_ele: str | bool, total_points: int) -> tuple[list, int]:
+        """Read the points of one segment, returned with the offset after the segment."""
+        points = []
+        lon = lat = 0
+        # the first point is absolute, the next ones are relative to the previous point
+        first_format, next_format = (">iiIh", ">hhIh") if with_ele else (">iiI", ">hhI")
+        for point_id in range(total_points):
+            point_format = next_format if point_id else first_format
+            values = struct.unpack_from(point_format, data, offset)
+            offset += struct.calcsize(point_format)
+            lon, lat = (lon + values[0], lat + values[1]) if point_id else (values[0], values[1])
+            points.append((lon / 1e5, lat / 1e5, values[2] * 10.0, values[3] if with_ele else None))
+        return points, offset
+
+    def _read_waypoint(self, data: bytes, offset: int, with_idx: bool) -> tuple[list, int]:
+        """Read one waypoint, returned with the offset after the waypoint."""
+        lon, lat = struct.unpack_from(">ii", data, offset)
+        offset += 8
+        idx = 0
+        if with_idx:
+            (idx,) = struct.unpack_from(">I", data, offset)
+            offset += 4
+        with_ele: str | bool = False
+        ele = None
+        if data[offset : offset + 1] != b"F":
+            with_ele = data[offset : offset + 1].decode("utf-8")
+            (ele,) = struct.unpack_from(">h", data, offset + 1)
+            offset += 2
+        offset += 1
+        sym_end = data.index(b"\n", offset)
+        name_end = data.index(b"\n", sym_end + 1)
+        sym = data[offset:sym_end].decode("utf-8")
+        name = data[sym_end + 1 : name_end].decode("utf-8")
+        return [lon / 1e5, lat / 1e5, with_ele, ele, sym, name, idx], name_end + 1
 
     def _w_sep(self):
         """Append a separator to the stream."""
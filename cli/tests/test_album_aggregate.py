@@ -0,0 +1,79 @@
+import json
+import os
+
+from cli.src.album_aggregate import AGGREGATE_FILENAME
+from cli.src.album_aggregate import update_aggregate
+from cli.src.album_index import MANIFEST_FILENAME
+from cli.src.album_index import AlbumIndex
+
+VARIANT_NAMES = ["f", "t", "m"]
+
+
+def create_photo(tmp_path, photo_id, info_data, variants=(), with_manifest=True):
+    photo_dir = tmp_path / photo_id
+    photo_dir.mkdir(exist_ok=True)
+    (photo_dir / "i.json").write_text(json.dumps(info_data), encoding="utf-8")
+    for name in variants:
+        (photo_dir / f"{name}.webp").write_bytes(b"")
+    if variants and with_manifest:
+        manifest = {name: {"original_sha256": "0"} for name in variants}
+        (photo_dir / MANIFEST_FILENAME).write_text(json.dumps(manifest), encoding="utf-8")
+
+
+def read_aggregate(tmp_path):
+    with open(tmp_path / AGGREGATE_FILENAME, "r", encoding="utf-8") as aggregate_file:
+        return json.load(aggregate_file)
+
+
+def test_update_aggregate(tmp_path):
+    create_photo(tmp_path, "2", {"dateTaken": "2020-01-02T00:00:00", "prev": 1, "body": "B1", "lens": "L2"}, ["t"])
+    create_photo(
+        tmp_path, "1", {"dateTaken": "2020-01-01T00:00:00", "next": 2, "body": "B1", "lens": "L1", "position": {"lat": 1.5, "lon": 2.5}}, ["f", "m"]
+    )
+    (tmp_path / "3").mkdir()  # photo without metadata
+    assert update_aggregate(AlbumIndex.load(tmp_path), VARIANT_NAMES) == 2
+    aggregate = read_aggregate(tmp_path)
+    assert aggregate["bodies"] == ["B1"]
+    assert aggregate["lenses"] == ["L1", "L2"]
+    assert aggregate["variants"] == VARIANT_NAMES
+    assert aggregate["photos"] == {
+        "id": [1, 2],
+        "dateTaken": ["2020-01-01T00:00:00", "2020-01-02T00:00:00"],
+        "lat": [1.5, None],
+        "lon": [2.5, None],
+        "prev": [None, 1],
+        "next": [2, None],
+        "body": [0, 0],
+        "lens": [0, 1],
+        "variants": [0b101, 0b010],
+    }
+
+
+def test_incremental_update(tmp_path):
+    create_photo(tmp_path, "1", {"body": "B1"})
+    create_photo(tmp_path, "2", {"body": "B1"})
+    assert update_aggregate(AlbumIndex.load(tmp_path), VARIANT_NAMES) == 2
+    modification_time = os.stat(tmp_path / AGGREGATE_FILENAME).st_mtime_ns
+    assert update_aggregate(AlbumIndex.load(tmp_path), VARIANT_NAMES) == 0
+    assert os.stat(tmp_path / AGGREGATE_FILENAME).st_mtime_ns == modification_time
+    create_photo(tmp_path, "2", {"body": "B2, changed"})
+    assert update_aggregate(AlbumIndex.load(tmp_path), VARIANT_NAMES) == 1
+    assert read_aggregate(tmp_path)["bodies"] == ["B1", "B2, changed"]
+
+
+def test_variants_from_index(tmp_path):
+    """The variants come from the index, the photo directories are not listed again."""
+    create_photo(tmp_path, "1", {"body": "B1"}, ["f"])
+    index = AlbumIndex.load(tmp_path)
+    (tmp_path / "1" / "t.webp").write_bytes(b"")  # not recorded
+    index.set_variant("1", "m", {"original_sha256": "0"})
+    update_aggregate(index, VARIANT_NAMES)
+    assert read_aggregate(tmp_path)["photos"]["variants"] == [0b101]
+
+
+def test_variants_without_originals(tmp_path):
+    """The variants of a cloned album, without original photos and manifests, are listed."""
+    create_photo(tmp_path, "1", {"body": "B1"}, ["f", "t", "m"], with_manifest=False)
+    create_photo(tmp_path, "2", {"body": "B1"}, ["t"], with_manifest=False)
+    update_aggregate(AlbumIndex.load(tmp_path), VARIANT_NAMES)
+    assert read_aggregate(tmp_path)["photos"]["variants"] == [0b111, 0b010]
@@ -0,0 +1,110 @@
+import json
+import os
+
+import pytest
+from PIL import Image
+
+from cli.src.album_index import INDEX_FILENAME
+from cli.src.album_index import LEGACY_VARIANT
+from cli.src.album_index import MANIFEST_FILENAME
+from cli.src.album_index import AlbumIndex
+
+
+def create_album(tmp_path, photo_ids):
+    for photo_id in photo_ids:
+        photo_dir = tmp_path / photo_id
+        photo_dir.mkdir()
+        (photo_dir / "photo.tif").write_bytes(b"original")
+
+
+def test_load_and_save(tmp_path):
+    create_album(tmp_path, ["200101000000", "9", "10"])
+    index = AlbumIndex.load(tmp_path)
+    assert index.photo_ids == ["9", "10", "200101000000"]
+    assert os.path.exists(tmp_path / INDEX_FILENAME)
+    index.set_variant("9", "f", {"quality": 90})
+    index.save()
+    index = AlbumIndex.load(tmp_path)
+    assert index.variant("9", "f") == {"quality": 90}
+    assert index.variant("9", "t") is None
+
+
+def test_original_hash(tmp_path):
+    create_album(tmp_path, ["1"])
+    index = AlbumIndex.load(tmp_path)
+    original_path, original_sha256 = index.original("1")
+    assert original_path == os.path.join(tmp_path, "1", "photo.tif")
+    os.utime(original_path, ns=(0, 0))
+    assert index.original("1")[1] == original_sha256
+    (tmp_path / "1" / "photo.tif").write_bytes(b"edited original")
+    assert index.original("1")[1] != original_sha256
+
+
+def test_original_info(tmp_path):
+    (tmp_path / "1").mkdir()
+    Image.new("RGB", (30, 20)).save(tmp_path / "1" / "photo.tif")
+    index = AlbumIndex.load(tmp_path)
+    index.original("1")
+    assert index.original_info("1") == (30, 20)
+    create_album(tmp_path, ["2"])
+    index.add_photo("2")
+    index.original("2")
+    assert index.original_info("2") is None
+
+
+def test_manifest(tmp_path):
+    """The fingerprints survive the loss of the index, and variants without manifest are legacy."""
+    create_album(tmp_path, ["1", "2"])
+    for photo_id in ("1", "2"):
+        (tmp_path / photo_id / "f.webp").write_bytes(b"variant")
+        (tmp_path / photo_id / "t.webp").write_bytes(b"variant")
+        os.utime(tmp_path / photo_id / "photo.tif", ns=(0, 0))
+    index = AlbumIndex.load(tmp_path)
+    assert index.variant("1", "f") == LEGACY_VARIANT
+    index.set_variant("1", "f", {"quality": 90})
+    index.save_manifest("1")
+    assert os.path.exists(tmp_path / "1" / MANIFEST_FILENAME)
+    os.remove(tmp_path / INDEX_FILENAME)
+    index = AlbumIndex.load(tmp_path)
+    assert index.variant("1", "f") == {"quality": 90}
+    assert index.variant("1", "t") is None
+    assert index.variant("2", "t") == LEGACY_VARIANT
+
+
+def test_corrupted_index(tmp_path):
+    create_album(tmp_path, ["1"])
+    (tmp_path / INDEX_FILENAME).write_text("{", encoding="utf-8")
+    assert AlbumIndex.load(tmp_path).photo_ids == ["1"]
+    with open(tmp_path / INDEX_FILENAME, "r", encoding="utf-8") as index_file:
+        assert json.load(index_file)["photos"]["1"]["original"] == "photo.tif"
+
+
+def test_sync(tmp_path):
+    create_album(tmp_path, ["1", "3"])
+    AlbumIndex.load(tmp_path)
+    create_album(tmp_path, ["2"])
+    os.remove(tmp_path / "3" / "photo.tif")
+    os.rmdir(tmp_path / "3")
+    assert AlbumIndex.load(tmp_path).photo_ids == ["1", "2"]
+
+
+def test_find_prev_next(tmp_path):
+    index = AlbumIndex.load(tmp_path)
+    assert index.find_prev_next("5") == (None, None)
+    create_album(tmp_path, ["2", "4"])
+    index.add_photo("2")
+    index.add_photo("4")
+    assert index.find_prev_next("1") == (None, "2")
+    assert index.find_prev_next("3") == ("2", "4")
+    assert index.find_prev_next("5") == ("4", None)
+    with pytest.raises(ValueError, match="Photo already in the album!"):
+        index.find_prev_next("4")
+
+
+def test_missing_original(tmp_path):
+    (tmp_path / "1").mkdir()
+    index = AlbumIndex.load(tmp_path)
+    with pytest.raises(FileNotFoundError, match="Missing original photo"):
+        index.original("1")
+    (tmp_path / "1" / "photo.png").write_bytes(b"original")
+    assert index.original("1")[0] == os.path.join(tmp_path, "1", "photo.png")
@@ -0,0 +1,66 @@
+import json
+
+from click.testing import CliRunner
+
+from cli.src.compare_formats import compare_formats
+from cli.src.compare_formats import decode_polyline
+from cli.src.compare_formats import encode_polyline
+from cli.src.compare_formats import measure_formats
+from cli.src.compare_formats import total_measures
+from cli.src.webtrack import Activity
+
+DATA = {
+    "segments": [
+        {"activity": Activity.WALK, "withEle": "E", "points": [(169.1, -44.2, 0.0, 500), (169.10012, -44.20005, 120.0, 512)]},
+        {"activity": Activity.KAYAK, "withEle": False, "points": [(169.2, -44.3, 1000.0, None)]},
+    ],
+    "waypoints": [[169.15, -44.25, "E", 520, "Summit", "Mt. Été", 2]],
+    "trackInformation": {
+        "lengths": {"total": 1000, "activities": [{"activity": Activity.WALK, "length": 123}, {"activity": Activity.KAYAK, "length": 877}]},
+        "minimumAltitude": 500,
+        "maximumAltitude": 512,
+        "elevationGain": 12,
+        "elevationLoss": 0,
+    },
+}
+
+
+def test_polyline():
+    """Example of the Google documentation."""
+    coordinates = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    assert encode_polyline(coordinates) == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@") == coordinates
+
+
+def test_measure_formats():
+    measures = measure_formats(DATA, repeat=1)
+    assert list(measures) == ["webtrack", "gpx", "geojson", "polyline"]
+    for measure in measures.values():
+        assert measure["raw_bytes"] > 0
+        assert measure["gzip_bytes"] > 0
+        assert measure["encode_s"] > 0
+        assert measure["decode_s"] > 0
+    assert measures["webtrack"]["raw_bytes"] < measures["gpx"]["raw_bytes"]
+    totals = total_measures([measures, measures])
+    assert totals["gpx"]["raw_bytes"] == 2 * measures["gpx"]["raw_bytes"]
+
+
+def test_compare_formats(tmp_path):
+    gpx_path = tmp_path / "track.gpx"
+    gpx_path.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>\n<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">'
+        '<wpt lat="45.2" lon="6.1"><name>Hut</name></wpt>'
+        '<trk><name>1. Day</name><trkseg><trkpt lat="45.2" lon="6.1"/><trkpt lat="45.21" lon="6.11"/></trkseg></trk></gpx>\n',
+        encoding="utf-8",
+    )
+    # skipped because embellished
+    (tmp_path / "track.none.gpx").write_text("", encoding="utf-8")
+    json_path = tmp_path / "measures.json"
+    result = CliRunner().invoke(compare_formats, ["--path", str(tmp_path), "--repeat", "1", "--per-file", "--json", str(json_path)])
+    assert result.exit_code == 0, result.output
+    assert "track.gpx  webtrack" in result.output
+    assert "TOTAL      polyline" in result.output
+    with open(json_path, "r", encoding="utf-8") as json_file:
+        measures = json.load(json_file)
+    assert list(measures["files"]) == [str(gpx_path)]
+    assert measures["totals"]["gpx"] == measures["files"][str(gpx_path)]["gpx"]
@@ -0,0 +1,121 @@
+import math
+
+import gpxpy.geo
+import gpxpy.gpx
+import numpy as np
+
+from cli.src.dem_sampling import add_dem_elevations
+from cli.src.dem_sampling import fill_missing
+from cli.src.dem_sampling import interval_samples
+from cli.src.dem_sampling import step_distances
+from cli.src.elevation import GeoElevationData
+
+
+class FakeElevationData(GeoElevationData):
+    """Smooth synthetic terrain, void south of 45.205°."""
+
+    def __init__(self):
+        super().__init__("JdF1")
+        self.queries = 0
+
+    def get_elevation(self, latitude, longitude):
+        if latitude < 45.205:
+            return None
+        return round(1000 + 500 * math.sin(latitude * 40) * math.cos(longitude * 30))
+
+    def get_elevations_and_sources(self, latitudes, longitudes):
+        self.queries += 1
+        elevations = np.array([np.nan if (ele := self.get_elevation(lat, lon)) is None else ele for lat, lon in zip(latitudes, longitudes)])
+        return elevations, np.where(np.isnan(elevations), -1, 0)
+
+
+def make_points(point_class, count, seed):
+    rng = np.random.default_rng(seed)
+    latitudes = 45.2 + np.cumsum(rng.uniform(-0.0005, 0.001, count))
+    longitudes = 6.8 + np.cumsum(rng.uniform(-0.0005, 0.001, count))
+    return [point_class(float(lat), float(lon), elevation=2000.0) for lat, lon in zip(latitudes, longitudes)]
+
+
+def make_gpx():
+    gpx = gpxpy.gpx.GPX()
+    for seed in (1, 2):
+        track = gpxpy.gpx.GPXTrack()
+        for size in (300, 1, 0):
+            track.segments.append(gpxpy.gpx.GPXTrackSegment(make_points(gpxpy.gpx.GPXTrackPoint, size, seed + size)))
+        gpx.tracks.append(track)
+    route = gpxpy.gpx.GPXRoute()
+    route.points = make_points(gpxpy.gpx.GPXRoutePoint, 50, 3)
+    gpx.routes.append(route)
+    gpx.waypoints = make_points(gpxpy.gpx.GPXWaypoint, 5, 4)
+    return gpx
+
+
+def test_step_distances():
+    latitudes = np.array([45.0, 45.001, 45.5, 45.5, -10.0])
+    longitudes = np.array([6.0, 6.002, 6.1, 6.1, 100.0])
+    expected = [0.0] + [gpxpy.geo.distance(latitudes[i], longitudes[i], None, latitudes[i - 1], longitudes[i - 1], None) for i in range(1, 5)]
+    assert step_distances(latitudes, longitudes).tolist() == expected
+    expected = [0.0] + [gpxpy.geo.distance(latitudes[i - 1], longitudes[i - 1], None, latitudes[i], longitudes[i], None) for i in range(1, 5)]
+    assert step_distances(latitudes, longitudes, backwards=True).tolist() == expected
+    assert step_distances(np.array([1.0]), np.array([2.0])).tolist() == [0.0]
+
+
+def test_interval_samples():
+    lengths = np.array([0.0, 10.0, 36.0, 40.0, 200.0, 210.0, 220.0, 230.0])
+    assert interval_samples(lengths, 35).nonzero()[0].tolist() == [0, 2, 4, 5, 6, 7]
+    assert interval_samples(np.array([0.0]), 35).tolist() == [True]
+    assert interval_samples(np.array([]), 35).tolist() == []
+
+
+def test_fill_missing():
+    steps = np.array([0.0, 1.0, 1.0, 2.0, 1.0, 1.0, 1.0, 1.0])
+    elevations = np.array([np.nan, 10.0, np.nan, 40.0, np.nan, 50.0, np.nan, np.nan])
+    np.testing.assert_array_equal(fill_missing(steps, steps, elevations), [np.nan, 10.0, 20.0, 40.0, 45.0, 50.0, np.nan, np.nan])
+    # the last span of a gap is measured backwards, as gpxpy
+    back_steps = np.array([0.0, 1.0, 1.0, 2.0, 1.0, 3.0, 1.0, 1.0])
+    np.testing.assert_array_equal(fill_missing(steps, back_steps, elevations), [np.nan, 10.0, 20.0, 40.0, 42.5, 50.0, np.nan, np.nan])
+    # no interpolation without length to the end of the gap
+    np.testing.assert_array_equal(fill_missing(steps, np.zeros(8), elevations), [np.nan, 10.0, 10.0, 40.0, 40.0, 50.0, np.nan, np.nan])
+
+
+def test_add_dem_elevations_same_as_add_elevations():
+    """Same GPX data as the point by point sampling, routes sampled as tracks, the DEM elevations of the waypoints being returned."""
+    expected_gpx = make_gpx()
+    for point in expected_gpx.waypoints:
+        point.elevation = None
+    route_track = gpxpy.gpx.GPXTrack()
+    route_track.segments.append(gpxpy.gpx.GPXTrackSegment(expected_gpx.routes[0].points))
+    expected_gpx.tracks.append(route_track)
+    GeoElevationData.add_elevations(FakeElevationData(), expected_gpx, smooth=True)
+    expected_gpx.tracks.remove(route_track)
+    gpx = make_gpx()
+    elevation_data = FakeElevationData()
+    samples = add_dem_elevations(gpx, elevation_data)
+    assert elevation_data.queries == 1
+    assert gpx.to_xml() == expected_gpx.to_xml()
+    assert any(point.elevation is None for point in gpx.tracks[0].segments[0].points)
+    assert all(point.elevation is not None for point in gpx.routes[0].points[-10:])
+    assert samples.waypoint_elevations == [elevation_data.get_elevation(wpt.latitude, wpt.longitude) for wpt in gpx.waypoints]
+
+
+def test_add_dem_elevations_sources():
+    """The DEM of the waypoints and the main DEM of the tracks come from the sampling query."""
+
+    class FallbackElevationData(FakeElevationData):
+        """The voids being filled by a second DEM west of 6.9°."""
+
+        def get_elevations_and_sources(self, latitudes, longitudes):
+            elevations, sources = super().get_elevations_and_sources(latitudes, longitudes)
+            return np.where(np.isnan(elevations), 0.0, elevations), np.where(np.isnan(elevations), np.where(longitudes < 6.9, 1, -1), sources)
+
+    gpx = make_gpx()
+    gpx.tracks.append(gpxpy.gpx.GPXTrack())
+    gpx.tracks[0].segments[0].points = gpx.tracks[0].segments[0].points[:20]
+    for point in gpx.tracks[0].segments[0].points:
+        point.latitude -= 0.1
+    gpx.waypoints = [gpxpy.gpx.GPXWaypoint(latitude, longitude) for latitude, longitude in ((45.3, 6.8), (45.0, 6.8), (45.0, 7.0))]
+    elevation_data = FallbackElevationData()
+    samples = add_dem_elevations(gpx, elevation_data)
+    assert elevation_data.queries == 1
+    assert samples.track_sources == {gpx.tracks[0]: 1, gpx.tracks[1]: 0, gpx.tracks[2]: 0}
+    assert samples.waypoint_sources == [0, 1, 0]
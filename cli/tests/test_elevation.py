@@ -1,4 +1,5 @@
 import hashlib as mod_hashlib
+import json
 import os as mod_os
 
 import pytest
@@ -163,3 +164,168 @@ def test_get_tilename():
     assert "N00E001" == GeoElevationData.get_tilename(0, 1.5)
     assert "N01E000" == GeoElevationData.get_tilename(1.5, 0)
     assert "N00E000" == GeoElevationData.get_tilename(0, 0)
+
+
+def test_max_tiles():
+    """The least recently used tile is evicted."""
+    with GeoElevationData("JdF1", max_tiles=2) as tile_map:
+        tile_map.get_elevation(60.0669437, 7.19087290)  # N60E007
+        tile_map.get_elevation(70.3302999, 29.6062986)  # N70E029
+        tile_map.get_elevation(60.0669437, 7.19087290)
+        tile_map.get_elevation(68.4498145, 15.6736844)  # N68E015
+        assert list(tile_map.tiles) == ["N60E007_JdF1", "N68E015_JdF1"]
+        assert tile_map.stats["tile_loads"] == 3
+
+
+def test_prefetch(monkeypatch, tmp_path):
+    """Cached tiles are skipped, and the tiles failing to download are reported."""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    (tmp_path / ".cache" / "srtm").mkdir(parents=True)
+    (tmp_path / ".cache" / "srtm" / "N60E007_JdF1.hgt").write_bytes(b"\0" * 8)
+    with GeoElevationData("JdF1") as tile_map:
+        assert tile_map.prefetch(["N61E007", "N60E007", "N61E007"]) == ["N61E007"]
+        assert tile_map.stats["tile_downloads"] == 0
+        assert not tile_map.tiles
+
+
+def test_get_elevations(monkeypatch, tmp_path):
+    """Same as get_elevation() point by point, across tiles and with voids."""
+    import numpy as np
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    srtm_dir = tmp_path / ".cache" / "srtm"
+    srtm_dir.mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    for tilename in ("N45E006", "N45E007"):
+        heights = rng.integers(-600, 9100, size=(121, 121)).astype(">i2")
+        (srtm_dir / f"{tilename}_JdF1.hgt").write_bytes(heights.tobytes())
+    latitudes = rng.uniform(45.0, 46.0, 500)
+    longitudes = rng.uniform(6.0, 8.0, 500)
+    with GeoElevationData("JdF1") as tile_map:
+        elevations = tile_map.get_elevations(latitudes, longitudes)
+        expected = [tile_map.get_elevation(lat, lon) for lat, lon in zip(latitudes, longitudes)]
+        assert tile_map.stats["tile_loads"] == 2
+    np.testing.assert_array_equal(elevations, [np.nan if ele is None else ele for ele in expected])
+    assert np.isnan(elevations).any()
+
+
+def prefetch_in_process(tilename: str, base_url: str, auth_host: str, cache_dir: str) -> list[str]:
+    with GeoElevationData("SRTMGL1v3", "user", "password", base_url=base_url, auth_host=auth_host, cache_dir=cache_dir) as tile_map:
+        return tile_map.prefetch([tilename])
+
+
+def test_cache_dir(monkeypatch, tmp_path):
+    """The cache folder is created once, from the argument or the env var."""
+    from cli.src.synthetic_dem import write_tiles
+
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    monkeypatch.setenv("DEM_CACHE_DIR", str(tmp_path / "env"))
+    assert GeoElevationData("JdF3").cache_dir == str(tmp_path / "env")
+    assert (tmp_path / "env").is_dir()
+    write_tiles(str(tmp_path / "tiles"), ["N45E006"], "JdF3", surface="plane")
+    with GeoElevationData("JdF3", cache_dir=str(tmp_path / "tiles")) as tile_map:
+        assert tile_map.get_elevation(45.5, 6.5) == 550
+    monkeypatch.delenv("DEM_CACHE_DIR")
+    assert GeoElevationData("JdF3").cache_dir == str(tmp_path / "home" / ".cache" / "srtm")
+
+
+def test_shared_cache(tmp_path):
+    """Concurrent processes download a tile once, and no truncated or temporary file is left."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    from cli.src.synthetic_dem import FakeEarthDataServer
+    from cli.src.synthetic_dem import make_tile
+
+    with FakeEarthDataServer({"N45E006": make_tile("N45E006", 1)}, delay=0.5) as server:
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(prefetch_in_process, "N45E006", server.base_url, server.auth_host, str(tmp_path)) for _ in range(4)]
+            assert [future.result() for future in futures] == [[]] * 4
+        assert server.tile_requests == {"N45E006": 1}
+    assert sorted(path.name for path in tmp_path.iterdir() if not path.name.endswith(".lock")) == ["N45E006_SRTMGL1v3.hgt"]
+    assert (tmp_path / "N45E006_SRTMGL1v3.hgt").stat().st_size == 3601 * 3601 * 2
+
+
+def test_missing_tile(tmp_path, capsys):
+    """A tile not found is requested once and saved in the registry with a warning, its locations being at sea level."""
+    import numpy as np
+
+    from cli.src.synthetic_dem import FakeEarthDataServer
+    from cli.src.synthetic_dem import make_tile
+
+    with FakeEarthDataServer({"N45E006": make_tile("N45E006", 1, "plane")}) as server:
+        options = {"base_url": server.base_url, "auth_host": server.auth_host, "cache_dir": str(tmp_path)}
+        with GeoElevationData("SRTMGL1v3", "user", "password", **options) as tile_map:
+            assert tile_map.get_elevation(45.5, 5.5) == 0.0
+            assert tile_map.get_elevation(45.5, 5.5) == 0.0
+            assert tile_map.prefetch(["N45E005", "N46E006"]) == []
+            elevations = tile_map.get_elevations(np.array([45.5, 45.5, 46.5]), np.array([5.5, 6.5, 6.5]))
+            np.testing.assert_array_equal(elevations, [0.0, 550.0, 0.0])
+            assert tile_map.missing_tiles == {"N45E005", "N46E006"}
+            assert tile_map.stats["tile_downloads"] == 1
+        assert server.tile_requests == {"N45E005": 1, "N46E006": 1, "N45E006": 1}
+        warnings = capsys.readouterr().err.splitlines()
+        assert len(warnings) == 2
+        assert all("not found, its locations are at sea level for 30 days" in warning for warning in warnings)
+        assert sorted(json.loads((tmp_path / "missing_tiles_SRTMGL1v3.json").read_text())[server.base_url]) == ["N45E005", "N46E006"]
+
+        # next run
+        with GeoElevationData("SRTMGL1v3", "user", "password", absent_tiles="void", **options) as tile_map:
+            assert tile_map.get_elevation(45.5, 5.5) is None
+            elevations = tile_map.get_elevations(np.array([45.5, 45.5]), np.array([5.5, 6.5]))
+            np.testing.assert_array_equal(elevations, [np.nan, 550.0])
+            assert tile_map.stats["tile_downloads"] == 0
+        assert server.tile_requests == {"N45E005": 1, "N46E006": 1, "N45E006": 1}
+        assert server.logins == 1
+
+    with pytest.raises(ValueError, match="Unknown absent tiles"):
+        GeoElevationData("JdF1", absent_tiles="nan", cache_dir=str(tmp_path))
+
+
+def test_missing_tiles_registry(tmp_path, monkeypatch):
+    """The tiles not found are requested again from another server, or once expired."""
+    from cli.src.synthetic_dem import FakeEarthDataServer
+
+    registry_path = tmp_path / "missing_tiles_SRTMGL1v3.json"
+    registry_path.write_text(json.dumps(["N45E005"]))  # written by a previous version
+    with FakeEarthDataServer({}) as server:
+        options = {"base_url": server.base_url, "auth_host": server.auth_host, "cache_dir": str(tmp_path)}
+        with GeoElevationData("SRTMGL1v3", "user", "password", **options) as tile_map:
+            assert tile_map.missing_tiles == set()
+            assert tile_map.prefetch(["N45E005", "N46E006"]) == []
+        registry = json.loads(registry_path.read_text())
+        registry["https://other.example.com"] = {"N47E006": registry[server.base_url]["N46E006"]}
+        registry[server.base_url]["N46E006"] -= 2 * 86400
+        registry_path.write_text(json.dumps(registry))
+        with GeoElevationData("SRTMGL1v3", "user", "password", missing_tiles_ttl=1, **options) as tile_map:
+            assert tile_map.missing_tiles == {"N45E005"}
+            assert tile_map.prefetch(["N45E005", "N46E006", "N47E006"]) == []
+        assert server.tile_requests == {"N45E005": 1, "N46E006": 2, "N47E006": 1}
+        assert sorted(json.loads(registry_path.read_text())[server.base_url]) == ["N45E005", "N46E006", "N47E006"]
+        assert sorted(json.loads(registry_path.read_text())["https://other.example.com"]) == ["N47E006"]
+
+        monkeypatch.setenv("DEM_MISSING_TILES_TTL", "0")
+        with GeoElevationData("SRTMGL1v3", "user", "password", **options) as tile_map:
+            assert tile_map.missing_tiles == set()
+
+
+def test_fallback_versions(tmp_path):
+    """The voids and the tiles not available are filled by the next dataset, which is queried only if needed."""
+    import numpy as np
+
+    from cli.src.synthetic_dem import cell_elevation
+    from cli.src.synthetic_dem import write_tiles
+
+    write_tiles(str(tmp_path), ["N45E006"], "JdF1", resolution=1, surface="plane", void_edges=True)
+    write_tiles(str(tmp_path), ["N45E006", "N46E006"], "JdF3", resolution=3, surface="waves")
+    with GeoElevationData("JdF1", cache_dir=str(tmp_path), fallback_versions=["JdF3"]) as tile_map:
+        assert tile_map.versions == ["JdF1", "JdF3"]
+        assert tile_map.get_elevation(45.5, 6.5) == cell_elevation("plane", 45.5, 6.5, 1)
+        assert tile_map.stats["tile_loads"] == 1
+        assert tile_map.get_elevation(45.99999, 6.5) == cell_elevation("waves", 45.99999, 6.5, 3)  # void edge
+        assert tile_map.get_elevation(46.5, 6.5) == cell_elevation("waves", 46.5, 6.5, 3)
+        elevations, sources = tile_map.get_elevations_and_sources(np.array([45.5, 45.99999, 46.5]), np.array([6.5, 6.5, 6.5]))
+        np.testing.assert_array_equal(sources, [0, 1, 1])
+        assert elevations.tolist() == [tile_map.get_elevation(45.5, 6.5), tile_map.get_elevation(45.99999, 6.5), tile_map.get_elevation(46.5, 6.5)]
+        assert tile_map.stats == {"tile_loads": 3, "tile_downloads": 0}
+        with pytest.raises(NotImplementedError):
+            tile_map.get_elevation(47.5, 6.5)
@@ -3,13 +3,28 @@ import os
 from filecmp import cmp
 
 import pytest
+from click.testing import CliRunner
 
 from cli.src.embellish_gpx import add_dem_to_filename
+from cli.src.embellish_gpx import embellish_file
+from cli.src.embellish_gpx import embellish_gpx
+from cli.src.embellish_gpx import embellish_gpx_files
 from cli.src.embellish_gpx import embellish_gpx_with_elevation
 from cli.src.embellish_gpx import embellish_gpx_without_elevation
+from cli.src.embellish_gpx import embellishment_fingerprint
+from cli.src.embellish_gpx import find_gpx_files
+from cli.src.embellish_gpx import gpx_tilenames
+from cli.src.embellish_gpx import plan_embellished_paths
+from cli.src.embellish_gpx import process_elevation_data
 
 FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
 FAKE_TIME = datetime.datetime(2024, 4, 20, 0, 0, 0, 0)
+GPX_CONTENT = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx xmlns="http://www.topografix.com/GPX/1/1" version="1.1" creator="test">
+  <wpt lat="-41.5" lon="172.5"><name>Hut</name></wpt>
+  <trk><trkseg><trkpt lat="-41.4" lon="172.6"/><trkpt lat="-40.6" lon="173.1"/></trkseg></trk>
+</gpx>
+"""
 
 
 @pytest.fixture
@@ -47,3 +62,105 @@ def test_embellish_gpx_with_elevation(patch_datetime_today):
     embellish_gpx_with_elevation(gpx_file_in, gpx_file_out, "JdF1")
     assert cmp(gpx_file_out, gpx_file_expected_out)
     os.remove(gpx_file_out)
+
+
+def test_find_gpx_files(tmp_path):
+    for name in ("a/a.gpx", "a/a.JdF1.gpx", "a/a.none.gpx", "b/b.GPX", "c.gpx", "c.webtrack"):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text(GPX_CONTENT)
+    assert find_gpx_files(str(tmp_path)) == [str(tmp_path / "c.gpx")]
+    assert find_gpx_files(str(tmp_path), recursive=True) == [str(tmp_path / name) for name in ("a/a.gpx", "b/b.GPX", "c.gpx")]
+    assert find_gpx_files("c.gpx") == ["c.gpx"]
+
+
+def test_plan_embellished_paths():
+    assert plan_embellished_paths(["s/a/a.gpx", "s/b/b.gpx"], "JdF1", "out") == {"s/a/a.gpx": "out/a.JdF1.gpx", "s/b/b.gpx": "out/b.JdF1.gpx"}
+    assert plan_embellished_paths(["s/a/a.gpx", "s/a/b.gpx"], "JdF1") == {"s/a/a.gpx": "s/a/a.JdF1.gpx", "s/a/b.gpx": "s/a/b.JdF1.gpx"}
+    with pytest.raises(ValueError, match="would be exported"):
+        plan_embellished_paths(["s/a/a.gpx", "s/a/b.gpx"], "JdF1", "out")
+
+
+def test_embellish_gpx_same_output(tmp_path):
+    """Two GPX files exported to the same path are reported without traceback."""
+    (tmp_path / "a").mkdir()
+    for name in ("one", "two"):
+        (tmp_path / "a" / f"{name}.gpx").write_text(GPX_CONTENT)
+    result = CliRunner().invoke(embellish_gpx, ["--gpx", str(tmp_path / "a"), "-o", str(tmp_path / "out")])
+    assert result.exception is None
+    assert "would be exported" in result.output
+
+
+def test_gpx_tilenames(tmp_path):
+    gpx_path = tmp_path / "a.gpx"
+    gpx_path.write_text(GPX_CONTENT)
+    assert gpx_tilenames(str(gpx_path)) == {"S42E172", "S41E173"}
+
+
+def test_embellishment_fingerprint(tmp_path):
+    gpx_path = str(tmp_path / "a.gpx")
+    (tmp_path / "a.gpx").write_text(GPX_CONTENT)
+    fingerprint = embellishment_fingerprint(gpx_path, "JdF1", "sea_level")
+    assert fingerprint == embellishment_fingerprint(gpx_path, "JdF1", "sea_level")
+    assert fingerprint != embellishment_fingerprint(gpx_path, "JdF3", "sea_level")
+    assert fingerprint != embellishment_fingerprint(gpx_path, "JdF1", "void")
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_embellish_gpx_files_unchanged(tmp_path, jobs):
+    """Files are embellished again only if changed."""
+    state_path = str(tmp_path / "state.json")
+    gpx_paths = []
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        gpx_paths.append(str(tmp_path / name / f"{name}.gpx"))
+        (tmp_path / name / f"{name}.gpx").write_text(GPX_CONTENT)
+    embellished_paths = plan_embellished_paths(gpx_paths, "none", str(tmp_path))
+    assert sorted(embellish_gpx_files(embellished_paths, "none", jobs=jobs, state_path=state_path)) == gpx_paths
+    assert os.path.exists(tmp_path / "a.none.gpx") and os.path.exists(tmp_path / "b.none.gpx")
+    assert embellish_gpx_files(embellished_paths, "none", jobs=jobs, state_path=state_path) == []
+    (tmp_path / "b" / "b.gpx").write_text(GPX_CONTENT.replace("Hut", "Shelter"))
+    assert embellish_gpx_files(embellished_paths, "none", jobs=jobs, state_path=state_path) == [gpx_paths[1]]
+    os.remove(tmp_path / "a.none.gpx")
+    assert embellish_gpx_files(embellished_paths, "none", jobs=jobs, state_path=state_path) == [gpx_paths[0]]
+    assert sorted(embellish_gpx_files(embellished_paths, "none", jobs=jobs, force=True, state_path=state_path)) == gpx_paths
+
+
+def test_embellish_file_in_worker(tmp_path, monkeypatch):
+    """The elevation service of a worker keeps the loaded tiles between two files, but not its HTTP session."""
+    from cli.src.synthetic_dem import FakeEarthDataServer
+    from cli.src.synthetic_dem import make_tile
+
+    monkeypatch.setattr("cli.src.embellish_gpx.NASA_USERNAME", "user")
+    monkeypatch.setattr("cli.src.embellish_gpx.NASA_PASSWORD", "password")
+    cache_dir = str(tmp_path / "cache")
+    (tmp_path / "a.gpx").write_text(GPX_CONTENT.replace("-41.", "45.").replace("-40.", "45.").replace("172.", "6.").replace("173.", "6."))
+    with FakeEarthDataServer({"N45E006": make_tile("N45E006", 1, "plane")}) as server:
+        monkeypatch.setenv("DEM_BASE_URL", server.base_url)
+        monkeypatch.setenv("EARTHDATA_AUTH_HOST", server.auth_host)
+        for _ in range(2):
+            embellish_file(str(tmp_path / "a.gpx"), str(tmp_path / "a.srtmgl1v3.gpx"), "SRTMGL1v3", cache_dir=cache_dir)
+            elevation_data = process_elevation_data("SRTMGL1v3", cache_dir, None)
+            assert elevation_data.session is None
+            assert list(elevation_data.tiles) == ["N45E006_SRTMGL1v3"]
+        assert server.tile_requests == {"N45E006": 1}
+    process_elevation_data.cache_clear()
+
+
+def test_embellish_gpx_with_elevation_closed(tmp_path, monkeypatch):
+    """The elevation service created for one file is closed."""
+    from cli.src.elevation import GeoElevationData
+    from cli.src.synthetic_dem import write_tiles
+
+    closed = []
+
+    class ClosedElevationData(GeoElevationData):
+        def close(self):
+            closed.append(self.version)
+            super().close()
+
+    write_tiles(str(tmp_path), ["N45E006"], "JdF1", resolution=1, surface="plane")
+    monkeypatch.setattr("cli.src.embellish_gpx.new_elevation_data", lambda dem_dataset: ClosedElevationData(dem_dataset, cache_dir=str(tmp_path)))
+    (tmp_path / "a.gpx").write_text(GPX_CONTENT.replace("-41.", "45.").replace("-40.", "45.").replace("172.", "6.").replace("173.", "6."))
+    embellish_gpx_with_elevation(str(tmp_path / "a.gpx"), str(tmp_path / "a.JdF1.gpx"), "JdF1")
+    assert closed == ["JdF1"]
+    assert os.path.exists(tmp_path / "a.JdF1.gpx")
@@ -0,0 +1,44 @@
+import json
+import os
+
+from cli.src.exif_tables import LENS_SOURCES
+from cli.src.exif_tables import PATH_TO_COMPUTATIONAL_MODES
+from cli.src.exif_tables import computational_mode
+from cli.src.exif_tables import load_tables
+
+
+def test_load_tables():
+    tables = load_tables(cache_path=None)
+    assert tables.lens_ids["NIKON CORPORATION"]["00 00 00 00 00 00 00 01"] == "Manual Lens No CPU"
+    for maker, path in LENS_SOURCES.items():
+        with open(path, "r", encoding="utf-8") as lens_file:
+            assert tables.lens_ids[maker] == json.load(lens_file)
+    # reverse index
+    for lens_name, lens_ids in tables.lens_names.items():
+        assert all(lens_name in (tables.lens_ids[maker].get(lens_id) for maker in LENS_SOURCES) for lens_id in lens_ids)
+    assert sum(map(len, tables.lens_names.values())) == sum(map(len, tables.lens_ids.values()))
+
+
+def test_computational_mode():
+    tables = load_tables(cache_path=None)
+    with open(PATH_TO_COMPUTATIONAL_MODES, "r", encoding="utf-8") as computational_modes_file:
+        nested_modes = json.load(computational_modes_file)
+    assert computational_mode(tables, "1 0") == nested_modes["1"]
+    assert computational_mode(tables, "3 2") == nested_modes["3"]["2"]
+    assert computational_mode(tables, "3 7") is None
+    assert computational_mode(tables, "0 0") is None
+
+
+def test_cache(tmp_path):
+    lens_path = tmp_path / "lenses.json"
+    modes_path = tmp_path / "modes.json"
+    cache_path = str(tmp_path / "cache" / "tables.pickle")
+    lens_path.write_text(json.dumps({"1": "Lens A", "2": "Lens A"}), encoding="utf-8")
+    modes_path.write_text(json.dumps({"1": "mode"}), encoding="utf-8")
+    tables = load_tables({"Maker": str(lens_path)}, str(modes_path), cache_path)
+    assert tables.lens_names == {"Lens A": ("1", "2")}
+    assert os.path.exists(cache_path)
+    assert load_tables({"Maker": str(lens_path)}, str(modes_path), cache_path) == tables
+    # the cache is regenerated when a table changes
+    lens_path.write_text(json.dumps({"1": "Lens A", "2": "Lens B"}), encoding="utf-8")
+    assert load_tables({"Maker": str(lens_path)}, str(modes_path), cache_path).lens_names == {"Lens A": ("1",), "Lens B": ("2",)}
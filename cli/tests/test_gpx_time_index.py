@@ -0,0 +1,72 @@
+import datetime
+import os
+
+import pytest
+
+from cli.src.gpx_time_index import GpxTimeIndex
+
+GPX = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+<wpt lat="60.5" lon="25.5"><time>2024-06-01T12:30:00Z</time></wpt>
+<wpt lat="61.0" lon="26.0"></wpt>
+<trk><trkseg>
+<trkpt lat="60.2" lon="25.2"><time>2024-06-01T12:20:00Z</time></trkpt>
+<trkpt lat="60.0" lon="25.0"><time>2024-06-01T12:00:00Z</time></trkpt>
+<trkpt lat="60.1" lon="25.1"><time>2024-06-01T12:10:00Z</time></trkpt>
+<trkpt lat="60.9" lon="25.9"></trkpt>
+</trkseg></trk>
+</gpx>
+"""
+
+
+def utc(hour: int, minute: int, second: int = 0) -> datetime.datetime:
+    return datetime.datetime(2024, 6, 1, hour, minute, second, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture
+def gpx_path(tmp_path):
+    path = tmp_path / "track.gpx"
+    path.write_text(GPX, encoding="utf-8")
+    return path
+
+
+def test_position_at(gpx_path):
+    time_index = GpxTimeIndex.from_gpx(gpx_path)
+    assert len(time_index.times) == 4
+    assert time_index.position_at(utc(12, 4)) == (240.0, (25.0, 60.0))
+    assert time_index.position_at(utc(12, 6)) == (240.0, (25.1, 60.1))
+    assert time_index.position_at(utc(12, 5)) == (300.0, (25.0, 60.0))  # tie, the earliest point
+    assert time_index.position_at(utc(11, 0)) == (3600.0, (25.0, 60.0))
+    assert time_index.position_at(utc(13, 0)) == (1800.0, (25.5, 60.5))
+    # another time zone
+    assert time_index.position_at(utc(12, 30).astimezone(datetime.timezone(datetime.timedelta(hours=-2)))) == (0.0, (25.5, 60.5))
+
+
+def test_interpolate(gpx_path):
+    time_index = GpxTimeIndex.from_gpx(gpx_path)
+    delta_s, (longitude, latitude) = time_index.position_at(utc(12, 25), interpolate=True)
+    assert delta_s == 300.0
+    assert longitude == pytest.approx(25.35)
+    assert latitude == pytest.approx(60.35)
+    # no interpolation outside the track
+    assert time_index.position_at(utc(13, 0), interpolate=True) == (1800.0, (25.5, 60.5))
+
+
+def test_missing_time(tmp_path):
+    path = tmp_path / "track.gpx"
+    path.write_text(GPX.replace("<time>", "<!--").replace("</time>", "-->"), encoding="utf-8")
+    with pytest.raises(ValueError, match="GPX file does not contain any date/time!"):
+        GpxTimeIndex.from_gpx(path)
+
+
+def test_cache(gpx_path, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    time_index = GpxTimeIndex.load(gpx_path, cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    cached_index = GpxTimeIndex.load(gpx_path, cache_dir)
+    assert cached_index.times.tolist() == time_index.times.tolist()
+    assert cached_index.position_at(utc(12, 4)) == time_index.position_at(utc(12, 4))
+    # another content, another cache entry
+    gpx_path.write_text(GPX.replace("25.5", "25.6"), encoding="utf-8")
+    assert GpxTimeIndex.load(gpx_path, cache_dir).position_at(utc(12, 30)) == (0.0, (25.6, 60.5))
+    assert len(os.listdir(cache_dir)) == 2
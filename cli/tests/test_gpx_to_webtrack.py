@@ -9,13 +9,20 @@ python -m cli.src.gpx_to_webtrack --gpx cli/tests/fixtures/Gillespie_Circuit_3se
 ```
 """
 
+import math
 import os
 from filecmp import cmp
 
+import gpxpy
+import numpy as np
+
+from cli.src.elevation import GeoElevationData
 from cli.src.gpx_to_webtrack import Analysis
 from cli.src.gpx_to_webtrack import AnalysisWithElevation
 from cli.src.gpx_to_webtrack import AnalysisWithoutElevation
+from cli.src.gpx_to_webtrack import gpx_to_webtrack
 from cli.src.webtrack import Activity
+from cli.src.webtrack import WebTrack
 
 WEBTRACK_OUT = "Gillespie_Circuit_without_elevation.webtrack"
 FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
@@ -124,3 +131,94 @@ def test_waypoints_snapped_to_track():
     analysis.analyse_and_save()
     assert cmp(generated_webtrack_file, expected_webtrack_file)
     os.remove(generated_webtrack_file)
+
+
+def test_waypoint_anchor_on_ordered_tracks(tmp_path):
+    """The waypoint anchors are computed once the tracks are ordered, on the first track passing by."""
+    gpx = gpxpy.gpx.GPX()
+    for name in ("2. Back", "1. Out"):
+        track = gpxpy.gpx.GPXTrack(name=name)
+        points = [gpxpy.gpx.GPXTrackPoint(-41.0, 172.0 + i * 1e-4) for i in range(200)]
+        track.segments.append(gpxpy.gpx.GPXTrackSegment(points))
+        gpx.tracks.append(track)
+    gpx.waypoints.append(gpxpy.gpx.GPXWaypoint(-41.0, 172.01, name="Hut"))
+    gpx_path = tmp_path / "story.gpx"
+    gpx_path.write_text(gpx.to_xml(), encoding="utf-8")
+    analysis = AnalysisWithoutElevation(str(gpx_path), str(tmp_path / "story.webtrack"), True, keep_waypoint_points=True)
+    with open(gpx_path, "r", encoding="utf-8") as input_gpx_file:
+        analysis.parse_gpx(input_gpx_file)
+    assert [track.name for track in analysis.gpx.tracks] == ["1. Out", "2. Back"]
+    assert [len(track.segments[0].points) for track in analysis.gpx.tracks] == [3, 2]
+    assert analysis.gpx.tracks[0].segments[0].points[1].longitude == 172.01
+
+
+class FakeElevationData(GeoElevationData):
+    """Synthetic terrain, counting the DEM queries."""
+
+    def __init__(self):
+        super().__init__("JdF1")
+        self.point_queries = 0
+        self.batch_queries = 0
+
+    def get_elevation(self, latitude, longitude):
+        self.point_queries += 1
+        return 1000 + 500 * math.sin(latitude * 300)
+
+    def get_elevations_and_sources(self, latitudes, longitudes):
+        self.batch_queries += 1
+        return 1000 + 500 * np.sin(latitudes * 300), np.zeros(len(latitudes), dtype=np.intp)
+
+
+def test_gpx_to_webtrack_embellish(tmp_path):
+    """The embellished GPX file and the WebTrack file are generated from one parsing and one DEM query."""
+    gpx = gpxpy.gpx.GPX()
+    for idx in (2, 1):
+        track = gpxpy.gpx.GPXTrack(name=f"{idx}. Track")
+        points = [gpxpy.gpx.GPXTrackPoint(-41.0 + idx * 0.1 + i * 1e-4, 172.0 + i * 1e-4, elevation=5.0) for i in range(200)]
+        track.segments.append(gpxpy.gpx.GPXTrackSegment(points))
+        gpx.tracks.append(track)
+    gpx.waypoints.append(gpxpy.gpx.GPXWaypoint(-40.9, 172.0, name="Hut"))
+    gpx_path = tmp_path / "story.gpx"
+    gpx_path.write_text(gpx.to_xml(), encoding="utf-8")
+    elevation_data = FakeElevationData()
+    gpx_to_webtrack(str(gpx_path), True, "JdF1", False, True, elevation_data=elevation_data, embellish=True)
+    assert (elevation_data.point_queries, elevation_data.batch_queries) == (0, 1)
+    assert (tmp_path / "story.webtrack").exists()
+    with open(tmp_path / "story.JdF1.gpx", "r", encoding="utf-8") as embellished_file:
+        embellished = gpxpy.parse(embellished_file)
+    assert [track.name for track in embellished.tracks] == ["2. Track", "1. Track"]  # neither re-ordered nor simplified
+    assert all(len(track.segments[0].points) == 200 for track in embellished.tracks)
+    assert all(point.elevation != 5.0 for point in embellished.walk(only_points=True))
+    assert embellished.waypoints[0].elevation is None
+    webtrack = WebTrack().from_file(str(tmp_path / "story.webtrack"))
+    assert webtrack["waypoints"][0][3] == round(elevation_data.get_elevation(-40.9, 172.0))
+
+
+def test_gpx_to_webtrack_fallback_dem(tmp_path, monkeypatch):
+    """The DEM source of each segment and waypoint is the one providing most of the elevations, known from the sampling query."""
+    from cli.src.synthetic_dem import write_tiles
+
+    write_tiles(str(tmp_path), ["N45E006"], "JdF1", resolution=1, surface="waves")
+    write_tiles(str(tmp_path), ["N45E006", "N46E006"], "JdF3", resolution=3, surface="waves")
+    gpx = gpxpy.gpx.GPX()
+    for idx, latitude in enumerate((45.5, 46.5), start=1):
+        track = gpxpy.gpx.GPXTrack(name=f"{idx}. Track")
+        points = [gpxpy.gpx.GPXTrackPoint(latitude + i * 1e-3, 6.2 + i * 1e-3) for i in range(100)]
+        track.segments.append(gpxpy.gpx.GPXTrackSegment(points))
+        gpx.tracks.append(track)
+    gpx.waypoints.append(gpxpy.gpx.GPXWaypoint(45.55, 6.25, name="Hut"))
+    gpx.waypoints.append(gpxpy.gpx.GPXWaypoint(46.55, 6.25, name="Lake"))
+    gpx_path = tmp_path / "story.gpx"
+    gpx_path.write_text(gpx.to_xml(), encoding="utf-8")
+    queries = []
+    get_elevations_and_sources = GeoElevationData.get_elevations_and_sources
+    monkeypatch.setattr(
+        GeoElevationData, "get_elevations_and_sources", lambda self, *args: queries.append(self.version) or get_elevations_and_sources(self, *args)
+    )
+    with GeoElevationData("JdF1", cache_dir=str(tmp_path), fallback_versions=["JdF3"]) as elevation_data:
+        gpx_to_webtrack(str(gpx_path), False, "JdF1", False, True, elevation_data=elevation_data)
+    assert queries == ["JdF1"]
+    webtrack = WebTrack().from_file(str(tmp_path / "story.webtrack"))
+    assert [segment["withEle"] for segment in webtrack["segments"]] == ["J", "K"]
+    assert [waypoint[2] for waypoint in webtrack["waypoints"]] == ["J", "K"]
+    assert all(point[3] is not None for segment in webtrack["segments"] for point in segment["points"])
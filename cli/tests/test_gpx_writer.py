@@ -0,0 +1,64 @@
+import io
+
+import gpxpy
+
+from cli.src.gpx_writer import write_gpx
+
+GPX_CONTENT = """<?xml version="1.0" encoding="UTF-8"?>
+<gpx xmlns="http://www.topografix.com/GPX/1/1" xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v1" version="1.1" creator="test">
+  <metadata>
+    <name>Test &amp; trip</name>
+    <author><name>Jane</name><email id="jane" domain="example.com"/><link href="https://example.com"><text>Site</text></link></author>
+    <copyright author="Jane"><year>2024</year><license>CC-BY</license></copyright>
+    <time>2024-04-20T10:00:00Z</time>
+    <keywords>hike</keywords>
+    <bounds minlat="1.0" minlon="2.0" maxlat="3.0" maxlon="4.0"/>
+  </metadata>
+  <wpt lat="1.5" lon="2.5"><ele>12.5</ele><name>Hut</name><sym>Lodge</sym></wpt>
+  <wpt lat="1.6" lon="2.6"><time>2024-04-20T10:05:00Z</time></wpt>
+  <rte><name>Route</name><rtept lat="1.1" lon="2.1"/><rtept lat="1.2" lon="2.2"><ele>3</ele></rtept></rte>
+  <trk>
+    <name>Track</name>
+    <link href="https://example.com/track"/>
+    <trkseg>
+      <trkpt lat="1.0" lon="2.0"><ele>100.0</ele><time>2024-04-20T10:00:00Z</time>
+        <extensions><gpxtpx:TrackPointExtension><gpxtpx:hr>120</gpxtpx:hr></gpxtpx:TrackPointExtension></extensions>
+      </trkpt>
+      <trkpt lat="1.0001" lon="2.0001"><ele>101.5</ele><time>2024-04-20T10:00:10Z</time></trkpt>
+    </trkseg>
+    <trkseg/>
+  </trk>
+  <trk><trkseg><trkpt lat="3" lon="4"/></trkseg></trk>
+  <extensions><gpxtpx:note>end</gpxtpx:note></extensions>
+</gpx>
+"""
+
+
+def test_write_gpx_same_as_to_xml():
+    expected = gpxpy.parse(GPX_CONTENT).to_xml(version="1.1") + "\n"
+    stream = io.StringIO()
+    write_gpx(gpxpy.parse(GPX_CONTENT), stream)
+    assert stream.getvalue() == expected
+
+
+def test_write_gpx_empty():
+    stream = io.StringIO()
+    write_gpx(gpxpy.gpx.GPX(), stream)
+    assert stream.getvalue() == gpxpy.gpx.GPX().to_xml(version="1.1") + "\n"
+
+
+def test_write_gpx_partial_metadata():
+    """The metadata containers are written only if they have data, as gpxpy does."""
+    for fields in (
+        {"name": "Trip"},
+        {"author_name": "Jane"},
+        {"author_link": "https://example.com"},
+        {"copyright_year": "2024"},
+        {"link": "https://example.com"},
+    ):
+        gpx = gpxpy.gpx.GPX()
+        for name, value in fields.items():
+            setattr(gpx, name, value)
+        stream = io.StringIO()
+        write_gpx(gpx, stream)
+        assert stream.getvalue() == gpx.to_xml(version="1.1") + "\n"
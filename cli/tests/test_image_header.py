@@ -0,0 +1,33 @@
+import pytest
+from PIL import Image
+
+from cli.src.image_header import probe_image
+
+
+@pytest.mark.parametrize("image_format", ["TIFF", "PNG", "JPEG", "WEBP"])
+def test_probe_image(tmp_path, image_format):
+    path = tmp_path / f"image.{image_format.lower()}"
+    Image.new("RGB", (321, 123)).save(path, image_format)
+    assert probe_image(path) == (321, 123)
+
+
+@pytest.mark.parametrize("image_format", ["TIFF", "JPEG"])
+def test_probe_with_exif(tmp_path, image_format):
+    path = tmp_path / f"image.{image_format.lower()}"
+    exif = Image.Exif()
+    exif[274] = 6
+    Image.new("RGB", (321, 123)).save(path, image_format, exif=exif.tobytes())
+    assert probe_image(path) == (321, 123)
+
+
+def test_probe_16_bits_tiff(tmp_path):
+    path = tmp_path / "image.tif"
+    Image.new("I;16", (700, 500)).save(path, compression="tiff_lzw")
+    assert probe_image(path) == (700, 500)
+
+
+def test_probe_not_an_image(tmp_path):
+    path = tmp_path / "image.tif"
+    path.write_bytes(b"II*\x00\xff\xff\xff\xff")
+    with pytest.raises(OSError):
+        probe_image(path)
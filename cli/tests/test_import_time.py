@@ -0,0 +1,51 @@
+"""
+Guard against regressions of the CLI start time: heavy modules shall only be
+imported by the code paths that need them.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+HEAVY_MODULES = {"exiftool", "numpy", "osgeo", "PIL", "requests"}
+
+
+def imported_modules(module: str) -> dict[str, int]:
+    """
+    Import the module in a fresh interpreter.
+    Returns:
+        The cumulative import time in microseconds of each imported module.
+    """
+    completed_process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    modules = {}
+    for line in completed_process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "cli.src.gpx_to_webtrack",
+        "cli.src.embellish_gpx",
+        "cli.src.photos_manager",
+        "cli.src.elevation",
+    ],
+)
+def test_no_heavy_import(module):
+    modules = imported_modules(module)
+    assert module in modules
+    top_level_modules = {name.split(".")[0] for name in modules}
+    assert not HEAVY_MODULES & top_level_modules
@@ -1,3 +1,4 @@
+import json
 import os
 import shutil
 from datetime import datetime
@@ -6,23 +7,34 @@ from unittest.mock import patch
 import pytest
 from PIL import Image
 
+from cli.src.photos_manager import ALL_VAR_OPTIONS
+from cli.src.photos_manager import DECODING_JOBS
 from cli.src.photos_manager import add_photo_to_album
+from cli.src.photos_manager import add_photos_to_album
 from cli.src.photos_manager import body_lens_model_exif
+from cli.src.photos_manager import collect_photo_variants
 from cli.src.photos_manager import computational_mode_exif
 from cli.src.photos_manager import convert_to_webp
 from cli.src.photos_manager import date_taken_exif
 from cli.src.photos_manager import decode_webp_output
+from cli.src.photos_manager import exiftool_session
+from cli.src.photos_manager import expand_tif_paths
 from cli.src.photos_manager import exposure_time_s_exif
 from cli.src.photos_manager import f_number_exif
 from cli.src.photos_manager import find_prev_next
 from cli.src.photos_manager import focal_length_35mm_exif
 from cli.src.photos_manager import generate_webp
+from cli.src.photos_manager import get_all_exif_data
 from cli.src.photos_manager import get_exif_data
+from cli.src.photos_manager import get_exiftool
 from cli.src.photos_manager import get_image_size
 from cli.src.photos_manager import guess_position_from_gpx
 from cli.src.photos_manager import import_exif_to_tif
 from cli.src.photos_manager import iso_exif
 from cli.src.photos_manager import map_link
+from cli.src.photos_manager import resize_variants
+from cli.src.photos_manager import submit_photo_variants
+from cli.src.photos_manager import variant_geometry
 
 FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
 SAMPLE_NIKON_TIF = os.path.join(FIXTURES, "sample_nikon.tif")
@@ -63,6 +75,17 @@ def test_exif_data_omsystem():
     assert computational_mode_exif(exif_data) is None
 
 
+def test_exiftool_session():
+    """One exiftool process reads all files and is terminated at the end of the session."""
+    with exiftool_session():
+        exiftool_helper = get_exiftool()
+        assert get_all_exif_data(FILES) == [get_exif_data(filename) for filename in FILES]
+        assert get_exiftool() is exiftool_helper
+        assert exiftool_helper.running
+    assert not exiftool_helper.running
+    assert get_exiftool() is not exiftool_helper
+
+
 def test_corrupted_exif():
     exif_data = get_exif_data(SAMPLE_CORRUPTED_EXIF_TIF)
     with pytest.raises(ValueError, match="Missing or unknown lens info!"):
@@ -145,6 +168,67 @@ def test_generate_webp(tmp_path):
         assert get_image_size(tmp_path / str(photo_id + 1) / "f.webp") == (300, 200)
 
 
+def test_generate_webp_changed_preset(tmp_path):
+    """Only the variants with a changed preset or a changed original are generated again."""
+    (tmp_path / "1").mkdir()
+    Image.new("RGB", (600, 400)).save(tmp_path / "1" / "photo.tif")
+    expected_webp = ("f", "t", "s.p", "s.l", "m", "l", "l.hd")
+    assert generate_webp(tmp_path) == [("1", name) for name in expected_webp]
+    os.utime(tmp_path / "1" / "photo.tif")
+    assert generate_webp(tmp_path) == []
+    new_var_options = tuple(("m", None, 760, 80) if var_options[0] == "m" else var_options for var_options in ALL_VAR_OPTIONS)
+    with patch("cli.src.photos_manager.ALL_VAR_OPTIONS", new_var_options):
+        assert generate_webp(tmp_path) == [("1", "m")]
+
+
+def test_generate_webp_in_parallel(tmp_path):
+    """A photo without original is skipped and the other photos are processed in the album order."""
+    create_album(tmp_path)
+    (tmp_path / "3").mkdir()
+    expected_webp = ("f", "t", "s.p", "s.l", "m", "l", "l.hd")
+    photo_1 = list(map(lambda x: ("1", x), expected_webp))
+    photo_2 = list(map(lambda x: ("2", x), expected_webp))
+    assert generate_webp(tmp_path, jobs=4) == photo_1 + photo_2
+    assert generate_webp(tmp_path, jobs=4) == []
+
+
+def test_generate_webp_bounded_decoding(tmp_path):
+    """The originals are not decoded far ahead of the encoding."""
+    for photo_id in range(1, 7):
+        (tmp_path / str(photo_id)).mkdir()
+        Image.new("RGB", (600, 400)).save(tmp_path / str(photo_id) / "photo.tif")
+    counts = {"decoded": 0, "collected": 0, "ahead": 0}
+
+    def submit_photo_variants_counted(*args):
+        counts["decoded"] += 1
+        counts["ahead"] = max(counts["ahead"], counts["decoded"] - counts["collected"])
+        return submit_photo_variants(*args)
+
+    def collect_photo_variants_counted(*args):
+        generated_webp = collect_photo_variants(*args)
+        counts["collected"] += 1
+        return generated_webp
+
+    with (
+        patch("cli.src.photos_manager.submit_photo_variants", submit_photo_variants_counted),
+        patch("cli.src.photos_manager.collect_photo_variants", collect_photo_variants_counted),
+    ):
+        assert len(generate_webp(tmp_path)) == 6 * len(ALL_VAR_OPTIONS)
+    assert counts["ahead"] <= 1 + DECODING_JOBS
+
+
+def test_resize_variants():
+    """The variants have the same size as generated by cwebp from the original."""
+    original = Image.new("RGB", (4500, 3000))
+    assert variant_geometry(original.size, ("f", 300, 200, 90)) == ((0, 0, 4500, 3000), (300, 200))
+    assert variant_geometry(original.size, ("s.p", 375, None, 90)) == ((0, 0, 4500, 3000), (375, 250))
+    assert variant_geometry((2000, 3000), ("f", 300, 200, 90)) == ((0, 833, 2000, 1333), (300, 200))
+    assert variant_geometry((2000, 3000), ("t", None, 200, 90)) == ((0, 0, 2000, 3000), (133, 200))
+    images = resize_variants(original, [("f", 300, 200, 90), ("m", None, 760, 90), ("l", None, 1030, 86), ("l.hd", None, 1030, 98)])
+    assert {name: image.size for name, image in images.items()} == {"f": (300, 200), "m": (1140, 760), "l": (1545, 1030), "l.hd": (1545, 1030)}
+    assert images["l"] is images["l.hd"]
+
+
 def test_add_photo(tmp_path):
     with pytest.raises(ValueError, match="RAW file does not exist!"):
         add_photo_to_album(tmp_path, SAMPLE_NIKON_TIF + "f", None)
@@ -154,6 +238,34 @@ def test_add_photo(tmp_path):
     add_photo_to_album(tmp_path, SAMPLE_OMSYSTEM_TIF, None)
 
 
+def test_expand_tif_paths(tmp_path):
+    for filename in ("b.tif", "a.TIF", "a.jpg"):
+        (tmp_path / filename).write_bytes(b"")
+    assert expand_tif_paths(str(tmp_path)) == [str(tmp_path / "a.TIF"), str(tmp_path / "b.tif")]
+    assert expand_tif_paths(str(tmp_path / "a.*")) == [str(tmp_path / "a.TIF"), str(tmp_path / "a.jpg")]
+    assert expand_tif_paths(str(tmp_path / "c.tif")) == [str(tmp_path / "c.tif")]
+    with pytest.raises(ValueError, match="No TIF file found"):
+        expand_tif_paths(str(tmp_path / "c.*"))
+    (tmp_path / "empty").mkdir()
+    with pytest.raises(ValueError, match="No TIF file found"):
+        expand_tif_paths(str(tmp_path / "empty"))
+
+
+def test_add_photos(tmp_path):
+    """All photos are added and linked at once, and a photo already in the album is skipped."""
+    album_path = tmp_path / "album"
+    album_path.mkdir()
+    with pytest.raises(ValueError, match="RAW file does not exist"):
+        add_photos_to_album(album_path, [SAMPLE_NIKON_TIF + "f"], None)
+    photo_ids = add_photos_to_album(album_path, FILES, None, jobs=4)
+    assert len(photo_ids) == 2
+    with open(album_path / photo_ids[0] / "i.json", "r", encoding="utf-8") as json_file:
+        assert json.load(json_file)["next"] == int(photo_ids[1])
+    with open(album_path / photo_ids[1] / "i.json", "r", encoding="utf-8") as json_file:
+        assert json.load(json_file)["prev"] == int(photo_ids[0])
+    assert add_photos_to_album(album_path, FILES, None) == []
+
+
 def test_map_link():
     assert map_link((60.5, 40.2)) == "https://www.openstreetmap.org/?mlat=40.2&mlon=60.5#map=15/40.2/60.5&layers=P"
 
@@ -0,0 +1,39 @@
+import io
+import json
+
+from cli.src.profiling import Profiler
+
+
+def test_disabled_profiler():
+    profiler = Profiler()
+    with profiler.stage("parse"):
+        pass
+    profiler.count("dem_tile_loads")
+    assert profiler.to_dict()["stages"] == {}
+    assert profiler.to_dict()["counters"] == {}
+    stream = io.StringIO()
+    profiler.write_json_line(stream)
+    assert stream.getvalue() == ""
+
+
+def test_profiler():
+    profiler = Profiler(enabled=True, name="a.gpx")
+    with profiler.stage("parse"):
+        data = [0] * 100_000
+    del data
+    profiler.count("dem_tile_loads", 2)
+    report = profiler.to_dict()
+    assert report["name"] == "a.gpx"
+    assert report["stages"]["parse"]["wall_time_s"] > 0
+    assert report["stages"]["parse"]["peak_memory_bytes"] >= 800_000
+    assert report["counters"] == {"dem_tile_loads": 2}
+
+    batch_profiler = Profiler(enabled=True)
+    batch_profiler.merge(profiler)
+    batch_profiler.merge(profiler)
+    stream = io.StringIO()
+    batch_profiler.write_json_line(stream)
+    batch_report = json.loads(stream.getvalue())
+    assert batch_report["items"] == 2
+    assert batch_report["counters"] == {"dem_tile_loads": 4}
+    assert batch_report["stages"]["parse"]["peak_memory_bytes"] == report["stages"]["parse"]["peak_memory_bytes"]
@@ -0,0 +1,87 @@
+import gpxpy.gpx
+import numpy as np
+
+from cli.src.simplify import first_close_approach
+from cli.src.simplify import project
+from cli.src.simplify import rdp_mask
+from cli.src.simplify import simplify_gpx
+
+
+def make_gpx(coordinates: list[tuple[float, float]]) -> gpxpy.gpx.GPX:
+    gpx = gpxpy.gpx.GPX()
+    track = gpxpy.gpx.GPXTrack()
+    segment = gpxpy.gpx.GPXTrackSegment()
+    segment.points = [gpxpy.gpx.GPXTrackPoint(lat, lon) for lat, lon in coordinates]
+    track.segments.append(segment)
+    gpx.tracks.append(track)
+    return gpx
+
+
+def test_rdp_mask_straight_line():
+    xy = np.column_stack((np.arange(10.0), np.zeros(10)))
+    assert rdp_mask(xy, 1.0).tolist() == [True] + [False] * 8 + [True]
+
+
+def test_rdp_mask_zigzag():
+    xy = np.array([(0.0, 0.0), (1.0, 5.0), (2.0, 0.0), (3.0, 5.0), (4.0, 0.0)])
+    assert rdp_mask(xy, 1.0).all()
+    assert rdp_mask(xy, 10.0).tolist() == [True, False, False, False, True]
+
+
+def test_rdp_mask_keep():
+    xy = np.column_stack((np.arange(5.0), np.zeros(5)))
+    keep = np.array([False, False, True, False, False])
+    assert rdp_mask(xy, 1.0, keep).tolist() == [True, False, True, False, True]
+
+
+def test_rdp_mask_loop():
+    """The first and last points are the same location."""
+    xy = np.array([(0.0, 0.0), (10.0, 0.0), (10.0, 10.0), (0.0, 0.0)])
+    assert rdp_mask(xy, 1.0).all()
+
+
+def test_rdp_mask_large_segment():
+    """No recursion limit on a large noisy segment."""
+    total_points = 200_000
+    rng = np.random.default_rng(42)
+    xy = np.column_stack((np.arange(total_points, dtype=np.float64), rng.normal(0.0, 5.0, total_points)))
+    mask = rdp_mask(xy, 10.0)
+    assert mask[0] and mask[-1]
+    assert 2 < mask.sum() <= total_points
+
+
+def test_first_close_approach():
+    distances = np.array([2000.0, 400.0, 100.0, 300.0, 1500.0, 10.0])
+    # the second approach is closer but the first one is selected
+    assert first_close_approach(distances, 500.0, 1000.0) == 2
+    assert first_close_approach(distances, 5.0, 1000.0) is None
+
+
+def test_project():
+    xy = project(np.array([0.0, 0.0]), np.array([0.0, 1.0]))
+    assert abs(np.hypot(*(xy[1] - xy[0])) - gpxpy.geo.haversine_distance(0.0, 0.0, 0.0, 1.0)) < 1.0
+
+
+def test_simplify_gpx():
+    # 1 km long straight line with a 50 m bump in the middle
+    coordinates = [(45.0, 6.0 + i * 0.0001) for i in range(100)]
+    coordinates[50] = (45.0 + 0.00045, coordinates[50][1])
+    gpx = make_gpx(coordinates)
+    simplify_gpx(gpx, tolerance=10.0)
+    points = gpx.tracks[0].segments[0].points
+    assert [(point.latitude, point.longitude) for point in points] == [
+        coordinates[0],
+        coordinates[49],
+        coordinates[50],
+        coordinates[51],
+        coordinates[-1],
+    ]
+
+    gpx = make_gpx(coordinates)
+    simplify_gpx(gpx, tolerance=100.0, anchors=[(45.001, coordinates[20][1])])
+    points = gpx.tracks[0].segments[0].points
+    assert [(point.latitude, point.longitude) for point in points] == [
+        coordinates[0],
+        coordinates[20],
+        coordinates[-1],
+    ]
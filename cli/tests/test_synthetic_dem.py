@@ -0,0 +1,57 @@
+import pytest
+import requests
+
+from cli.src.elevation import GeoElevationData
+from cli.src.elevation import GeoElevationFile
+from cli.src.synthetic_dem import FakeEarthDataServer
+from cli.src.synthetic_dem import cell_elevation
+from cli.src.synthetic_dem import make_tile
+from cli.src.synthetic_dem import write_tiles
+
+
+@pytest.mark.parametrize("resolution", [1, 3])
+def test_make_tile(resolution):
+    tile = GeoElevationFile("S45E169_JdF1.hgt", make_tile("S45E169", resolution, "plane"))
+    assert tile.square_side == {1: 3601, 3: 1201}[resolution]
+    for latitude, longitude in ((-44.5, 169.5), (-44.0001, 169.0), (-44.99999, 169.99999), (-44.123, 169.456)):
+        assert tile.get_elevation(latitude, longitude) == cell_elevation("plane", latitude, longitude, resolution)
+    # the south-west corner is at sea level
+    assert tile.get_elevation(-44.99999, 169.0) == pytest.approx(0.0, abs=1)
+
+
+def test_make_tile_voids():
+    tile = GeoElevationFile("N45E006_JdF3.hgt", make_tile("N45E006", void_cells=1000, void_edges=True))
+    assert tile.get_elevation_from_row_and_column(0, 500) is None
+    assert tile.get_elevation_from_row_and_column(500, 1200) is None
+    voids = sum(tile.get_elevation_from_row_and_column(row, column) is None for row in range(1, 1200) for column in range(1, 1200))
+    assert 0 < voids <= 1000
+
+
+def test_write_tiles(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    write_tiles(str(tmp_path / ".cache" / "srtm"), ["N45E006", "N45E007"], "JdF3", surface="waves")
+    with GeoElevationData("JdF3") as elevation_data:
+        # continuous across tiles
+        assert abs(elevation_data.get_elevation(45.5, 6.99999) - elevation_data.get_elevation(45.5, 7.0)) <= 10
+        assert elevation_data.get_elevation(45.3, 7.2) == cell_elevation("waves", 45.3, 7.2)
+
+
+def test_fake_earthdata_server(monkeypatch, tmp_path):
+    """Tiles are downloaded through the login redirects, the missing tiles are at sea level and bad creds are rejected."""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    with FakeEarthDataServer({"N45E006": make_tile("N45E006", 1, "plane")}, failures=1) as server:
+        options = {"base_url": server.base_url, "auth_host": server.auth_host}
+        with GeoElevationData("SRTMGL1v3", "user", "password", **options) as elevation_data:
+            with pytest.raises(requests.HTTPError, match="503"):
+                elevation_data.get_elevation(45.5, 6.5)
+            assert elevation_data.get_elevation(45.5, 6.5) == cell_elevation("plane", 45.5, 6.5, 1)
+            assert elevation_data.get_elevation(46.5, 6.5) == 0.0
+            assert elevation_data.stats == {"tile_loads": 1, "tile_downloads": 1}
+        assert server.logins == 1
+        assert server.tile_requests == {"N45E006": 2, "N46E006": 1}
+        assert (tmp_path / ".cache" / "srtm" / "N45E006_SRTMGL1v3.hgt").stat().st_size == 3601 * 3601 * 2
+
+        monkeypatch.setenv("HOME", str(tmp_path / "empty"))
+        with GeoElevationData("SRTMGL1v3", "user", "wrong", **options) as elevation_data:
+            with pytest.raises(requests.HTTPError, match="401"):
+                elevation_data.get_elevation(45.5, 6.5)
@@ -0,0 +1,50 @@
+import os
+
+from cli.src.watch import PollingWatcher
+
+
+def touch(path, content: str) -> None:
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(content)
+
+
+def test_polling_watcher(tmp_path):
+    existing = tmp_path / "existing.gpx"
+    touch(existing, "a")
+    touch(tmp_path / "other.txt", "a")
+    (tmp_path / "story").mkdir()
+    watcher = PollingWatcher(str(tmp_path), recursive=True, debounce=0.3)
+    assert watcher.poll(now=0.0) == []
+
+    # new file, reported once stable
+    new = tmp_path / "story" / "new.GPX"
+    touch(new, "a")
+    assert watcher.poll(now=1.0) == []
+    assert watcher.poll(now=1.1) == []
+    assert watcher.poll(now=1.4) == [str(new)]
+    assert watcher.poll(now=2.0) == []
+
+    # still written, the debounce delay restarts
+    touch(existing, "ab")
+    assert watcher.poll(now=3.0) == []
+    touch(existing, "abc")
+    assert watcher.poll(now=3.2) == []
+    assert watcher.poll(now=3.4) == []
+    assert watcher.poll(now=3.6) == [str(existing)]
+
+    # not reported if removed
+    touch(new, "abcd")
+    assert watcher.poll(now=4.0) == []
+    os.remove(new)
+    assert watcher.poll(now=5.0) == []
+    assert watcher.pending == {}
+    assert str(new) not in watcher.snapshot
+
+
+def test_polling_watcher_single_file(tmp_path):
+    gpx = tmp_path / "track.gpx"
+    touch(gpx, "a")
+    watcher = PollingWatcher(str(gpx), debounce=0.0)
+    touch(gpx, "ab")
+    assert watcher.poll(now=0.0) == []
+    assert watcher.poll(now=0.0) == [str(gpx)]
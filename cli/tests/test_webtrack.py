@@ -0,0 +1,58 @@
+import glob
+import os
+
+import pytest
+
+from cli.src.webtrack import Activity
+from cli.src.webtrack import WebTrack
+
+STORIES = os.path.join(os.path.dirname(__file__), "..", "..", "public", "content", "stories")
+
+
+def test_round_trip(tmp_path):
+    data = {
+        "segments": [
+            {"activity": Activity.WALK, "withEle": "E", "points": [(169.1, -44.2, 0.0, 500), (169.10012, -44.20005, 123.0, 512)]},
+            {"activity": Activity.KAYAK, "withEle": False, "points": [(169.2, -44.3, 1000.0, None)]},
+        ],
+        "waypoints": [
+            [169.15, -44.25, "E", 520, "Summit", "Mt. Été", 2],
+            [169.16, -44.26, False, None, "", "", 0],
+        ],
+        "trackInformation": {
+            "lengths": {
+                "total": 1000,
+                "activities": [
+                    {"activity": Activity.WALK, "length": 123},
+                    {"activity": Activity.KAYAK, "length": 877},
+                ],
+            },
+            "minimumAltitude": 500,
+            "maximumAltitude": 512,
+            "elevationGain": 12,
+            "elevationLoss": 0,
+        },
+    }
+    webtrack_path = str(tmp_path / "track.webtrack")
+    WebTrack().to_file(webtrack_path, data)
+    decoded = WebTrack().from_file(webtrack_path)
+    assert decoded["trackInformation"] == data["trackInformation"]
+    assert decoded["waypoints"] == data["waypoints"]
+    assert [segment["activity"] for segment in decoded["segments"]] == [Activity.WALK, Activity.KAYAK]
+    assert [segment["withEle"] for segment in decoded["segments"]] == ["E", False]
+    # distances are stored in tens of meters
+    assert decoded["segments"][0]["points"] == [(169.1, -44.2, 0.0, 500), (169.10012, -44.20005, 120.0, 512)]
+    assert decoded["segments"][1]["points"] == [(169.2, -44.3, 1000.0, None)]
+
+    with pytest.raises(ValueError, match="Bad file format"):
+        WebTrack(format_version=b"1.0.0").from_file(webtrack_path)
+
+
+@pytest.mark.parametrize("webtrack_path", sorted(glob.glob(os.path.join(STORIES, "*", "*.webtrack"))))
+def test_story_round_trip(tmp_path, webtrack_path):
+    """The stories are written again byte for byte once decoded."""
+    decoded = WebTrack().from_file(webtrack_path)
+    output_path = str(tmp_path / "track.webtrack")
+    WebTrack().to_file(output_path, decoded)
+    with open(webtrack_path, "rb") as expected, open(output_path, "rb") as generated:
+        assert generated.read() == expected.read()